@@ -0,0 +1,300 @@
+"""Almacén de pedidos en SQLite (modo WAL) con tablas de pedidos e ítems.
+
+Reemplaza al antiguo orders.csv, donde cada línea era
+"{timestamp}, {dict del pedido}, {total}". La primera vez que se abre el
+almacén se importan esas líneas y el archivo se renombra a
+orders.csv.migrado.
+
+Uso:
+    python almacen.py --migrar orders.csv  # Importar un CSV antiguo a mano
+"""
+import ast
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from typing import NamedTuple
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RUTA_BD = os.path.join(DIRECTORIO, "pedidos.db")
+ORDERS_CSV = os.path.join(DIRECTORIO, "orders.csv")
+ESPERA_BLOQUEO_MS = 5000  # Cuánto espera una escritura si otro proceso tiene el lock
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS pedidos (
+    id TEXT PRIMARY KEY,
+    creado TEXT NOT NULL,
+    distrito TEXT,
+    metodo_pago TEXT,
+    total REAL NOT NULL,
+    origen TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items_pedido (
+    pedido_id TEXT NOT NULL REFERENCES pedidos(id) ON DELETE CASCADE,
+    plato TEXT NOT NULL,
+    cantidad INTEGER NOT NULL,
+    precio_total REAL,
+    PRIMARY KEY (pedido_id, plato)
+);
+CREATE INDEX IF NOT EXISTS idx_pedidos_creado ON pedidos(creado);
+CREATE INDEX IF NOT EXISTS idx_pedidos_distrito ON pedidos(distrito);
+CREATE INDEX IF NOT EXISTS idx_items_plato ON items_pedido(plato);
+"""
+
+# Columnas de AlmacenPedidos.items_desde(); "fila" es el rowid del pedido, en orden de llegada
+COLUMNAS_ITEMS = ("fila", "pedido_id", "creado", "distrito", "metodo_pago", "total", "origen", "plato",
+                  "cantidad", "precio_total")
+
+_lock = threading.Lock()
+_almacenes = {}  # ruta -> AlmacenPedidos
+
+
+class LineaPedido(NamedTuple):
+    plato: str
+    cantidad: int
+    precio_total: float = None
+
+
+class Pedido(NamedTuple):
+    id: str
+    creado: str  # "YYYY-MM-DD HH:MM:SS"
+    lineas: tuple  # LineaPedido
+    total: float
+    distrito: str = None
+    metodo_pago: str = None
+    origen: str = "chat"  # "main", "main2", "chat" (pedido extraído) o "csv"
+
+
+def agrupar_lineas(lineas):
+    """Una línea por plato: las repetidas suman cantidades y precios (la tabla de ítems es por plato)."""
+    agrupadas = {}
+    for linea in lineas:
+        anterior = agrupadas.get(linea.plato)
+        if anterior is None:
+            agrupadas[linea.plato] = linea
+        else:
+            precio = (None if anterior.precio_total is None or linea.precio_total is None
+                      else anterior.precio_total + linea.precio_total)
+            agrupadas[linea.plato] = LineaPedido(linea.plato, anterior.cantidad + linea.cantidad, precio)
+    return tuple(agrupadas.values())
+
+
+def nuevo_pedido(lineas, total, distrito=None, metodo_pago=None, origen="chat", creado=None, id=None):
+    """Pedido con id único y fecha actual salvo que se indiquen; las líneas de un mismo plato se suman."""
+    return Pedido(
+        id or uuid.uuid4().hex,
+        creado or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        agrupar_lineas(lineas),
+        float(total),
+        distrito,
+        metodo_pago,
+        origen,
+    )
+
+
+def pedido_desde_json(order_json, id=None):
+    """Pedido a partir del JSON de extract_order_json (Platos, Total, Metodo de Pago, ...)."""
+    lineas = [
+        LineaPedido(item["Plato"], int(item["Cantidad"]), float(item["Precio Total"]))
+        for item in order_json["Platos"]
+    ]
+    return nuevo_pedido(
+        lineas,
+        order_json["Total"],
+        distrito=order_json.get("Lugar de Entrega"),
+        metodo_pago=order_json.get("Metodo de Pago"),
+        creado=order_json.get("Timestamp Confirmacion"),
+        id=id,
+    )
+
+
+class AlmacenPedidos:
+    """Pedidos en SQLite, seguro con varias sesiones (hilos) y varios procesos.
+
+    Cada hilo usa su propia conexión; el modo WAL deja leer mientras otro
+    escribe y las escrituras de un mismo proceso se serializan con un lock.
+    guardar_lote() escribe muchos pedidos en una sola transacción y es
+    idempotente por id.
+    """
+
+    def __init__(self, ruta=RUTA_BD):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._escritura = threading.Lock()
+        self._conexion().executescript(ESQUEMA)
+
+    def _conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=ESPERA_BLOQUEO_MS / 1000, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")  # Seguro con WAL y mucho más rápido
+            conexion.execute("PRAGMA foreign_keys=ON")
+            conexion.execute(f"PRAGMA busy_timeout={ESPERA_BLOQUEO_MS}")
+            self._local.conexion = conexion
+        return conexion
+
+    def _transaccion(self):
+        return _Transaccion(self._conexion())
+
+    def guardar_lote(self, pedidos):
+        """Guardar varios pedidos en una transacción; los ids ya guardados se ignoran.
+
+        Devuelve la cantidad de pedidos nuevos.
+        """
+        pedidos = list(pedidos)
+        if not pedidos:
+            return 0
+        with self._escritura, self._transaccion() as conexion:
+            antes = conexion.total_changes
+            conexion.executemany(
+                "INSERT OR IGNORE INTO pedidos (id, creado, distrito, metodo_pago, total, origen) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(p.id, p.creado, p.distrito, p.metodo_pago, p.total, p.origen) for p in pedidos],
+            )
+            nuevos = conexion.total_changes - antes
+            conexion.executemany(
+                "INSERT OR IGNORE INTO items_pedido (pedido_id, plato, cantidad, precio_total) VALUES (?, ?, ?, ?)",
+                [(p.id, l.plato, l.cantidad, l.precio_total) for p in pedidos for l in agrupar_lineas(p.lineas)],
+            )
+        return nuevos
+
+    def guardar(self, pedido):
+        return self.guardar_lote([pedido])
+
+    def pedidos(self, desde=None, hasta=None, distrito=None):
+        """Pedidos con sus líneas, filtrados por fecha ("YYYY-MM-DD...") y distrito."""
+        condiciones, parametros = [], []
+        if desde:
+            condiciones.append("creado >= ?")
+            parametros.append(desde)
+        if hasta:
+            condiciones.append("creado < ?")
+            parametros.append(hasta)
+        if distrito:
+            condiciones.append("distrito = ?")
+            parametros.append(distrito)
+        donde = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        conexion = self._conexion()
+        filas = conexion.execute(
+            f"SELECT id, creado, distrito, metodo_pago, total, origen FROM pedidos {donde} ORDER BY creado",
+            parametros,
+        ).fetchall()
+        lineas = {}
+        for pedido_id, plato, cantidad, precio_total in conexion.execute(
+            f"SELECT pedido_id, plato, cantidad, precio_total FROM items_pedido "
+            f"WHERE pedido_id IN (SELECT id FROM pedidos {donde})",
+            parametros,
+        ):
+            lineas.setdefault(pedido_id, []).append(LineaPedido(plato, cantidad, precio_total))
+        return [
+            Pedido(id, creado, tuple(lineas.get(id, ())), total, distrito, metodo_pago, origen)
+            for id, creado, distrito, metodo_pago, total, origen in filas
+        ]
+
+    def items_desde(self, fila=0):
+        """Líneas (tuplas según COLUMNAS_ITEMS) de los pedidos guardados después de `fila`.
+
+        Las escrituras se serializan, así que el rowid crece con el orden de
+        llegada: la mayor `fila` devuelta sirve de cursor para la próxima
+        llamada, desde cualquier proceso.
+        """
+        return self._conexion().execute(
+            "SELECT p.rowid, p.id, p.creado, p.distrito, p.metodo_pago, p.total, p.origen, i.plato, i.cantidad, "
+            "i.precio_total "
+            "FROM pedidos p JOIN items_pedido i ON i.pedido_id = p.id WHERE p.rowid > ? ORDER BY p.rowid",
+            (fila,),
+        ).fetchall()
+
+    def contar(self):
+        return self._conexion().execute("SELECT COUNT(*) FROM pedidos").fetchone()[0]
+
+
+class _Transaccion:
+    """`with` sobre una conexión en autocommit: BEGIN IMMEDIATE ... COMMIT o ROLLBACK."""
+
+    def __init__(self, conexion):
+        self.conexion = conexion
+
+    def __enter__(self):
+        self.conexion.execute("BEGIN IMMEDIATE")
+        return self.conexion
+
+    def __exit__(self, tipo, error, traza):
+        self.conexion.execute("ROLLBACK" if tipo else "COMMIT")
+
+
+def leer_orders_csv(ruta):
+    """Pedidos del antiguo orders.csv; el id sale de la línea para que reimportar no duplique."""
+    pedidos = []
+    with open(ruta, encoding="utf-8") as f:
+        for numero, linea in enumerate(f, 1):
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                creado, resto = linea.split(", ", 1)
+                detalle, total = resto.rsplit(", ", 1)
+                platos = ast.literal_eval(detalle)  # {"plato": cantidad}
+                pedido = nuevo_pedido(
+                    [LineaPedido(plato, int(cantidad)) for plato, cantidad in platos.items()],
+                    float(total),
+                    origen="csv",
+                    creado=creado,
+                    id=hashlib.sha1(f"{numero}:{linea}".encode()).hexdigest(),
+                )
+            except (ValueError, SyntaxError, AttributeError) as e:
+                logging.warning(f"Línea {numero} de {ruta} ignorada ({e}): {linea}")
+                continue
+            pedidos.append(pedido)
+    return pedidos
+
+
+def migrar_csv(almacen, ruta=None):
+    """Importar el orders.csv antiguo una sola vez y renombrarlo; devuelve los pedidos importados.
+
+    Si otro proceso lo migra a la vez no pasa nada: los ids salen de cada
+    línea y el que llega segundo ya no encuentra el archivo.
+    """
+    ruta = ruta or ORDERS_CSV
+    try:
+        pedidos = leer_orders_csv(ruta)
+    except FileNotFoundError:
+        return 0
+    importados = almacen.guardar_lote(pedidos)
+    try:
+        os.replace(ruta, f"{ruta}.migrado")
+    except FileNotFoundError:
+        pass  # Lo renombró otro proceso
+    return importados
+
+
+def obtener_almacen(ruta=None):
+    """Almacén compartido por el proceso; al abrirlo se migra orders.csv si existe."""
+    ruta = ruta or RUTA_BD
+    almacen = _almacenes.get(ruta)
+    if almacen is not None:
+        return almacen
+    with _lock:
+        almacen = _almacenes.get(ruta)
+        if almacen is None:
+            almacen = AlmacenPedidos(ruta)
+            migrar_csv(almacen)
+            _almacenes[ruta] = almacen
+        return almacen
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bd", default=RUTA_BD)
+    parser.add_argument("--migrar", metavar="CSV", help="orders.csv antiguo a importar")
+    args = parser.parse_args()
+    almacen = AlmacenPedidos(args.bd)
+    if args.migrar:
+        print(f"{migrar_csv(almacen, args.migrar)} pedidos importados de {args.migrar}")
+    print(f"{almacen.contar()} pedidos en {args.bd}")
@@ -0,0 +1,175 @@
+"""Ventas por plato, distrito, método de pago y hora, actualizadas pedido a pedido.
+
+Las ventas en vivo salen de pedidos.db, donde guardan los pedidos todos los
+procesos (la app y los workers del API): la primera vez se calculan en lote
+(pandas/NumPy) y luego cada consulta suma solo los pedidos guardados desde
+la anterior, en O(platos de esos pedidos). Los pedidos se cuentan una sola
+vez por id (se recuerdan los ids de los últimos historico.DIAS_DEDUPLICACION
+días). Los rangos de fechas se recalculan en lote sobre el histórico
+Parquet, que recibe los pedidos a más tardar historico.ESPERA_MAXIMA
+segundos después de confirmarse.
+
+Se cuentan los pedidos del chat (origen "chat") que pasan la misma validación
+contra el catálogo que al archivarlos (historico.filas_pedido), así que las
+ventas en vivo coinciden con el histórico. La página pages/ventas.py las
+muestra junto al chat.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+import historico
+from almacen import LineaPedido, Pedido, obtener_almacen
+from catalogo import cargar_catalogo
+
+_lock = threading.Lock()
+_ventas = None  # Ventas en vivo del proceso, calculadas al primer uso
+
+
+def _pedidos_validos(items, catalogo):
+    """Filas de cada pedido del chat en almacen.items_desde(), como las de historico.filas_pedido().
+
+    Los pedidos que el histórico rechaza (PedidoInvalido) se saltan.
+    """
+    cabeceras, lineas = {}, {}
+    for _, id, creado, distrito, metodo_pago, total, origen, plato, cantidad, precio_total in items:
+        if origen != "chat":
+            continue
+        cabeceras[id] = (creado, total, distrito, metodo_pago)
+        lineas.setdefault(id, []).append(LineaPedido(plato, cantidad, precio_total))
+    for id, (creado, total, distrito, metodo_pago) in cabeceras.items():
+        pedido = Pedido(id, creado, tuple(lineas[id]), total, distrito, metodo_pago)
+        try:
+            yield historico.filas_pedido(pedido, catalogo)[1]
+        except historico.PedidoInvalido:
+            continue  # historico.archivar ya lo anotó al rechazarlo
+
+
+class Ventas:
+    """Agregados acumulados: [pedidos o cantidad, ingresos] por dimensión."""
+
+    def __init__(self):
+        self.pedidos = 0
+        self.ingresos = 0.0
+        self.por_plato = {}  # plato -> [cantidad, ingresos]
+        self.por_distrito = {}  # distrito -> [pedidos, ingresos]
+        self.por_pago = {}  # método de pago -> [pedidos, ingresos]
+        self.por_hora = np.zeros((24, 2))  # hora -> [pedidos, ingresos]
+        self._ids = historico.IdsPorDia()  # Pedidos ya sumados de los últimos días
+        self.fila = 0  # Último pedido de pedidos.db ya sumado (ver almacen.items_desde)
+        self._lock = threading.Lock()
+
+    def agregar(self, filas):
+        """Sumar las filas de un pedido (como las de historico.filas_pedido()); devuelve False si ya estaba."""
+        if not filas:
+            return False
+        primera = filas[0]
+        with self._lock:
+            if not self._ids.agregar(primera["creado"].strftime("%Y-%m-%d"), primera["pedido_id"]):
+                return False
+            total = 0.0
+            for fila in filas:
+                acumulado = self.por_plato.setdefault(fila["plato"], [0, 0.0])
+                acumulado[0] += fila["cantidad"]
+                acumulado[1] += fila["precio_total"]
+                total += fila["precio_total"]
+            self.pedidos += 1
+            self.ingresos += total
+            for tabla, clave in ((self.por_distrito, primera["distrito"]), (self.por_pago, primera["metodo_pago"])):
+                acumulado = tabla.setdefault(clave or "Sin dato", [0, 0.0])
+                acumulado[0] += 1
+                acumulado[1] += total
+            self.por_hora[primera["creado"].hour] += (1, total)
+        return True
+
+    @classmethod
+    def desde_tabla(cls, filas):
+        """Recalcular todo en lote desde un DataFrame de filas del histórico."""
+        ventas = cls()
+        if filas.empty:
+            return ventas
+        filas = filas.drop_duplicates(["pedido_id", "plato"])
+        pedidos = filas.groupby("pedido_id", sort=False).agg(
+            distrito=("distrito", "first"),
+            metodo_pago=("metodo_pago", "first"),
+            creado=("creado", "first"),
+            total=("precio_total", "sum"),
+        )
+        pedidos[["distrito", "metodo_pago"]] = pedidos[["distrito", "metodo_pago"]].fillna("Sin dato")
+        platos = filas.groupby("plato", sort=False)[["cantidad", "precio_total"]].sum()
+        ventas.por_plato = {p: [int(c), float(i)] for p, c, i in platos.itertuples()}
+        for atributo, columna in (("por_distrito", "distrito"), ("por_pago", "metodo_pago")):
+            grupo = pedidos.groupby(columna, sort=False)["total"].agg(["size", "sum"])
+            setattr(ventas, atributo, {k: [int(n), float(s)] for k, n, s in grupo.itertuples()})
+        horas = pd.to_datetime(pedidos["creado"]).dt.hour.to_numpy()
+        total = pedidos["total"].to_numpy(dtype=float)
+        ventas.por_hora[:, 0] = np.bincount(horas, minlength=24)
+        ventas.por_hora[:, 1] = np.bincount(horas, weights=total, minlength=24)
+        ventas.pedidos = len(pedidos)
+        ventas.ingresos = float(total.sum())
+        fechas = pd.to_datetime(pedidos["creado"]).dt.strftime("%Y-%m-%d")
+        for fecha in sorted(fechas.unique())[-ventas._ids.dias:]:
+            for id in pedidos.index[(fechas == fecha).to_numpy()]:
+                ventas._ids.agregar(fecha, id)
+        return ventas
+
+    @classmethod
+    def desde_almacen(cls, almacen, catalogo=None):
+        """Recalcular en lote desde los pedidos válidos del chat guardados en `almacen`."""
+        items = almacen.items_desde()
+        filas = [fila for pedido in _pedidos_validos(items, catalogo or cargar_catalogo()) for fila in pedido]
+        ventas = cls.desde_tabla(pd.DataFrame(filas, columns=historico.ESQUEMA.names))
+        ventas.fila = max((item[0] for item in items), default=0)
+        return ventas
+
+    def actualizar(self, almacen, catalogo=None):
+        """Sumar los pedidos guardados en `almacen` desde la última actualización; devuelve cuántos."""
+        items = almacen.items_desde(self.fila)
+        if not items:
+            return 0
+        sumados = sum(self.agregar(filas) for filas in _pedidos_validos(items, catalogo or cargar_catalogo()))
+        self.fila = max(item[0] for item in items)
+        return sumados
+
+    def tablas(self, catalogo=None):
+        """DataFrames para mostrar; con `catalogo` aparecen también los platos de la carta sin ventas."""
+        with self._lock:
+            por_plato = {plato: list(valores) for plato, valores in self.por_plato.items()}
+            por_distrito = dict(self.por_distrito)
+            por_pago = dict(self.por_pago)
+            por_hora = self.por_hora.copy()
+        if catalogo is not None:
+            for plato in catalogo.menu["Plato"]:
+                por_plato.setdefault(plato, [0, 0.0])
+
+        def tabla(datos, columnas):
+            marco = pd.DataFrame.from_dict(datos, orient="index", columns=columnas)
+            return marco.sort_values("ingresos", ascending=False)
+
+        return {
+            "plato": tabla(por_plato, ["cantidad", "ingresos"]),
+            "distrito": tabla(por_distrito, ["pedidos", "ingresos"]),
+            "metodo_pago": tabla(por_pago, ["pedidos", "ingresos"]),
+            "hora": pd.DataFrame(
+                {"pedidos": por_hora[:, 0].astype(int), "ingresos": por_hora[:, 1]},
+                index=pd.RangeIndex(24, name="hora"),
+            ),
+        }
+
+
+def recalcular(desde=None, hasta=None):
+    """Ventas en lote desde el histórico Parquet entre las fechas `desde` y `hasta`."""
+    return Ventas.desde_tabla(historico.leer(desde, hasta))
+
+
+def obtener_ventas(recargar=False, almacen=None, catalogo=None):
+    """Ventas en vivo: se calculan en lote la primera vez (o con `recargar`) y luego suman los pedidos nuevos."""
+    global _ventas
+    almacen = almacen or obtener_almacen()
+    with _lock:
+        if _ventas is None or recargar:
+            _ventas = Ventas.desde_almacen(almacen, catalogo)
+        else:
+            _ventas.actualizar(almacen, catalogo)
+        return _ventas
@@ -0,0 +1,310 @@
+"""API HTTP (ASGI) del chat: el motor sin Streamlit, con las sesiones guardadas en SQLite.
+
+El estado de cada conversación vive en sesiones.db, así que cualquier worker
+puede atender cualquier turno y se pueden levantar varios detrás de un
+balanceador:
+
+    uvicorn api:app --workers 4 --port 8000
+
+Rutas:
+    POST /sesiones                  crear una conversación (devuelve el saludo)
+    GET  /sesiones/{id}             mensajes visibles de la conversación
+    POST /sesiones/{id}/mensajes    {"mensaje": "...", "stream": true}
+    POST /sesiones/{id}/reiniciar   "Eliminar conversación"
+    GET  /salud                     para el balanceador
+    GET  /metrics                   tramos por fase en formato Prometheus
+
+Con "stream" la respuesta es NDJSON, un evento por línea: "inicio" (ruta y si
+se muestra el mensaje del usuario), "fragmento"... y "fin" (texto completo y
+mensajes agregados al historial); o bien "moderado" o "error". Sin "stream"
+se devuelve un único JSON con el turno completo. El pedido confirmado se
+extrae y se guarda en segundo plano, después de responder.
+
+El backend del LLM y las métricas se configuran con las mismas variables de
+entorno que la app (LLM_BACKEND, OPENAI_API_KEY, METRICAS_MUESTREO, ...).
+Las sesiones y el inventario en vivo se comparten entre los workers por SQLite.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from catalogo import cargar_catalogo
+from llm import obtener_backend
+from metricas import iniciar_exportacion, texto_prometheus
+from motor import MENSAJE_RESPETO, MotorChat
+from sesiones import Conflicto, SesionNoEncontrada, obtener_sesiones
+
+HILOS = 64  # Turnos que atiende a la vez cada worker; cada uno espera al LLM en un hilo
+LARGO_MAXIMO = 64 * 1024  # Bytes del cuerpo de una petición
+INTERVALO_PURGA = 60 * 60  # Segundos entre borrados de sesiones inactivas
+
+
+def _visibles(sesion):
+    return [m.como_dict() for m in sesion.mensajes if m.role != "system"]
+
+
+class ServicioChat:
+    """Turnos del chat sobre sesiones guardadas, sin HTTP ni Streamlit.
+
+    Lo usa el API y lo puede usar cualquier otro canal. Los turnos de una
+    misma sesión se atienden de a uno en el proceso; entre procesos, el
+    segundo en guardar recibe Conflicto.
+    """
+
+    def __init__(self, backend, sesiones):
+        self.backend = backend
+        self.sesiones = sesiones
+        self._candados = weakref.WeakValueDictionary()  # sesión -> lock, mientras alguien lo use
+        self._lock = threading.Lock()
+
+    def _motor(self):
+        # El catálogo se recarga solo si cambió carta.csv; el motor no guarda estado
+        return MotorChat(self.backend, cargar_catalogo())
+
+    def _candado(self, id):
+        with self._lock:
+            candado = self._candados.get(id)
+            if candado is None:
+                candado = self._candados[id] = threading.Lock()
+            return candado
+
+    def _cargar(self, motor, id):
+        return self.sesiones.cargar(id, lambda: motor.conversacion().prompt)
+
+    def crear(self):
+        """Sesión nueva, ya guardada."""
+        sesion = self._motor().nueva_sesion()
+        self.sesiones.crear(sesion)
+        return sesion
+
+    def sesion(self, id):
+        return self._cargar(self._motor(), id)[0]
+
+    def reiniciar(self, id):
+        """Empezar de nuevo la conversación y devolver al stock lo que tenía reservado."""
+        motor = self._motor()
+        with self._candado(id):
+            sesion, revision = self._cargar(motor, id)
+            motor.reiniciar_sesion(sesion)
+            self.sesiones.guardar(sesion, revision)
+        return sesion
+
+    def turno(self, id, mensaje, emitir, stream=True):
+        """Atender un mensaje del usuario; `emitir(evento)` recibe los eventos a medida que ocurren."""
+        motor = self._motor()
+        with self._candado(id):
+            sesion, revision = self._cargar(motor, id)
+            antes = len(sesion.mensajes)
+            turno = motor.iniciar_turno(sesion, mensaje, stream=stream)
+            if not turno.aprobado():
+                self.sesiones.guardar(sesion, revision)
+                emitir({"tipo": "moderado", "respuesta": MENSAJE_RESPETO})
+                return
+            emitir({"tipo": "inicio", "ruta": turno.ruta, "mostrar_usuario": turno.mostrar_usuario})
+            partes = []
+            for fragmento in turno.fragmentos():
+                partes.append(fragmento)
+                emitir({"tipo": "fragmento", "texto": fragmento})
+            turno.cerrar("".join(partes), extraer=False)
+            # Con Conflicto el turno no queda en el historial: tampoco se guarda el pedido ni se descuenta stock
+            self.sesiones.guardar(sesion, revision)
+        extraccion = turno.extraer(sumar_fondo=False)
+        if extraccion is not None:
+            # La extracción sigue en segundo plano; su consumo se suma a la sesión guardada al terminar
+            extraccion.add_done_callback(lambda _: self._sumar_fondo(turno.fondo))
+        logging.info(f"Consumo de la sesión {sesion.id}: {sesion.consumo}")
+        logging.info(f"Memoria de la sesión {sesion.id}: {sesion.memoria():,} bytes")
+        emitir({
+            "tipo": "fin",
+            "respuesta": turno.texto,
+            "agregados": [m.como_dict() for m in sesion.mensajes[antes:]],
+        })
+
+    def _sumar_fondo(self, fondo):
+        try:
+            self.sesiones.sumar_consumo(fondo.id, fondo.consumo)
+        except sqlite3.Error as e:
+            logging.error(f"No se pudo sumar el consumo de la extracción a la sesión {fondo.id}: {e}")
+
+
+class _ErrorHTTP(Exception):
+    def __init__(self, estado, detalle):
+        super().__init__(detalle)
+        self.estado = estado
+        self.detalle = detalle
+
+
+def _error(e):
+    """Evento de error con el estado HTTP que le corresponde a la excepción."""
+    if isinstance(e, _ErrorHTTP):
+        return {"tipo": "error", "estado": e.estado, "detalle": e.detalle}
+    if isinstance(e, SesionNoEncontrada):
+        return {"tipo": "error", "estado": 404, "detalle": "La sesión no existe o venció."}
+    if isinstance(e, Conflicto):
+        return {"tipo": "error", "estado": 409, "detalle": "La sesión se modificó en otro pedido; vuelve a cargarla."}
+    logging.error(f"Error en el API: {e!r}")
+    return {"tipo": "error", "estado": 500, "detalle": "Error interno."}
+
+
+async def _leer_json(receive):
+    cuerpo = b""
+    while True:
+        mensaje = await receive()
+        cuerpo += mensaje.get("body", b"")
+        if len(cuerpo) > LARGO_MAXIMO:
+            raise _ErrorHTTP(413, "Cuerpo demasiado grande.")
+        if not mensaje.get("more_body"):
+            break
+    try:
+        datos = json.loads(cuerpo or b"{}")
+    except ValueError:
+        raise _ErrorHTTP(400, "El cuerpo no es JSON válido.")
+    if not isinstance(datos, dict):
+        raise _ErrorHTTP(400, "El cuerpo debe ser un objeto JSON.")
+    return datos
+
+
+async def _responder(send, estado, datos, tipo="application/json"):
+    cuerpo = json.dumps(datos, ensure_ascii=False).encode("utf-8") if tipo == "application/json" else datos.encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": estado,
+        "headers": [(b"content-type", f"{tipo}; charset=utf-8".encode()), (b"content-length", str(len(cuerpo)).encode())],
+    })
+    await send({"type": "http.response.body", "body": cuerpo})
+
+
+class API:
+    """Aplicación ASGI. El motor es síncrono: cada llamada corre en un hilo del pool."""
+
+    def __init__(self, servicio=None, hilos=HILOS):
+        self._servicio = servicio
+        self._lock = threading.Lock()
+        self._hilos = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="api")
+        self._purga = None
+
+    @property
+    def servicio(self):
+        # Se crea al primer uso (en un hilo del pool): levantar el backend puede tardar
+        if self._servicio is None:
+            with self._lock:
+                if self._servicio is None:
+                    iniciar_exportacion()
+                    self._servicio = ServicioChat(obtener_backend(), obtener_sesiones())
+        return self._servicio
+
+    async def _en_hilo(self, funcion, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._hilos, funcion, *args)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._ciclo_de_vida(receive, send)
+        elif scope["type"] == "http":
+            try:
+                await self._atender(scope, receive, send)
+            except Exception as e:
+                evento = _error(e)
+                await _responder(send, evento["estado"], {"detalle": evento["detalle"]})
+
+    async def _ciclo_de_vida(self, receive, send):
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "lifespan.startup":
+                await self._en_hilo(lambda: self.servicio)
+                self._purga = asyncio.create_task(self._purgar_periodicamente())
+                await send({"type": "lifespan.startup.complete"})
+            elif mensaje["type"] == "lifespan.shutdown":
+                if self._purga is not None:
+                    self._purga.cancel()
+                self._hilos.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _purgar_periodicamente(self):
+        while True:
+            await asyncio.sleep(INTERVALO_PURGA)
+            try:
+                borradas = await self._en_hilo(self.servicio.sesiones.purgar)
+                logging.info(f"Sesiones inactivas borradas: {borradas}")
+            except sqlite3.Error as e:
+                logging.error(f"No se pudieron purgar las sesiones: {e}")
+
+    async def _atender(self, scope, receive, send):
+        metodo = scope["method"]
+        partes = scope["path"].strip("/").split("/")
+        if partes == ["salud"] and metodo == "GET":
+            await _responder(send, 200, {"estado": "ok"})
+        elif partes == ["metrics"] and metodo == "GET":
+            await _responder(send, 200, texto_prometheus(), "text/plain")
+        elif partes == ["sesiones"] and metodo == "POST":
+            sesion = await self._en_hilo(lambda: self.servicio.crear())
+            await _responder(send, 201, {"sesion": sesion.id, "mensajes": _visibles(sesion)})
+        elif len(partes) == 2 and partes[0] == "sesiones" and metodo == "GET":
+            sesion = await self._en_hilo(lambda: self.servicio.sesion(partes[1]))
+            await _responder(send, 200, {"sesion": sesion.id, "mensajes": _visibles(sesion)})
+        elif len(partes) == 3 and partes[0] == "sesiones" and partes[2] == "reiniciar" and metodo == "POST":
+            sesion = await self._en_hilo(lambda: self.servicio.reiniciar(partes[1]))
+            await _responder(send, 200, {"sesion": sesion.id, "mensajes": _visibles(sesion)})
+        elif len(partes) == 3 and partes[0] == "sesiones" and partes[2] == "mensajes" and metodo == "POST":
+            datos = await _leer_json(receive)
+            mensaje = datos.get("mensaje")
+            if not isinstance(mensaje, str) or not mensaje.strip():
+                raise _ErrorHTTP(400, "Falta el mensaje.")
+            await self._turno(send, partes[1], mensaje, bool(datos.get("stream", False)))
+        else:
+            raise _ErrorHTTP(404, "Ruta no encontrada.")
+
+    async def _turno(self, send, id, mensaje, stream):
+        loop = asyncio.get_running_loop()
+        cola = asyncio.Queue()
+
+        def emitir(evento):
+            loop.call_soon_threadsafe(cola.put_nowait, evento)
+
+        def atender():
+            try:
+                self.servicio.turno(id, mensaje, emitir, stream)
+            except Exception as e:
+                emitir(_error(e))
+            finally:
+                emitir(None)
+
+        loop.run_in_executor(self._hilos, atender)
+        evento = await cola.get()
+        if evento["tipo"] == "error":
+            await _responder(send, evento["estado"], {"detalle": evento["detalle"]})
+            return
+
+        if not stream:
+            # Un único JSON con el turno completo
+            resultado = {"moderado": False}
+            estado = 200
+            while evento is not None:
+                if evento["tipo"] == "error":
+                    estado = evento["estado"]
+                    resultado = {"detalle": evento["detalle"]}
+                elif evento["tipo"] == "moderado":
+                    resultado.update(moderado=True, respuesta=evento["respuesta"])
+                elif evento["tipo"] != "fragmento":
+                    resultado.update({k: v for k, v in evento.items() if k != "tipo"})
+                evento = await cola.get()
+            await _responder(send, estado, resultado)
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/x-ndjson; charset=utf-8"), (b"cache-control", b"no-cache")],
+        })
+        while evento is not None:
+            linea = json.dumps(evento, ensure_ascii=False) + "\n"
+            await send({"type": "http.response.body", "body": linea.encode("utf-8"), "more_body": True})
+            evento = await cola.get()
+        await send({"type": "http.response.body", "body": b""})
+
+
+app = API()
@@ -0,0 +1,152 @@
+"""Mide el API del chat (api.py) con muchos clientes a la vez sobre el servidor falso.
+
+Levanta el servidor falso y `--workers` procesos del API (cada uno con
+uvicorn) que comparten sesiones.db e inventario.db, como detrás de un balanceador. Para cada
+nivel de concurrencia lanza ese número de clientes simultáneos; cada uno
+crea su sesión y envía los mensajes de las conversaciones grabadas por HTTP
+(streaming NDJSON), rotando de worker en cada turno, así que todas las
+sesiones pasan por todos los workers. Se informan turnos por segundo y
+p50/p95 del primer fragmento y del turno completo. Pedidos, consumo,
+inventario y sesiones se escriben en un directorio temporal.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.api --workers 4 --clientes 1 10 50 100
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.replay import GUION, cargar_conversaciones, distribucion
+from cliente import ESPERA_KEEPALIVE
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Un worker del API con los archivos de datos en el directorio de la corrida
+LANZADOR = """
+import sys
+import uvicorn
+import almacen, consumo, historico, inventario, sesiones
+directorio, puerto = sys.argv[1], int(sys.argv[2])
+consumo.RUTA_BD = f"{directorio}/consumo.db"
+almacen.RUTA_BD = f"{directorio}/pedidos.db"
+almacen.ORDERS_CSV = f"{directorio}/orders.csv"
+historico.DIRECTORIO_HISTORICO = f"{directorio}/historico"
+inventario.RUTA_BD = f"{directorio}/inventario.db"
+sesiones.RUTA_BD = f"{directorio}/sesiones.db"
+from api import app
+uvicorn.run(app, host="127.0.0.1", port=puerto, log_level="warning")
+"""
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def esperar(url, proceso, plazo=60):
+    limite = time.monotonic() + plazo
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"{url} terminó al iniciar (código {proceso.returncode})")
+        try:
+            if httpx.get(f"{url}/salud").status_code == 200:
+                return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} no respondió en {plazo} s")
+
+
+async def cliente(http, workers, desfase, mensajes, turnos, errores):
+    """Un cliente: crea su sesión y envía los mensajes uno tras otro, cada uno a otro worker."""
+    sesion = (await http.post(f"{workers[desfase % len(workers)]}/sesiones")).json()["sesion"]
+    for i, mensaje in enumerate(mensajes):
+        url = f"{workers[(desfase + i + 1) % len(workers)]}/sesiones/{sesion}/mensajes"
+        inicio = time.perf_counter()
+        primero = None
+        try:
+            async with http.stream("POST", url, json={"mensaje": mensaje, "stream": True}) as respuesta:
+                async for linea in respuesta.aiter_lines():
+                    if primero is None and linea:
+                        primero = time.perf_counter() - inicio
+                    if '"tipo": "error"' in linea:
+                        errores.append(linea)
+        except httpx.HTTPError as e:
+            errores.append(repr(e))
+            continue
+        turnos.append((primero, time.perf_counter() - inicio))
+
+
+async def medir(workers, clientes, mensajes):
+    conexiones = clientes * len(workers)
+    limites = httpx.Limits(max_connections=conexiones, max_keepalive_connections=conexiones,
+                           keepalive_expiry=ESPERA_KEEPALIVE)
+    async with httpx.AsyncClient(timeout=120, limits=limites) as http:
+        turnos, errores = [], []
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente(http, workers, k, mensajes, turnos, errores) for k in range(clientes)))
+        return turnos, errores, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clientes", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--workers", type=int, default=1, help="procesos del API")
+    parser.add_argument("--primer-token", type=float, default=0.3, help="segundos hasta el primer token")
+    parser.add_argument("--por-token", type=float, default=0.01, help="segundos entre fragmentos")
+    parser.add_argument("--moderacion", type=float, default=0.1, help="segundos por moderación")
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix="api-")
+    procesos = []
+    try:
+        puerto_llm = puerto_libre()
+        procesos.append(subprocess.Popen(
+            [sys.executable, "servidor_falso.py", "--puerto", str(puerto_llm), "--guion", GUION,
+             "--primer-token", str(args.primer_token), "--por-token", str(args.por_token),
+             "--moderacion", str(args.moderacion)],
+            cwd=RAIZ, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+        entorno = {**os.environ, "LLM_BACKEND": "local", "LOCAL_LLM_URL": f"http://127.0.0.1:{puerto_llm}"}
+        workers = []
+        for _ in range(args.workers):
+            puerto = puerto_libre()
+            procesos.append(subprocess.Popen(
+                [sys.executable, "-c", LANZADOR, directorio, str(puerto)],
+                cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            ))
+            workers.append(f"http://127.0.0.1:{puerto}")
+        for url, proceso in zip(workers, procesos[1:]):
+            esperar(url, proceso)
+
+        mensajes = [m for conversacion in cargar_conversaciones() for m in conversacion["turnos"]]
+        print(f"{args.workers} workers; {len(mensajes)} mensajes por cliente; "
+              f"LLM falso con primer token a {args.primer_token * 1000:.0f} ms")
+        print(f"{'clientes':>8} {'turnos/s':>9} {'1er fragmento p50':>18} {'p95':>8} "
+              f"{'turno p50':>10} {'p95':>8} {'errores':>8}")
+        for clientes in args.clientes:
+            turnos, errores, segundos = asyncio.run(medir(workers, clientes, mensajes))
+            primero = distribucion([t[0] * 1000 for t in turnos if t[0] is not None])
+            total = distribucion([t[1] * 1000 for t in turnos])
+            print(f"{clientes:>8} {len(turnos) / segundos:>9.1f} {primero['p50']:>15.0f} ms {primero['p95']:>5.0f} ms "
+                  f"{total['p50']:>7.0f} ms {total['p95']:>5.0f} ms {len(errores):>8}")
+            for error in sorted(set(errores))[:3]:
+                print(f"    {error[:160]}")
+    finally:
+        for proceso in procesos:
+            proceso.terminate()
+        for proceso in procesos:
+            proceso.wait()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
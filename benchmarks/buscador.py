@@ -0,0 +1,79 @@
+"""Compara el BuscadorPedidos con el bucle de ventanas deslizantes anterior.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.buscador
+"""
+import timeit
+
+from catalogo import cargar_catalogo
+from pedidos import BuscadorPedidos, palabras_a_numero, verificar_rango
+
+MENSAJES = [
+    "Hola, quiero 2 ceviche y tres arroz chaufa por favor",
+    "me das 150 lomo saltado, 2 torta tres leches y una inka kola (355ml)",
+    "quisiera saber si reparten en miraflores",
+    "treinta y cinco aji de gallina y 4 pie de limón",
+]
+
+
+def procesar_por_ventanas(mensaje, menu_platos):
+    """Versión anterior de procesar_mensaje_usuario (una carta por llamada)."""
+    cantidades = []
+    palabras = mensaje.lower().split()
+    menu_platos_lower = [plato.lower() for plato in menu_platos]
+    idx = 0
+    while idx < len(palabras):
+        numero = palabras_a_numero(palabras[idx])
+        if numero is not None:
+            plato = ''
+            for offset in range(1, 6):
+                if idx + offset < len(palabras):
+                    posible_plato = ' '.join(palabras[idx + 1: idx + offset + 1])
+                    if posible_plato in menu_platos_lower:
+                        plato = posible_plato
+                        idx += offset
+                        break
+            if plato:
+                cantidades.append({'plato': plato, 'cantidad': numero})
+            else:
+                idx += 1
+        else:
+            idx += 1
+    for item in cantidades:
+        if not verificar_rango(item['cantidad']):
+            return item['plato']
+    return None
+
+
+def medir(cartas, repeticiones=2000):
+    buscador = BuscadorPedidos(cartas)
+
+    def anterior():
+        for mensaje in MENSAJES:
+            for nombres in cartas.values():
+                procesar_por_ventanas(mensaje, nombres)
+
+    def nuevo():
+        for mensaje in MENSAJES:
+            buscador.buscar(mensaje)
+
+    t_anterior = timeit.timeit(anterior, number=repeticiones) / repeticiones
+    t_nuevo = timeit.timeit(nuevo, number=repeticiones) / repeticiones
+    return t_anterior, t_nuevo
+
+
+if __name__ == "__main__":
+    catalogo = cargar_catalogo()
+    cartas = {
+        "plato": catalogo.menu["Plato"].tolist(),
+        "bebida": catalogo.bebidas["descripcion"].tolist(),
+        "postre": catalogo.postres["Postres"].tolist(),
+    }
+    for factor in (1, 100, 1000):
+        ampliadas = {
+            categoria: nombres + [f"{nombre} especial {n}" for n in range(factor - 1) for nombre in nombres]
+            for categoria, nombres in cartas.items()
+        }
+        total = sum(len(nombres) for nombres in ampliadas.values())
+        anterior, nuevo = medir(ampliadas, repeticiones=200 if factor > 1 else 2000)
+        print(f"{total:>6} ítems | anterior {anterior * 1e6:9.1f} µs | trie {nuevo * 1e6:7.1f} µs | x{anterior / nuevo:.1f}")
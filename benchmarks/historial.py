@@ -0,0 +1,73 @@
+"""Mide el rerun del historial del chat según el largo de la conversación.
+
+Compara dibujar todos los mensajes (como antes) con historial.mostrar_historial,
+que dibuja solo los últimos, usando el AppTest de Streamlit.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.historial --mensajes 10 100 1000
+"""
+import argparse
+import time
+
+from streamlit.testing.v1 import AppTest
+
+from catalogo import cargar_catalogo
+from prompts import estado_inicial
+
+
+def app_todo():
+    import streamlit as st
+
+    for message in st.session_state["mensajes"]:
+        if message["role"] == "system":
+            continue
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+
+def app_ventana():
+    import streamlit as st
+
+    from historial import mostrar_historial
+
+    mostrar_historial(st.session_state["mensajes"], {})
+
+
+def conversacion(largo):
+    """Saludo con la carta y luego turnos alternados, con la carta repetida cada tanto."""
+    mensajes = estado_inicial(cargar_catalogo())
+    carta = mensajes[1]["content"]
+    for i in range(largo - 1):
+        if i % 2 == 0:
+            mensajes.append({"role": "user", "content": f"Quiero {i} arroz con pollo"})
+        else:
+            mensajes.append({"role": "assistant", "content": carta if i % 10 == 1 else f"Anotado, van {i} platos."})
+    return mensajes
+
+
+def medir(app, mensajes, reruns):
+    prueba = AppTest.from_function(app, default_timeout=60)
+    prueba.session_state["mensajes"] = mensajes
+    prueba.run()  # Primer rerun: importaciones y caches
+    inicio = time.perf_counter()
+    for _ in range(reruns):
+        prueba.run()
+    return (time.perf_counter() - inicio) / reruns, len(prueba.chat_message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mensajes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--reruns", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'mensajes':>8} {'todos (ms)':>12} {'dibujados':>10} {'ventana (ms)':>13} {'dibujados':>10}")
+    for largo in args.mensajes:
+        mensajes = conversacion(largo)
+        t_todo, n_todo = medir(app_todo, mensajes, args.reruns)
+        t_ventana, n_ventana = medir(app_ventana, mensajes, args.reruns)
+        print(f"{largo:>8} {t_todo * 1000:>12.1f} {n_todo:>10} {t_ventana * 1000:>13.1f} {n_ventana:>10}")
+
+
+if __name__ == "__main__":
+    main()
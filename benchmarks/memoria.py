@@ -0,0 +1,95 @@
+"""Mide los bytes por sesión con el historial compacto frente a las listas de diccionarios de antes.
+
+Crea muchas sesiones con la misma conversación sintética de cada forma y
+mide con tracemalloc la memoria que reservan:
+  - antes: deepcopy del estado inicial (saludo construido en cada rerun) y
+    un diccionario por mensaje,
+  - ahora: referencia al PromptInicial compartido y Mensaje con __slots__.
+También informa Sesion.memoria(), el tamaño que registra la app en el log,
+y cuántas sesiones caben por GB para dimensionar los workers.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.memoria --sesiones 1000 --turnos 0 5 20
+"""
+import argparse
+import gc
+import tracemalloc
+from copy import deepcopy
+
+from catalogo import cargar_catalogo, menu_disponible
+from conversacion import Conversacion, Mensaje
+from motor import Sesion
+from presentacion import format_menu
+from prompts import prompt_inicial, system_prompt
+
+
+def estado_inicial_anterior(catalogo):
+    # Como antes: el saludo se armaba en cada rerun y la sesión guardaba una copia profunda
+    menu = menu_disponible(catalogo, frozenset())
+    return [
+        {"role": "system", "content": system_prompt(catalogo)},
+        {
+            "role": "assistant",
+            "content": f"¡Hola! Bienvenido a Sazón Bot. Este es el menú del día:\n\n{format_menu(menu)}\n\n¿Qué te puedo ofrecer?",
+        },
+    ]
+
+
+def turnos_sinteticos(n, semilla):
+    """Pares (usuario, asistente) con textos propios de cada sesión."""
+    for i in range(n):
+        yield (
+            f"Quiero {i + 1} arroz con pollo y una chicha, sesión {semilla}",
+            f"Perfecto, anoté {i + 1} Arroz con pollo (S/ {18 * (i + 1)}.00) y 1 Chicha morada (S/ 5.00). "
+            f"¿Desea recoger su pedido en el local o prefiere entrega a domicilio? [{semilla}]",
+        )
+
+
+def sesion_anterior(catalogo, turnos, semilla):
+    sesion = Sesion(deepcopy(estado_inicial_anterior(catalogo)))
+    for usuario, asistente in turnos_sinteticos(turnos, semilla):
+        sesion.mensajes.append({"role": "user", "content": usuario})
+        sesion.mensajes.append({"role": "assistant", "content": asistente})
+    return sesion
+
+
+def sesion_compacta(catalogo, turnos, semilla):
+    sesion = Sesion(Conversacion(prompt_inicial(catalogo)))
+    for usuario, asistente in turnos_sinteticos(turnos, semilla):
+        sesion.mensajes.append(Mensaje("user", usuario))
+        sesion.mensajes.append(Mensaje("assistant", asistente))
+    return sesion
+
+
+def bytes_por_sesion(crear, catalogo, sesiones, turnos):
+    """Memoria reservada por sesión (tracemalloc) y las sesiones creadas."""
+    crear(catalogo, turnos, -1)  # Caches del catálogo y del prompt fuera de la medición
+    gc.collect()
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    creadas = [crear(catalogo, turnos, i) for i in range(sesiones)]
+    gc.collect()
+    despues = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (despues - antes) / sesiones, creadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sesiones", type=int, default=1000)
+    parser.add_argument("--turnos", type=int, nargs="+", default=[0, 5, 20])
+    args = parser.parse_args()
+
+    catalogo = cargar_catalogo()
+    print(f"{'turnos':>6} {'antes (B)':>10} {'ahora (B)':>10} {'ahorro':>7} {'memoria()':>10} "
+          f"{'sesiones/GB antes':>18} {'ahora':>10}")
+    for turnos in args.turnos:
+        antes, _ = bytes_por_sesion(sesion_anterior, catalogo, args.sesiones, turnos)
+        ahora, creadas = bytes_por_sesion(sesion_compacta, catalogo, args.sesiones, turnos)
+        reportado = sum(sesion.memoria() for sesion in creadas) / len(creadas)
+        print(f"{turnos:>6} {antes:>10,.0f} {ahora:>10,.0f} {1 - ahora / antes:>7.0%} {reportado:>10,.0f} "
+              f"{2 ** 30 / antes:>18,.0f} {2 ** 30 / ahora:>10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Compara los textos de la carta armados por columnas (y cacheados) con la versión fila por fila.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.presentacion --filas 10 1000 10000
+"""
+import argparse
+import timeit
+
+import pandas as pd
+
+import presentacion
+from catalogo import cargar_catalogo
+
+
+# Versiones anteriores, con iterrows() y concatenación fila por fila
+
+def format_menu_anterior(menu):
+    if menu.empty:
+        return "No hay platos disponibles."
+    else:
+        # Encabezados de la tabla
+        table = "| **Plato** | **Descripción** | **Precio** |\n"
+        table += "|-----------|-----------------|-------------|\n"  # Línea de separación
+
+        # Filas de la tabla
+        for idx, row in menu.iterrows():
+            table += f"| {row['Plato']} | {row['Descripción']} | S/{row['Precio']:.2f} |\n"
+
+        return table
+
+
+def display_menu_anterior(menu):
+    """Mostrar el menú con descripciones."""
+    menu_text = "Aquí está nuestra carta:\n"
+    for index, row in menu.iterrows():
+        menu_text += f"{row['Plato']}: {row['Descripción']} - {row['Precio']} soles\n"
+    return menu_text
+
+
+def display_distritos_anterior(distritos):
+    """Mostrar los distritos de reparto disponibles."""
+    distritos_text = "Los distritos de reparto son:\n"
+    for index, row in distritos.iterrows():
+        distritos_text += f"**{row['Distrito']}**\n"
+    return distritos_text
+
+
+def display_postre_anterior(postre):
+    """Mostrar el menú en formato de tabla."""
+    # Encabezado de la tabla
+    menu_text = "Aquí está nuestra carta de postres:\n"
+    menu_text += "| Postre           | Descripción                 | Precio (S/) |\n"
+    menu_text += "|------------------|-----------------------------|-------------|\n"
+
+    # Agregar cada postre a la tabla
+    for index, row in postre.iterrows():
+        menu_text += f"| {row['Postres']:<18} | {row['Descripción']:<27} | {row['Precio']:>11} |\n"
+
+    return menu_text
+
+
+def display_bebida_anterior(bebida):
+    """Mostrar el menú en formato de tabla."""
+    # Encabezado de la tabla
+    menu_text = "Aquí está nuestra carta de bebidas:\n"
+    menu_text += "| Bebida           | Descripción                 | Precio (S/) |\n"
+    menu_text += "|------------------|-----------------------------|-------------|\n"
+
+    # Agregar cada bebida a la tabla
+    for index, row in bebida.iterrows():
+        menu_text += f"| {row['bebida']:<18} | {row['descripcion']:<27} | {row['precio']:>11} |\n"
+
+    return menu_text
+
+
+def display_confirmed_order_anterior(order_details):
+    """Genera una tabla en formato Markdown para el pedido confirmado."""
+    table = "| **Plato** | **Cantidad** | **Precio Total** |\n"
+    table += "|-----------|--------------|------------------|\n"
+    for item in order_details:
+        table += f"| {item['Plato']} | {item['Cantidad']} | S/{item['Precio Total']:.2f} |\n"
+    table += "| **Total** |              | **S/ {:.2f}**      |\n".format(sum(item['Precio Total'] for item in order_details))
+    return table
+
+
+def ampliar(tabla, filas):
+    """Tabla con `filas` filas repitiendo la original y numerando el nombre."""
+    veces = -(-filas // len(tabla))
+    grande = pd.concat([tabla] * veces, ignore_index=True).iloc[:filas].copy()
+    primera = grande.columns[0]
+    grande[primera] = grande[primera] + " " + grande.index.astype(str)
+    return grande
+
+
+def medir(funcion, tabla, repeticiones):
+    return min(timeit.repeat(lambda: funcion(tabla), number=repeticiones, repeat=3)) / repeticiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filas", type=int, nargs="+", default=[10, 1000, 10000])
+    args = parser.parse_args()
+
+    catalogo = cargar_catalogo()
+    casos = [
+        ("format_menu", format_menu_anterior, catalogo.menu),
+        ("display_menu", display_menu_anterior, catalogo.menu),
+        ("display_distritos", display_distritos_anterior, catalogo.distritos),
+        ("display_postre", display_postre_anterior, catalogo.postres),
+        ("display_bebida", display_bebida_anterior, catalogo.bebidas),
+    ]
+    print(f"{'función':<18} {'filas':>6} {'anterior':>12} {'por columnas':>13} {'cacheado':>10}")
+    for filas in args.filas:
+        repeticiones = max(1, 2000 // filas)
+        for nombre, anterior, tabla in casos:
+            tabla = ampliar(tabla, filas)
+            nueva = getattr(presentacion, nombre)
+            assert nueva.__wrapped__(tabla) == anterior(tabla), f"{nombre} no produce el mismo texto"
+            t_anterior = medir(anterior, tabla, repeticiones)
+            t_nueva = medir(nueva.__wrapped__, tabla, repeticiones)
+            t_cache = medir(nueva, tabla, 1000)
+            print(f"{nombre:<18} {filas:>6} {t_anterior * 1000:>9.3f} ms {t_nueva * 1000:>10.3f} ms "
+                  f"{t_cache * 1e6:>7.2f} µs  (x{t_anterior / t_nueva:.1f} sin caché)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""Reproduce conversaciones grabadas con el servidor falso y mide cada turno.
+
+Cada mensaje pasa por el mismo camino que en la app (motor.MotorChat:
+moderación, respuesta local o del modelo, extracción del pedido confirmado)
+y antes de cada turno se repite el trabajo de un rerun de Streamlit
+(cargar el catálogo y armar el estado inicial). Se informan p50/p95/p99 de
+latencia por turno, llamadas al LLM, tokens por turno y el tiempo medio de
+cada fase (metricas.py), y el resultado se guarda en JSON para comparar
+versiones.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.replay
+    python -m benchmarks.replay --repeticiones 5 --salida actual.json --comparar anterior.json
+"""
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import almacen
+import consumo
+import historico
+import inventario
+from catalogo import cargar_catalogo
+from escritor import obtener_escritor
+from llm import BackendLocal, obtener_cliente
+from metricas import resumen as resumen_fases
+from motor import MotorChat
+from prompts import prompt_inicial
+from servidor_falso import Guion, iniciar_servidor
+
+CONVERSACIONES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "conversaciones")
+GUION = os.path.join(CONVERSACIONES, "guion.json")
+
+
+class BackendMedido:
+    """Envuelve un backend y anota llamadas y tokens del turno en curso."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.llamadas = Counter()
+            self.respuestas = []  # Respuesta o FlujoRespuesta; el uso del flujo se conoce al final
+
+    def _anotar(self, tipo, respuesta=None):
+        with self._lock:
+            self.llamadas[tipo] += 1
+            if respuesta is not None:
+                self.respuestas.append(respuesta)
+        return respuesta
+
+    def completar(self, mensajes, **kwargs):
+        return self._anotar("chat", self.backend.completar(mensajes, **kwargs))
+
+    def completar_stream(self, mensajes, **kwargs):
+        return self._anotar("chat", self.backend.completar_stream(mensajes, **kwargs))
+
+    def extraer(self, mensajes, **kwargs):
+        return self._anotar("extraccion", self.backend.extraer(mensajes, **kwargs))
+
+    def moderar(self, texto, anotar=None):
+        self._anotar("moderacion")
+        return self.backend.moderar(texto, anotar=anotar)
+
+    def resumen(self):
+        with self._lock:
+            return {
+                "llamadas": dict(self.llamadas),
+                "prompt_tokens": sum(r.uso.prompt_tokens for r in self.respuestas),
+                "completion_tokens": sum(r.uso.completion_tokens for r in self.respuestas),
+            }
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano (valores sin ordenar)."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados) + 0.5) - 1))
+    return ordenados[indice]
+
+
+def distribucion(valores):
+    return {
+        "p50": percentil(valores, 50),
+        "p95": percentil(valores, 95),
+        "p99": percentil(valores, 99),
+        "media": sum(valores) / len(valores) if valores else 0.0,
+    }
+
+
+def cargar_conversaciones(directorio=CONVERSACIONES):
+    conversaciones = []
+    for ruta in sorted(glob.glob(os.path.join(directorio, "*.json"))):
+        if os.path.basename(ruta) == os.path.basename(GUION):
+            continue
+        with open(ruta, encoding="utf-8") as f:
+            datos = json.load(f)
+        conversaciones.append({"archivo": os.path.basename(ruta), **datos})
+    return conversaciones
+
+
+def reproducir(conversacion, medido, stream=True):
+    """Reproducir una conversación; devuelve las mediciones de cada turno."""
+    catalogo = cargar_catalogo()
+    sesion = MotorChat(medido, catalogo).nueva_sesion()
+    turnos = []
+    for prompt in conversacion["turnos"]:
+        # Lo que hace cada rerun de la app antes de atender el mensaje
+        inicio = time.perf_counter()
+        catalogo = cargar_catalogo()
+        catalogo_ms = (time.perf_counter() - inicio) * 1000
+        inicio = time.perf_counter()
+        prompt_inicial(catalogo)
+        render_ms = (time.perf_counter() - inicio) * 1000
+
+        medido.reiniciar()
+        inicio = time.perf_counter()
+        turno = MotorChat(medido, catalogo).responder(sesion, prompt, stream=stream)
+        latencia_ms = (time.perf_counter() - inicio) * 1000
+        if turno.extraccion is not None:
+            turno.extraccion.result()  # Fuera de la latencia del turno, pero cuenta sus llamadas
+        turnos.append({
+            "mensaje": prompt,
+            "ruta": turno.ruta if turno.texto is not None else "moderado",
+            "latencia_ms": latencia_ms,
+            "catalogo_ms": catalogo_ms,
+            "render_ms": render_ms,
+            **medido.resumen(),
+        })
+    return turnos
+
+
+def informe(conversaciones, turnos, configuracion):
+    por_tipo = Counter()
+    for t in turnos:
+        por_tipo.update(t["llamadas"])
+    n = len(turnos) or 1
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "version_catalogo": cargar_catalogo().version,
+        "configuracion": configuracion,
+        "turnos": len(turnos),
+        "latencia_ms": distribucion([t["latencia_ms"] for t in turnos]),
+        "llamadas_llm_por_turno": {
+            "total": sum(por_tipo.values()) / n,
+            **{tipo: cantidad / n for tipo, cantidad in sorted(por_tipo.items())},
+        },
+        "tokens_por_turno": {
+            "prompt": sum(t["prompt_tokens"] for t in turnos) / n,
+            "completion": sum(t["completion_tokens"] for t in turnos) / n,
+        },
+        "rerun_ms": {
+            "catalogo": distribucion([t["catalogo_ms"] for t in turnos]),
+            "render": distribucion([t["render_ms"] for t in turnos]),
+        },
+        "rutas": dict(Counter(t["ruta"] for t in turnos)),
+        "fases": resumen_fases(),
+        "consumo_diario": consumo.consumo_diario().reset_index().to_dict("records"),
+        "conversaciones": conversaciones,
+    }
+
+
+def _valor(informe, ruta):
+    for clave in ruta:
+        informe = informe.get(clave, {}) if isinstance(informe, dict) else {}
+    return informe if isinstance(informe, (int, float)) else 0.0
+
+
+def comparar(actual, anterior):
+    """Imprimir la variación de las métricas principales respecto de un informe anterior."""
+    metricas = [
+        ("latencia p50 (ms)", ("latencia_ms", "p50")),
+        ("latencia p95 (ms)", ("latencia_ms", "p95")),
+        ("latencia p99 (ms)", ("latencia_ms", "p99")),
+        ("llamadas LLM/turno", ("llamadas_llm_por_turno", "total")),
+        ("tokens prompt/turno", ("tokens_por_turno", "prompt")),
+        ("tokens completion/turno", ("tokens_por_turno", "completion")),
+        ("rerun catálogo p50 (ms)", ("rerun_ms", "catalogo", "p50")),
+        ("rerun render p50 (ms)", ("rerun_ms", "render", "p50")),
+    ]
+    for nombre, ruta in metricas:
+        a, b = _valor(actual, ruta), _valor(anterior, ruta)
+        cambio = f"{(a - b) / b:+.1%}" if b else "n/a"
+        print(f"{nombre:<26} {b:>10.2f} -> {a:>10.2f}  ({cambio})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--conversaciones", default=CONVERSACIONES, help="directorio con las transcripciones JSON")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--sin-stream", action="store_true", help="pedir respuestas completas en vez de streaming")
+    parser.add_argument("--primer-token", type=float, default=0.05, help="segundos hasta el primer token")
+    parser.add_argument("--por-token", type=float, default=0.002, help="segundos entre fragmentos")
+    parser.add_argument("--moderacion", type=float, default=0.03, help="segundos por moderación")
+    parser.add_argument("--salida", help="archivo JSON del informe (por defecto benchmarks/resultados/)")
+    parser.add_argument("--comparar", help="informe JSON anterior contra el que comparar")
+    args = parser.parse_args()
+
+    latencias = {"primer_token": args.primer_token, "por_token": args.por_token, "moderacion": args.moderacion}
+    salida = args.salida or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "resultados",
+        f"replay-{datetime.now():%Y%m%d-%H%M%S}.json",
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    # El consumo de la repetición va junto al informe, no al consumo.db de la app
+    consumo.RUTA_BD = os.path.splitext(salida)[0] + "-consumo.db"
+    # Los pedidos extraídos van a una base propia de la corrida, sin migrar el orders.csv del repo
+    almacen.RUTA_BD = os.path.splitext(salida)[0] + "-pedidos.db"
+    almacen.ORDERS_CSV = os.path.splitext(salida)[0] + "-orders.csv"  # No existe: nada que migrar
+    historico.DIRECTORIO_HISTORICO = os.path.splitext(salida)[0] + "-historico"
+    inventario.RUTA_BD = os.path.splitext(salida)[0] + "-inventario.db"
+    if os.path.exists(consumo.RUTA_BD):
+        os.remove(consumo.RUTA_BD)
+    servidor, url = iniciar_servidor(Guion.desde_archivo(GUION, **latencias))
+    medido = BackendMedido(BackendLocal(obtener_cliente("openai", "local", base_url=f"{url}/v1")))
+
+    conversaciones, turnos = [], []
+    try:
+        for repeticion in range(args.repeticiones):
+            for conversacion in cargar_conversaciones(args.conversaciones):
+                medidos = reproducir(conversacion, medido, stream=not args.sin_stream)
+                turnos.extend(medidos)
+                if repeticion == 0:
+                    conversaciones.append({"archivo": conversacion["archivo"], "turnos": medidos})
+    finally:
+        servidor.shutdown()
+
+    obtener_escritor().vaciar()  # Los pedidos extraídos se guardan en segundo plano
+    configuracion = {**latencias, "repeticiones": args.repeticiones, "stream": not args.sin_stream}
+    resultado = informe(conversaciones, turnos, configuracion)
+    resultado["pedidos_guardados"] = almacen.obtener_almacen().contar()
+    historico.obtener_historico().volcar()
+    resultado["pedidos_archivados"] = int(historico.leer()["pedido_id"].nunique())
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+
+    latencia = resultado["latencia_ms"]
+    print(f"{resultado['turnos']} turnos; latencia p50={latencia['p50']:.1f} ms "
+          f"p95={latencia['p95']:.1f} ms p99={latencia['p99']:.1f} ms")
+    print(f"Llamadas LLM por turno: {resultado['llamadas_llm_por_turno']}")
+    print(f"Tokens por turno: {resultado['tokens_por_turno']}")
+    print(f"Rutas: {resultado['rutas']}")
+    print(f"Pedidos guardados: {resultado['pedidos_guardados']}, "
+          f"archivados en Parquet: {resultado['pedidos_archivados']}")
+    for fase, valores in resultado["fases"].items():
+        print(f"  {fase:<13} n={valores['cuenta']:<5} media={valores['media_ms']:.1f} ms")
+    print(f"Informe guardado en {salida}")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(resultado, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Mide las ventas incrementales frente al recálculo en lote sobre un año sintético.
+
+Genera pedidos al azar con la carta actual, los escribe como histórico
+Parquet particionado por día y mide:
+  - leer todo el histórico y solo el último mes,
+  - recalcular en lote todos los agregados (pandas/NumPy),
+  - sumar un pedido a los agregados ya calculados.
+Al final comprueba que lote + incremental da lo mismo que todo en lote.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.ventas --dias 365 --pedidos-por-dia 3000
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import historico
+from analitica import Ventas
+from catalogo import cargar_catalogo
+
+PAGOS = ["Yape", "Plin", "Efectivo", "Tarjeta"]
+# Peso de cada hora del día: almuerzo y cena concentran los pedidos
+PESO_HORA = np.array([0, 0, 0, 0, 0, 0, 0, 1, 2, 2, 3, 6, 12, 14, 10, 4, 3, 3, 5, 9, 10, 7, 3, 1], dtype=float)
+
+
+def pedidos_sinteticos(catalogo, dias, pedidos_por_dia, semilla=0):
+    """Filas del histórico (una por plato) de `dias` días de pedidos al azar."""
+    azar = np.random.default_rng(semilla)
+    platos = pd.concat([
+        catalogo.menu[["Plato", "Precio"]].set_axis(["plato", "precio"], axis=1),
+        catalogo.postres[["Postres", "Precio"]].set_axis(["plato", "precio"], axis=1),
+        catalogo.bebidas[["descripcion", "precio"]].set_axis(["plato", "precio"], axis=1),
+    ], ignore_index=True)
+    distritos = catalogo.distritos["Distrito"].to_numpy()
+
+    n = dias * pedidos_por_dia
+    lineas = azar.integers(1, 4, n)  # Platos distintos por pedido
+    dia = np.repeat(np.arange(dias), pedidos_por_dia)
+    hora = azar.choice(24, n, p=PESO_HORA / PESO_HORA.sum())
+    segundos = dia * 86400 + hora * 3600 + azar.integers(0, 3600, n)
+    creado = np.datetime64("2024-01-01") + segundos.astype("timedelta64[s]")
+
+    pedido = np.repeat(np.arange(n), lineas)
+    plato = azar.integers(0, len(platos), len(pedido))
+    cantidad = azar.integers(1, 5, len(pedido))
+    precio = platos["precio"].to_numpy(dtype=float)[plato]
+    filas = pd.DataFrame({
+        "pedido_id": pd.Series(pedido).map("p{:08d}".format),
+        "creado": creado[pedido].astype("datetime64[ms]"),
+        "distrito": distritos[azar.integers(0, len(distritos), n)][pedido],
+        "metodo_pago": np.array(PAGOS)[azar.integers(0, len(PAGOS), n)][pedido],
+        "plato": platos["plato"].to_numpy()[plato],
+        "cantidad": cantidad.astype("int32"),
+        "precio_unitario": precio,
+        "precio_total": cantidad * precio,
+    })
+    # Un mismo plato puede salir dos veces en un pedido: se suma en una línea
+    filas = filas.groupby(["pedido_id", "plato"], as_index=False, sort=False).agg({
+        "creado": "first", "distrito": "first", "metodo_pago": "first",
+        "cantidad": "sum", "precio_unitario": "first", "precio_total": "sum",
+    })
+    filas["total_pedido"] = filas.groupby("pedido_id")["precio_total"].transform("sum")
+    filas["version_catalogo"] = catalogo.version
+    return filas[historico.ESQUEMA.names]
+
+
+def escribir_historico(filas, directorio):
+    """Escribir las filas con la misma estructura de particiones que historico.py."""
+    import pyarrow as pa
+    import pyarrow.dataset as pds
+
+    tabla = pa.Table.from_pandas(filas, schema=historico.ESQUEMA, preserve_index=False)
+    tabla = tabla.append_column("fecha", pa.array(filas["creado"].dt.strftime("%Y-%m-%d")))
+    pds.write_dataset(tabla, directorio, format="parquet", partitioning=historico.PARTICIONES,
+                      basename_template="pedidos-{i}.parquet", existing_data_behavior="overwrite_or_ignore")
+
+
+def medir(funcion, repeticiones=3):
+    """Mejor tiempo de `repeticiones` llamadas y el último resultado."""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--pedidos-por-dia", type=int, default=3000)
+    parser.add_argument("--incrementales", type=int, default=20000, help="pedidos que se suman uno a uno")
+    args = parser.parse_args()
+
+    catalogo = cargar_catalogo()
+    inicio = time.perf_counter()
+    filas = pedidos_sinteticos(catalogo, args.dias, args.pedidos_por_dia)
+    pedidos = args.dias * args.pedidos_por_dia
+    print(f"{pedidos:,} pedidos ({len(filas):,} filas) generados en {time.perf_counter() - inicio:.1f} s")
+
+    directorio = tempfile.mkdtemp(prefix="ventas-")
+    try:
+        escribir_historico(filas, directorio)
+        t_todo, leidas = medir(lambda: historico.leer(directorio=directorio), 1)
+        ultimo_mes = filas["creado"].max().strftime("%Y-%m-01")
+        t_mes, _ = medir(lambda: historico.leer(desde=ultimo_mes, directorio=directorio), 1)
+    finally:
+        shutil.rmtree(directorio)
+    print(f"Leer el histórico: todo {t_todo * 1000:.0f} ms ({len(leidas):,} filas), "
+          f"último mes {t_mes * 1000:.0f} ms")
+
+    t_lote, todo = medir(lambda: Ventas.desde_tabla(filas))
+    print(f"Recalcular en lote: {t_lote * 1000:.0f} ms")
+
+    # Los últimos pedidos se suman uno a uno sobre el lote de los anteriores
+    ids = filas["pedido_id"].unique()
+    nuevos = set(ids[-args.incrementales:])
+    es_nuevo = filas["pedido_id"].isin(nuevos)
+    ventas = Ventas.desde_tabla(filas[~es_nuevo])
+    por_pedido = [
+        grupo.to_dict("records")
+        for _, grupo in filas[es_nuevo].groupby("pedido_id", sort=False)
+    ]
+    inicio = time.perf_counter()
+    for filas_pedido in por_pedido:
+        ventas.agregar(filas_pedido)
+    t_pedido = (time.perf_counter() - inicio) / len(por_pedido)
+    print(f"Sumar un pedido: {t_pedido * 1e6:.1f} µs "
+          f"({t_lote / t_pedido:,.0f} veces menos que recalcular en lote)")
+    print(f"Recalcular con cada pedido costaría {t_lote * args.pedidos_por_dia / 60:.1f} min por día; "
+          f"incremental, {t_pedido * args.pedidos_por_dia * 1000:.1f} ms")
+
+    iguales = (
+        ventas.pedidos == todo.pedidos
+        and np.isclose(ventas.ingresos, todo.ingresos)
+        and np.allclose(ventas.por_hora, todo.por_hora)
+        and all(np.isclose(ventas.por_plato[p][1], v[1]) for p, v in todo.por_plato.items())
+        and all(np.isclose(ventas.por_distrito[d][1], v[1]) for d, v in todo.por_distrito.items())
+    )
+    print(f"Lote + incremental coincide con el lote completo: {'sí' if iguales else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
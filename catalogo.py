@@ -0,0 +1,164 @@
+import hashlib
+import io
+import os
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+from typing import NamedTuple
+
+import pandas as pd
+
+# Directorio donde viven los CSV del catálogo (el mismo que los scripts)
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+# Archivos que forman el catálogo
+ARCHIVOS = {
+    "menu": "carta.csv",
+    "distritos": "distritos.csv",
+    "bebidas": "Bebidas.csv",
+    "postres": "Postres.csv",
+}
+
+# Caché a nivel de proceso: sobrevive a los reruns de Streamlit porque el
+# módulo importado se mantiene en sys.modules y se comparte entre sesiones.
+_lock = threading.Lock()
+_tablas = {}  # ruta -> _Entrada
+_catalogos = {}  # directorio -> Catalogo
+_indices = {}  # versión del catálogo -> índice del menú
+_menus = {}  # (versión del catálogo, platos agotados) -> menú sin los agotados
+
+
+@dataclass(frozen=True)
+class _Entrada:
+    firma: tuple  # (mtime_ns, tamaño) del archivo cuando se leyó
+    digest: str  # hash del contenido
+    tabla: pd.DataFrame
+
+
+@dataclass(frozen=True)
+class Catalogo:
+    """Instantánea inmutable del catálogo compartida por todas las sesiones.
+
+    Los DataFrames son de solo lectura: quien necesite modificarlos debe
+    trabajar sobre una copia.
+    """
+    menu: pd.DataFrame
+    distritos: pd.DataFrame
+    bebidas: pd.DataFrame
+    postres: pd.DataFrame
+    version: str
+
+
+def _firma(ruta):
+    estado = os.stat(ruta)
+    return (estado.st_mtime_ns, estado.st_size)
+
+
+def _leer(ruta, firma, anterior):
+    """Lee el archivo y solo lo vuelve a parsear si su contenido cambió."""
+    with open(ruta, "rb") as f:
+        contenido = f.read()
+    digest = hashlib.sha1(contenido).hexdigest()
+    if anterior is not None and anterior.digest == digest:
+        # Solo cambió el mtime (p. ej. un `touch`): se reutiliza la tabla
+        return _Entrada(firma, digest, anterior.tabla)
+    # Se parsean los mismos bytes que se hashearon, sin volver a abrir el archivo
+    return _Entrada(firma, digest, pd.read_csv(io.BytesIO(contenido)))
+
+
+def _obtener(ruta):
+    """Devuelve la entrada cacheada de `ruta`, recargándola si cambió en disco."""
+    ruta = os.path.abspath(ruta)
+    firma = _firma(ruta)
+    entrada = _tablas.get(ruta)
+    if entrada is not None and entrada.firma == firma:
+        return entrada
+    with _lock:
+        entrada = _tablas.get(ruta)
+        if entrada is None or entrada.firma != firma:
+            entrada = _leer(ruta, firma, entrada)
+            _tablas[ruta] = entrada
+        return entrada
+
+
+def leer_csv(ruta):
+    """Cargar un CSV una sola vez por proceso; se invalida si cambia su mtime o contenido."""
+    return _obtener(ruta).tabla
+
+
+def cargar_catalogo(directorio=DIRECTORIO):
+    """Cargar menú, distritos, bebidas y postres como una instantánea compartida.
+
+    La instantánea solo se reconstruye cuando alguno de los archivos cambia, y
+    su `version` identifica el contenido para cachear lo que se derive de ella.
+    """
+    entradas = {
+        nombre: _obtener(os.path.join(directorio, archivo))
+        for nombre, archivo in ARCHIVOS.items()
+    }
+    version = hashlib.sha1(
+        "".join(entradas[nombre].digest for nombre in ARCHIVOS).encode()
+    ).hexdigest()[:12]
+
+    catalogo = _catalogos.get(directorio)
+    if catalogo is not None and catalogo.version == version:
+        return catalogo
+    with _lock:
+        catalogo = _catalogos.get(directorio)
+        if catalogo is None or catalogo.version != version:
+            catalogo = Catalogo(
+                version=version,
+                **{nombre: entrada.tabla for nombre, entrada in entradas.items()},
+            )
+            _catalogos[directorio] = catalogo
+        return catalogo
+
+
+class ItemMenu(NamedTuple):
+    plato: str
+    precio: float
+    stock: int
+
+
+def normalizar(texto):
+    """Pasar a minúsculas, quitar tildes y colapsar espacios para comparar nombres."""
+    texto = unicodedata.normalize("NFKD", str(texto).lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", texto).strip()
+
+
+def indice_menu(catalogo):
+    """Índice nombre normalizado -> ItemMenu, construido una vez por versión del catálogo.
+
+    Permite validar cada plato de un pedido en O(1) sin recorrer la columna
+    `Plato` del menú.
+    """
+    indice = _indices.get(catalogo.version)
+    if indice is not None:
+        return indice
+    menu = catalogo.menu
+    indice = {
+        normalizar(plato): ItemMenu(plato, float(precio), int(stock))
+        for plato, precio, stock in zip(menu["Plato"], menu["Precio"], menu["Stock"])
+    }
+    with _lock:
+        # Se guarda solo el índice de la versión vigente
+        _indices.clear()
+        _indices[catalogo.version] = indice
+    return indice
+
+
+def menu_disponible(catalogo, agotados=frozenset()):
+    """Carta sin los platos agotados, construida una vez por versión y conjunto de agotados."""
+    if not agotados:
+        return catalogo.menu
+    clave = (catalogo.version, agotados)
+    menu = _menus.get(clave)
+    if menu is not None:
+        return menu
+    menu = catalogo.menu[~catalogo.menu["Plato"].isin(agotados)]
+    with _lock:
+        _menus.clear()
+        _menus[clave] = menu
+    return menu
@@ -0,0 +1,83 @@
+"""Cliente HTTP del API del chat (api.py) para la interfaz de Streamlit y otros canales."""
+import json
+import os
+import threading
+
+import httpx
+
+URL_POR_DEFECTO = "http://localhost:8000"
+ESPERA = httpx.Timeout(10.0, read=120.0)  # La lectura espera al LLM
+# Menos que los 5 s de uvicorn: así no se reusa una conexión que el servidor está cerrando
+ESPERA_KEEPALIVE = 4.0
+
+_lock = threading.Lock()
+_clientes = {}  # url -> ClienteChat
+
+
+class ErrorAPI(Exception):
+    """El API respondió con un error; `estado` es el código HTTP."""
+
+    def __init__(self, estado, detalle):
+        super().__init__(f"{estado}: {detalle}")
+        self.estado = estado
+        self.detalle = detalle
+
+
+def _detalle(respuesta):
+    try:
+        return respuesta.json().get("detalle", respuesta.text)
+    except ValueError:
+        return respuesta.text
+
+
+class ClienteChat:
+    """Sesiones y turnos del chat a través del API; las respuestas son las de api.py."""
+
+    def __init__(self, url=URL_POR_DEFECTO, http=None):
+        self.url = url.rstrip("/")
+        self._http = http or httpx.Client(
+            base_url=self.url, timeout=ESPERA, limits=httpx.Limits(keepalive_expiry=ESPERA_KEEPALIVE)
+        )
+
+    def _pedir(self, metodo, ruta, **kwargs):
+        respuesta = self._http.request(metodo, ruta, **kwargs)
+        if respuesta.status_code >= 400:
+            raise ErrorAPI(respuesta.status_code, _detalle(respuesta))
+        return respuesta.json()
+
+    def crear_sesion(self):
+        """{"sesion": id, "mensajes": [...]} de una conversación nueva."""
+        return self._pedir("POST", "/sesiones")
+
+    def sesion(self, id):
+        return self._pedir("GET", f"/sesiones/{id}")
+
+    def reiniciar(self, id):
+        return self._pedir("POST", f"/sesiones/{id}/reiniciar")
+
+    def enviar(self, id, mensaje):
+        """Eventos del turno a medida que llegan: inicio, fragmento..., fin (o moderado / error)."""
+        with self._http.stream("POST", f"/sesiones/{id}/mensajes", json={"mensaje": mensaje, "stream": True}) as r:
+            if r.status_code >= 400:
+                r.read()
+                raise ErrorAPI(r.status_code, _detalle(r))
+            for linea in r.iter_lines():
+                if linea:
+                    yield json.loads(linea)
+
+
+def obtener_cliente_chat(config=None):
+    """Cliente compartido por el proceso.
+
+    `config` es un mapeo como st.secrets; la URL del API sale de
+    SAZONBOT_API_URL o, si falta, de la variable de entorno del mismo nombre.
+    """
+    if config is not None and "SAZONBOT_API_URL" in config:
+        url = config["SAZONBOT_API_URL"]
+    else:
+        url = os.environ.get("SAZONBOT_API_URL", URL_POR_DEFECTO)
+    cliente = _clientes.get(url)
+    if cliente is not None:
+        return cliente
+    with _lock:
+        return _clientes.setdefault(url, ClienteChat(url))
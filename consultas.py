@@ -0,0 +1,113 @@
+import re
+import threading
+from typing import NamedTuple
+
+from catalogo import normalizar
+from pedidos import buscador
+
+# Palabras con las que suele empezar una pregunta sobre la carta
+_PREGUNTA = re.compile(
+    r"^(que|cual|cuales|cuanto|cuanta|cuantos|tienen|tienes|hay|reparten|llegan|hacen|"
+    r"envian|donde|muestrame|muestreme|me muestras|puedo ver|quiero ver|ver)\b"
+)
+_PRECIO = re.compile(r"\b(cuanto cuesta|cuanto cuestan|cuanto sale|cuanto esta|cuesta|cuestan|precio|vale)\b")
+_REPARTO = re.compile(r"\b(reparten|repartes|reparto|delivery|llegan|envian|entregan|distritos|zonas)\b")
+_LUGAR = re.compile(r"\b(reparten|llegan|envian|entregan|delivery)\s+(a|en|hasta|por)\s+[a-z]")
+_POSTRES = re.compile(r"\bpostres?\b")
+_BEBIDAS = re.compile(r"\b(bebidas?|gaseosas?|refrescos?|tomar)\b")
+_MENU = re.compile(r"\b(menu|carta|platos?|que tienen|que hay)\b")
+
+_lock = threading.Lock()
+_precios = {}  # versión del catálogo -> {nombre: precio}
+_rutas = {}  # intención o "llm" -> [cantidad, segundos]
+
+
+class Consulta(NamedTuple):
+    intencion: str  # "precio", "reparto", "distritos", "postres", "bebidas" o "menu"
+    valor: object = None  # (nombre, precio) o distrito, según la intención
+
+
+# Rutas que responden la pregunta sin el LLM; "cantidad", "sin_stock" y "presupuesto" son avisos
+INTENCIONES = frozenset({"precio", "reparto", "distritos", "postres", "bebidas", "menu"})
+
+
+def _precios_catalogo(catalogo):
+    """Precio de cada plato, bebida y postre por nombre, una vez por versión del catálogo."""
+    precios = _precios.get(catalogo.version)
+    if precios is not None:
+        return precios
+    precios = {}
+    for tabla, nombre, precio in (
+        (catalogo.menu, "Plato", "Precio"),
+        (catalogo.bebidas, "descripcion", "precio"),
+        (catalogo.postres, "Postres", "Precio"),
+    ):
+        precios.update(zip(tabla[nombre], tabla[precio].astype(float)))
+    with _lock:
+        _precios.clear()
+        _precios[catalogo.version] = precios
+    return precios
+
+
+def clasificar_consulta(texto, catalogo):
+    """Detecta preguntas sobre la carta que se pueden responder sin el LLM.
+
+    Devuelve una Consulta o None si el mensaje no es una pregunta de catálogo
+    (por ejemplo, si contiene un pedido con cantidades).
+    """
+    normalizado = normalizar(re.sub(r"[^\w ]", " ", normalizar(texto)))
+    if "?" not in texto and not _PREGUNTA.search(normalizado):
+        return None
+    analisis = buscador(catalogo).analizar(normalizado)
+    if analisis.items:
+        return None  # Es un pedido, no una consulta
+
+    if _PRECIO.search(normalizado):
+        nombres = [nombre for _, nombre in buscador(catalogo).mencionados(normalizado)]
+        if len(nombres) != 1:
+            return None
+        return Consulta("precio", (nombres[0], _precios_catalogo(catalogo)[nombres[0]]))
+
+    if _REPARTO.search(normalizado):
+        for distrito in catalogo.distritos["Distrito"]:
+            if normalizar(distrito) in normalizado:
+                return Consulta("reparto", distrito)
+        if _LUGAR.search(normalizado):
+            # Preguntan por un lugar que no está entre los distritos de reparto
+            return Consulta("reparto", None)
+        return Consulta("distritos")
+
+    if _POSTRES.search(normalizado):
+        return Consulta("postres")
+    if _BEBIDAS.search(normalizado):
+        return Consulta("bebidas")
+    if _MENU.search(normalizado):
+        return Consulta("menu")
+    return None
+
+
+def registrar_ruta(ruta, segundos):
+    """Registrar cómo se resolvió un turno (intención local o "llm") y cuánto tardó."""
+    with _lock:
+        acumulado = _rutas.setdefault(ruta, [0, 0.0])
+        acumulado[0] += 1
+        acumulado[1] += segundos
+
+
+def estadisticas_consultas():
+    """Turnos por ruta y latencia estimada ahorrada al no llamar al LLM.
+
+    La tasa local y la latencia ahorrada cuentan solo las consultas que se
+    respondieron localmente, no los avisos (cantidades, stock, presupuesto).
+    """
+    with _lock:
+        rutas = {ruta: tuple(valores) for ruta, valores in _rutas.items()}
+    llamadas_llm, segundos_llm = rutas.get("llm", (0, 0.0))
+    locales = sum(n for ruta, (n, _) in rutas.items() if ruta in INTENCIONES)
+    segundos_locales = sum(s for ruta, (_, s) in rutas.items() if ruta in INTENCIONES)
+    promedio_llm = segundos_llm / llamadas_llm if llamadas_llm else 0.0
+    return {
+        "turnos": {ruta: n for ruta, (n, _) in rutas.items()},
+        "tasa_local": locales / (locales + llamadas_llm) if locales + llamadas_llm else 0.0,
+        "latencia_ahorrada_s": max(0.0, locales * promedio_llm - segundos_locales),
+    }
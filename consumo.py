@@ -0,0 +1,254 @@
+"""Consumo de tokens por llamada, por sesión y por día.
+
+Cada llamada al modelo (chat y extracción) se anota en consumo.db (SQLite)
+con sus tokens y su costo según llm.PRECIOS, y cada pedido confirmado y
+extraído se anota como una fila "pedido". El turno solo encola la fila: un
+hilo de fondo las guarda por lotes, así que no hay escritura a disco en el
+camino de la respuesta y varios workers pueden anotar a la vez.
+consumo_diario() agrega la tabla por día con el costo por pedido completado.
+
+El antiguo consumo.csv se importa la primera vez y se renombra a
+consumo.csv.migrado.
+
+Uso:
+    python consumo.py  # Consumo de los últimos días
+"""
+import atexit
+import csv
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+import pytz
+
+from llm import Uso, costo
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RUTA_BD = os.path.join(DIRECTORIO, "consumo.db")
+CSV_ANTIGUO = os.path.join(DIRECTORIO, "consumo.csv")
+COLUMNAS = ["fecha", "hora", "sesion", "tipo", "modelo", "prompt_tokens", "completion_tokens", "costo_usd"]
+ESPERA_BLOQUEO_MS = 5000
+INTERVALO = 1.0  # Segundos que se juntan filas antes de guardarlas
+REINTENTOS = 5  # Intentos de guardar un lote si la base está bloqueada
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS consumo (
+    fecha TEXT NOT NULL,
+    hora TEXT NOT NULL,
+    sesion TEXT,
+    tipo TEXT NOT NULL,
+    modelo TEXT,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    costo_usd REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_consumo_fecha ON consumo(fecha);
+"""
+
+# Tokens (entrada + salida) que puede gastar una sesión
+PRESUPUESTO_SESION = 60000
+# Desde esta fracción del presupuesto se envía un contexto más corto
+FRACCION_COMPACTAR = 0.6
+TURNOS_COMPACTADOS = 2
+CONTEXTO_COMPACTADO = 3000  # Tokens
+
+MENSAJE_PRESUPUESTO = (
+    "Hemos llegado al límite de esta conversación. Si ya confirmaste tu pedido, "
+    "¡lo estamos preparando! Para hacer un pedido nuevo pulsa «Eliminar conversación» "
+    "y empezamos de nuevo."
+)
+
+_lock = threading.Lock()
+_registros = {}  # ruta -> RegistroConsumo
+
+
+@dataclass
+class ConsumoSesion:
+    """Tokens y costo acumulados de una sesión."""
+    llamadas: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    costo_usd: float = 0.0
+
+    @property
+    def tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+    def sumar(self, uso, costo_usd):
+        self.llamadas += 1
+        self.prompt_tokens += uso.prompt_tokens
+        self.completion_tokens += uso.completion_tokens
+        self.costo_usd += costo_usd
+
+    def incluir(self, otro):
+        """Sumar otro consumo (el de la extracción en segundo plano, por ejemplo)."""
+        self.llamadas += otro.llamadas
+        self.prompt_tokens += otro.prompt_tokens
+        self.completion_tokens += otro.completion_tokens
+        self.costo_usd += otro.costo_usd
+
+    def menos(self, otro):
+        """Consumo de más respecto de `otro` (lo gastado desde que se tomó `otro`)."""
+        return ConsumoSesion(self.llamadas - otro.llamadas, self.prompt_tokens - otro.prompt_tokens,
+                             self.completion_tokens - otro.completion_tokens, self.costo_usd - otro.costo_usd)
+
+
+class RegistroConsumo:
+    """Filas de consumo encoladas en memoria y guardadas por lotes desde un hilo de fondo."""
+
+    def __init__(self, ruta=RUTA_BD):
+        self.ruta = ruta
+        self._cola = queue.SimpleQueue()
+        self._pendientes = 0
+        self._lock = threading.Lock()
+        conexion = self._conectar()
+        conexion.executescript(ESQUEMA)
+        conexion.close()
+        self._hilo = threading.Thread(target=self._escribir, daemon=True, name="consumo")
+        self._hilo.start()
+
+    def _conectar(self):
+        conexion = sqlite3.connect(self.ruta, timeout=ESPERA_BLOQUEO_MS / 1000)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute("PRAGMA synchronous=NORMAL")
+        return conexion
+
+    def anotar(self, fila):
+        with self._lock:
+            self._pendientes += 1
+        self._cola.put(fila)
+
+    def _lote(self):
+        filas = [self._cola.get()]
+        limite = time.monotonic() + INTERVALO
+        while (restante := limite - time.monotonic()) > 0:
+            try:
+                filas.append(self._cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        return filas
+
+    def guardar(self, filas, conexion):
+        """Insertar `filas` en una transacción; reintenta solo si la base está bloqueada."""
+        for intento in range(1, REINTENTOS + 1):
+            try:
+                with conexion:
+                    conexion.executemany(f"INSERT INTO consumo VALUES ({', '.join('?' * len(COLUMNAS))})", filas)
+                return True
+            except sqlite3.OperationalError as e:
+                error = e
+                time.sleep(0.1 * 2 ** intento)
+            except sqlite3.Error as e:
+                error = e
+                break
+        logging.error(f"Se descartan {len(filas)} filas de consumo: {error}")
+        return False
+
+    def _escribir(self):
+        conexion = self._conectar()
+        while True:
+            filas = self._lote()
+            self.guardar(filas, conexion)
+            with self._lock:
+                self._pendientes -= len(filas)
+
+    def vaciar(self, plazo=10.0):
+        """Esperar a que se guarde lo encolado (hasta `plazo` segundos); se llama al salir."""
+        limite = time.monotonic() + plazo
+        while self._pendientes and time.monotonic() < limite:
+            time.sleep(0.01)
+        return not self._pendientes
+
+
+def migrar_csv(registro, ruta=None):
+    """Importar el consumo.csv antiguo una sola vez y renombrarlo; devuelve las filas importadas."""
+    ruta = ruta or CSV_ANTIGUO
+    if not os.path.exists(ruta):
+        return 0
+    with open(ruta, newline="", encoding="utf-8") as f:
+        filas = [tuple(fila[c] for c in COLUMNAS) for fila in csv.DictReader(f)]
+    conexion = registro._conectar()
+    try:
+        if not registro.guardar(filas, conexion):
+            return 0
+    finally:
+        conexion.close()
+    os.replace(ruta, f"{ruta}.migrado")
+    return len(filas)
+
+
+def obtener_registro(ruta=None):
+    """Registro de consumo compartido por el proceso; lo pendiente se guarda al salir."""
+    ruta = ruta or RUTA_BD
+    registro = _registros.get(ruta)
+    if registro is not None:
+        return registro
+    with _lock:
+        registro = _registros.get(ruta)
+        if registro is None:
+            registro = RegistroConsumo(ruta)
+            if ruta == RUTA_BD:
+                migrar_csv(registro)
+            atexit.register(registro.vaciar)
+            _registros[ruta] = registro
+        return registro
+
+
+def _escribir(sesion_id, tipo, modelo="", uso=Uso(), costo_usd=0.0):
+    ahora = datetime.now(pytz.timezone("America/Lima"))
+    obtener_registro().anotar((ahora.strftime("%Y-%m-%d"), ahora.strftime("%H:%M:%S"), sesion_id, tipo, modelo,
+                               uso.prompt_tokens, uso.completion_tokens, costo_usd))
+
+
+def registrar_llamada(sesion, tipo, modelo, uso):
+    """Anotar una llamada ("chat", "extraccion" o "moderacion") en la sesión y en el archivo; devuelve su costo."""
+    costo_usd = costo(modelo, uso)
+    with _lock:
+        sesion.consumo.sumar(uso, costo_usd)
+    _escribir(sesion.id, tipo, modelo, uso, costo_usd)
+    return costo_usd
+
+
+def sumar_a_sesion(sesion, consumo):
+    """Sumar a la sesión el consumo de un trabajo de fondo ya anotado en el archivo."""
+    with _lock:
+        sesion.consumo.incluir(consumo)
+
+
+def registrar_pedido(sesion):
+    """Anotar un pedido completado (confirmado y extraído) para el costo por pedido."""
+    _escribir(sesion.id, "pedido")
+
+
+def consumo_diario(ruta=None):
+    """Llamadas, tokens, costo y pedidos por día, con el costo medio por pedido completado."""
+    import pandas as pd
+
+    columnas = ["llamadas", "prompt_tokens", "completion_tokens", "costo_usd", "pedidos", "costo_por_pedido"]
+    ruta = ruta or RUTA_BD
+    if ruta in _registros:
+        _registros[ruta].vaciar()  # Incluir lo que el proceso todavía no guardó
+    if not os.path.exists(ruta):
+        return pd.DataFrame(columns=columnas)
+    with sqlite3.connect(ruta) as conexion:
+        registro = pd.read_sql_query("SELECT * FROM consumo", conexion)
+    llamadas = registro[registro["tipo"] != "pedido"]
+    diario = llamadas.groupby("fecha").agg(
+        llamadas=("tipo", "size"),
+        prompt_tokens=("prompt_tokens", "sum"),
+        completion_tokens=("completion_tokens", "sum"),
+        costo_usd=("costo_usd", "sum"),
+    )
+    diario["pedidos"] = registro[registro["tipo"] == "pedido"].groupby("fecha").size()
+    diario["pedidos"] = diario["pedidos"].fillna(0).astype(int)
+    diario["costo_por_pedido"] = diario["costo_usd"] / diario["pedidos"].where(diario["pedidos"] > 0)
+    return diario[columnas]
+
+
+if __name__ == "__main__":
+    print(consumo_diario().tail(14).to_string())
@@ -0,0 +1,103 @@
+import re
+from dataclasses import dataclass
+from datetime import datetime
+
+import pytz
+
+from catalogo import normalizar
+
+# Turnos (usuario + asistente) que siempre se envían completos al modelo
+ULTIMOS_TURNOS = 6
+# Tope aproximado de tokens de la conversación enviada en cada llamada
+PRESUPUESTO_TOKENS = 6000
+
+METODOS_PAGO = ("efectivo", "tarjeta", "yape", "plin")
+_RECOJO = re.compile(r"\b(recoger|recojo|local|tienda)\b")
+
+
+def mensaje_hora_lima():
+    """Mensaje de sistema con la hora actual en Lima.
+
+    Se envía al final de la conversación para que el prompt del sistema no
+    cambie entre llamadas y su prefijo pueda cachearse en el proveedor.
+    """
+    hora_lima = datetime.now(pytz.timezone("America/Lima")).strftime("%Y-%m-%d %H:%M:%S")
+    return {"role": "system", "content": f"Hora actual en Lima: {hora_lima}"}
+
+
+def estimar_tokens(mensajes):
+    """Estimación rápida de tokens (~4 caracteres por token más el rol)."""
+    return sum(len(m["content"]) // 4 + 4 for m in mensajes)
+
+
+def _tabla_pedido(texto):
+    """Filas de la tabla de resumen del pedido (| Plato | Cantidad | ...) si el texto la tiene."""
+    if "Cantidad" not in texto:
+        return None
+    filas = [linea.strip() for linea in texto.splitlines() if linea.strip().startswith("|")]
+    return "\n".join(filas) if filas else None
+
+
+@dataclass
+class ResumenConversacion:
+    """Resumen incremental de los turnos que ya no se envían completos.
+
+    Solo guarda lo necesario para continuar el pedido: la última tabla de
+    resumen mostrada por el asistente, el método de entrega y el de pago.
+    """
+    pedido: str = None
+    entrega: str = None
+    pago: str = None
+    plegados: int = 0  # Mensajes (sin contar el del sistema) ya incluidos en el resumen
+
+    def plegar(self, mensajes, distritos=()):
+        """Incorporar al resumen los mensajes que salen de la ventana."""
+        for mensaje in mensajes:
+            texto = mensaje["content"]
+            if mensaje["role"] == "assistant":
+                self.pedido = _tabla_pedido(texto) or self.pedido
+                continue
+            normalizado = normalizar(texto)
+            for distrito in distritos:
+                if normalizar(distrito) in normalizado:
+                    self.entrega = f"Entrega a domicilio en {distrito}"
+            if _RECOJO.search(normalizado):
+                self.entrega = "Recojo en el local"
+            for metodo in METODOS_PAGO:
+                if metodo in normalizado:
+                    self.pago = metodo
+        self.plegados += len(mensajes)
+
+    def como_mensaje(self):
+        """Mensaje de sistema con el resumen, o None si todavía no hay nada que resumir."""
+        if not self.plegados:
+            return None
+        partes = ["Resumen de la conversación anterior:"]
+        partes.append(f"- Pedido actual:\n{self.pedido}" if self.pedido else "- Pedido actual: sin ítems confirmados")
+        partes.append(f"- Método de entrega: {self.entrega or 'pendiente'}")
+        partes.append(f"- Método de pago: {self.pago or 'pendiente'}")
+        return {"role": "system", "content": "\n".join(partes)}
+
+
+def preparar_contexto(mensajes, resumen, distritos=(), ultimos_turnos=ULTIMOS_TURNOS,
+                      presupuesto_tokens=PRESUPUESTO_TOKENS):
+    """Mensajes a enviar al modelo: prompt del sistema, resumen y últimos turnos.
+
+    Los turnos anteriores a la ventana se pliegan en `resumen` (que debe
+    guardarse en la sesión) y, si aun así se supera el presupuesto de tokens,
+    se pliegan más turnos hasta dejar al menos el último mensaje.
+    """
+    sistema = mensajes[:1] if mensajes and mensajes[0]["role"] == "system" else []
+    resto = mensajes[len(sistema):]
+    if resumen.plegados > len(resto):
+        # La conversación se reinició: se descarta el resumen anterior
+        resumen.__init__()
+
+    corte = max(resumen.plegados, len(resto) - 2 * ultimos_turnos)
+    while True:
+        resumen.plegar(resto[resumen.plegados:corte], distritos)
+        encabezado = [m for m in [resumen.como_mensaje()] if m]
+        enviados = sistema + encabezado + resto[corte:]
+        if estimar_tokens(enviados) <= presupuesto_tokens or corte >= len(resto) - 1:
+            return enviados
+        corte += 1
@@ -0,0 +1,109 @@
+"""Historial de una conversación guardado de forma compacta.
+
+El prompt del sistema y el saludo con la carta son iguales para todas las
+sesiones de una misma versión del catálogo: se construyen una vez
+(prompts.prompt_inicial) y cada conversación solo guarda una referencia a
+ellos. Los mensajes propios de la sesión se guardan como Mensaje, con
+__slots__ en lugar de un diccionario por mensaje.
+"""
+import sys
+import types
+from itertools import chain
+
+
+class Mensaje:
+    """Un mensaje del historial; se lee como el diccionario {"role": ..., "content": ...} de la API."""
+
+    __slots__ = ("role", "content")
+
+    def __init__(self, role, content):
+        self.role = role
+        self.content = content
+
+    def __getitem__(self, clave):
+        if clave not in self.__slots__:
+            raise KeyError(clave)
+        return getattr(self, clave)
+
+    def __repr__(self):
+        return f"Mensaje({self.role!r}, {self.content[:40]!r})"
+
+    def como_dict(self):
+        """Diccionario para enviar a la API del modelo."""
+        return {"role": self.role, "content": self.content}
+
+
+class Conversacion:
+    """Mensajes de una sesión: los del prompt inicial compartido seguidos de los propios.
+
+    Se usa como la lista de mensajes de antes (índices, cortes, len, append y
+    pop); los mensajes del prompt inicial no se copian ni se pueden quitar.
+    """
+
+    __slots__ = ("prompt", "_mensajes")
+
+    def __init__(self, prompt, mensajes=()):
+        self.prompt = prompt  # prompts.PromptInicial compartido por todas las sesiones
+        self._mensajes = list(mensajes)
+
+    def __len__(self):
+        return len(self.prompt.mensajes) + len(self._mensajes)
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            # Solo se recorren los índices del corte: mostrar los últimos mensajes no copia todo
+            return [self[i] for i in range(*indice.indices(len(self)))]
+        if indice < 0:
+            indice += len(self)
+        fijos = len(self.prompt.mensajes)
+        if 0 <= indice < fijos:
+            return self.prompt.mensajes[indice]
+        return self._mensajes[indice - fijos]
+
+    def __iter__(self):
+        return chain(self.prompt.mensajes, self._mensajes)
+
+    def append(self, mensaje):
+        """Agregar un Mensaje (o un diccionario con role y content)."""
+        if not isinstance(mensaje, Mensaje):
+            mensaje = Mensaje(mensaje["role"], mensaje["content"])
+        self._mensajes.append(mensaje)
+
+    def pop(self):
+        return self._mensajes.pop()
+
+    @property
+    def propios(self):
+        """Mensajes de la sesión, sin los del prompt inicial."""
+        return self._mensajes
+
+
+def tamano(objeto, compartidos=()):
+    """Bytes de `objeto` y de todo lo que alcanza, sin contar los objetos de `compartidos`.
+
+    Suma sys.getsizeof de cada objeto una sola vez, siguiendo contenedores,
+    __dict__ y __slots__; clases, módulos y funciones no se recorren.
+    """
+    vistos = {id(o) for o in compartidos}
+    pendientes = [objeto]
+    total = 0
+    while pendientes:
+        o = pendientes.pop()
+        if id(o) in vistos or isinstance(o, (type, types.ModuleType, types.FunctionType)):
+            continue
+        vistos.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            pendientes.extend(o.keys())
+            pendientes.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            pendientes.extend(o)
+        else:
+            if hasattr(o, "__dict__"):
+                pendientes.append(vars(o))
+            for clase in type(o).__mro__:
+                atributos = getattr(clase, "__slots__", ())
+                for atributo in (atributos,) if isinstance(atributos, str) else atributos:
+                    if hasattr(o, atributo):
+                        pendientes.append(getattr(o, atributo))
+    return total
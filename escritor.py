@@ -0,0 +1,161 @@
+"""Escritura diferida de pedidos: una cola acotada y un hilo que guarda por lotes.
+
+El turno del cliente solo encola el pedido; el hilo escritor lo guarda en
+el almacén SQLite junto con los demás pedidos que llegaron en el mismo
+intervalo, en una sola transacción. Los pedidos son idempotentes por id y
+la cola se vacía al terminar el proceso. Los pedidos que no se pueden
+guardar se escriben en pedidos-fallidos.jsonl para recuperarlos a mano.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from almacen import DIRECTORIO, obtener_almacen
+from metricas import fijar, registrar
+
+CAPACIDAD = 1000  # Pedidos en espera como máximo
+TAMANO_LOTE = 50
+INTERVALO = 0.5  # Segundos que se esperan más pedidos antes de guardar un lote
+ESPERA_COLA_LLENA = 2.0  # Segundos que espera quien encola si la cola está llena
+ESPERA_REINTENTO = 1.0  # Segundos antes del primer reintento; se duplica en cada uno
+REINTENTOS = 3  # Reintentos de un lote mientras la base esté bloqueada
+ARCHIVO_FALLIDOS = os.path.join(DIRECTORIO, "pedidos-fallidos.jsonl")
+
+_FIN = object()
+_lock = threading.Lock()
+_escritores = {}  # ruta de la base -> EscritorPedidos
+
+
+class EscritorPedidos:
+    """Hilo de fondo que guarda en `almacen` los pedidos encolados.
+
+    Si la cola está llena, encolar() espera hasta ESPERA_COLA_LLENA segundos
+    (contrapresión) y, si sigue llena, intenta guardar el pedido una vez en
+    el momento, sin reintentos. Solo la base bloqueada (OperationalError) se
+    reintenta con el mismo lote, hasta REINTENTOS veces, lo que es seguro
+    porque guardar es idempotente por id; si otro error hace fallar el lote
+    sus pedidos se guardan de a uno. Lo que no se guarda va a `fallidos`.
+    """
+
+    def __init__(self, almacen, capacidad=CAPACIDAD, tamano_lote=TAMANO_LOTE, intervalo=INTERVALO,
+                 fallidos=ARCHIVO_FALLIDOS):
+        self.almacen = almacen
+        self.fallidos = fallidos
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self._cola = queue.Queue(maxsize=capacidad)
+        self._pendientes = set()  # Ids encolados y todavía no guardados
+        self._lock = threading.Lock()
+        self._hilo = threading.Thread(target=self._escribir, daemon=True, name="escritor-pedidos")
+        self._hilo.start()
+
+    def encolar(self, pedido):
+        """Encolar un pedido; devuelve False si ese id ya estaba en espera."""
+        with self._lock:
+            if pedido.id in self._pendientes:
+                return False
+            self._pendientes.add(pedido.id)
+        try:
+            self._cola.put(pedido, timeout=ESPERA_COLA_LLENA)
+        except queue.Full:
+            logging.warning("Cola de pedidos llena: se guarda el pedido sin esperar al escritor")
+            self._guardar([pedido], reintentos=0)
+        fijar("cola_pedidos", self._cola.qsize())
+        return True
+
+    def _guardar_lote(self, lote, reintentos):
+        for intento in range(reintentos + 1):
+            try:
+                return self.almacen.guardar_lote(lote)
+            except sqlite3.OperationalError as e:
+                if intento == reintentos:
+                    raise
+                logging.warning(f"Base de pedidos ocupada, se reintenta el lote de {len(lote)}: {e}")
+                time.sleep(ESPERA_REINTENTO * 2 ** intento)
+
+    def _guardar(self, lote, reintentos=REINTENTOS):
+        inicio = time.perf_counter()
+        try:
+            self._guardar_lote(lote, reintentos)
+            registrar("escritura", time.perf_counter() - inicio)
+        except sqlite3.OperationalError as e:
+            self._descartar(lote, e)
+        except Exception as e:
+            if len(lote) == 1:
+                self._descartar(lote, e)
+            else:
+                # Un pedido inválido no se lleva al resto del lote
+                for pedido in lote:
+                    self._guardar([pedido], reintentos=0)
+        finally:
+            with self._lock:
+                self._pendientes.difference_update(pedido.id for pedido in lote)
+
+    def _descartar(self, lote, error):
+        """Escribir en `fallidos` los pedidos que no se pudieron guardar."""
+        logging.error(f"No se pudieron guardar {len(lote)} pedidos ({error!r}); van a {self.fallidos}")
+        try:
+            with self._lock, open(self.fallidos, "a", encoding="utf-8") as f:
+                for pedido in lote:
+                    f.write(json.dumps({"error": repr(error), "pedido": pedido._asdict()},
+                                       ensure_ascii=False, default=str) + "\n")
+        except OSError as e:
+            logging.error(f"Tampoco se pudieron escribir en {self.fallidos}: {e}; pedidos: {lote}")
+
+    def _escribir(self):
+        terminar = False
+        while not terminar:
+            primero = self._cola.get()
+            if primero is _FIN:
+                break
+            lote = [primero]
+            limite = time.monotonic() + self.intervalo
+            while len(lote) < self.tamano_lote:
+                try:
+                    pedido = self._cola.get(timeout=max(0.0, limite - time.monotonic()))
+                except queue.Empty:
+                    break
+                if pedido is _FIN:
+                    terminar = True
+                    break
+                lote.append(pedido)
+            self._guardar(lote)
+            fijar("cola_pedidos", self._cola.qsize())
+
+    def vaciar(self, plazo=10.0):
+        """Esperar a que se guarde todo lo encolado (hasta `plazo` segundos)."""
+        limite = time.monotonic() + plazo
+        while self._pendientes and time.monotonic() < limite:
+            time.sleep(0.01)
+        return not self._pendientes
+
+    def cerrar(self, plazo=10.0):
+        """Guardar lo pendiente y detener el hilo; se llama al salir del proceso."""
+        if not self._hilo.is_alive():
+            return
+        try:
+            self._cola.put(_FIN, timeout=plazo)
+        except queue.Full:
+            pass
+        self._hilo.join(plazo)
+        if self._pendientes:
+            logging.error(f"{len(self._pendientes)} pedidos sin guardar al cerrar el escritor")
+
+
+def obtener_escritor(ruta=None):
+    """Escritor compartido por el proceso para el almacén en `ruta`; se cierra con el proceso."""
+    escritor = _escritores.get(ruta)
+    if escritor is not None:
+        return escritor
+    with _lock:
+        escritor = _escritores.get(ruta)
+        if escritor is None:
+            escritor = EscritorPedidos(obtener_almacen(ruta))
+            atexit.register(escritor.cerrar)
+            _escritores[ruta] = escritor
+        return escritor
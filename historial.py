@@ -0,0 +1,47 @@
+"""Historial del chat en Streamlit: solo se dibujan los últimos mensajes.
+
+Cada rerun dibuja a lo sumo MENSAJES_VISIBLES mensajes (más los que el
+cliente pidió con "Ver más"), así que el costo del rerun no crece con el
+largo de la conversación. El botón "Ver más" agrega PAGINA mensajes
+anteriores cada vez.
+"""
+import streamlit as st
+
+MENSAJES_VISIBLES = 8
+PAGINA = 10
+CLAVE = "historial_visibles"  # Cuántos mensajes muestra esta sesión
+
+
+def ventana(mensajes, visibles):
+    """Índice del primer mensaje a dibujar y cuántos mensajes de la conversación quedan ocultos.
+
+    El mensaje del sistema del inicio no cuenta: nunca se muestra.
+    """
+    primero = 1 if mensajes and mensajes[0]["role"] == "system" else 0
+    inicio = max(primero, len(mensajes) - visibles)
+    return inicio, inicio - primero
+
+
+def reiniciar_historial():
+    """Volver a mostrar solo los últimos mensajes (al eliminar la conversación)."""
+    st.session_state.pop(CLAVE, None)
+
+
+def _ver_mas():
+    # Callback del botón: corre antes del rerun, así el historial ya sale ampliado
+    st.session_state[CLAVE] = st.session_state.get(CLAVE, MENSAJES_VISIBLES) + PAGINA
+
+
+def mostrar_historial(mensajes, avatares):
+    """Dibujar los últimos mensajes; los anteriores quedan detrás del botón "Ver más".
+
+    `avatares` es rol -> avatar de st.chat_message.
+    """
+    inicio, ocultos = ventana(mensajes, st.session_state.get(CLAVE, MENSAJES_VISIBLES))
+    if ocultos:
+        st.button(f"Ver más ({ocultos} mensajes anteriores)", key="ver_mas", on_click=_ver_mas)
+    for message in mensajes[inicio:]:
+        if message["role"] == "system":
+            continue
+        with st.chat_message(message["role"], avatar=avatares.get(message["role"])):
+            st.markdown(message["content"])
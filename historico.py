@@ -0,0 +1,329 @@
+"""Histórico de pedidos confirmados en Parquet, particionado por día.
+
+Cada pedido extraído de una confirmación se valida contra los precios del
+catálogo y se guarda como una fila por plato en
+historico/fecha=YYYY-MM-DD/parte-*.parquet (particiones estilo Hive, así
+que pyarrow, pandas, DuckDB o Spark pueden leer meses de pedidos filtrando
+por fecha sin abrir el resto).
+
+Las filas se acumulan en un buffer y se vuelcan cada TAMANO_BUFFER filas,
+a más tardar ESPERA_MAXIMA segundos después de llegar (un hilo de fondo
+vigila el buffer) o al terminar el proceso. Cada volcado escribe un archivo
+nuevo por día, con un nombre único entre procesos; se escribe con un nombre
+temporal y se renombra, de modo que un lector nunca ve un archivo a medio
+escribir y nunca se reescribe lo ya archivado.
+
+Uso:
+    python historico.py --desde 2024-10-01  # Ventas por día desde esa fecha
+"""
+import atexit
+import itertools
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.dataset as pds
+import pyarrow.parquet as pq
+import pytz
+
+from catalogo import normalizar
+
+DIRECTORIO_HISTORICO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "historico")
+TAMANO_BUFFER = 200  # Filas (platos) antes de volcar
+ESPERA_MAXIMA = 300.0  # Segundos que una fila puede quedar en el buffer
+TOLERANCIA = 0.01  # Soles de diferencia aceptados por redondeo
+DIAS_DEDUPLICACION = 2  # Días cuyos ids de pedido se recuerdan para no contarlos dos veces
+
+ESQUEMA = pa.schema([
+    ("pedido_id", pa.string()),
+    ("creado", pa.timestamp("ms")),
+    ("distrito", pa.string()),
+    ("metodo_pago", pa.string()),
+    ("plato", pa.string()),
+    ("cantidad", pa.int32()),
+    ("precio_unitario", pa.float64()),
+    ("precio_total", pa.float64()),
+    ("total_pedido", pa.float64()),
+    ("version_catalogo", pa.string()),
+])
+PARTICIONES = pds.partitioning(pa.schema([("fecha", pa.string())]), flavor="hive")
+
+_lock = threading.Lock()
+_historicos = {}  # directorio -> HistoricoPedidos
+_precios = {}  # versión del catálogo -> nombre normalizado -> precios unitarios
+
+
+class PedidoInvalido(ValueError):
+    """El pedido no cuadra con el catálogo (plato desconocido, precio o total)."""
+
+
+def precios_catalogo(catalogo):
+    """Nombre normalizado -> precios unitarios válidos de platos, postres y bebidas, por versión.
+
+    Las bebidas se reconocen por su descripción, con o sin el tamaño entre
+    paréntesis, y por su tipo ("Gaseosa"), que admite el precio de cualquiera.
+    """
+    precios = _precios.get(catalogo.version)
+    if precios is not None:
+        return precios
+    precios = {}
+
+    def agregar(nombre, precio):
+        precios.setdefault(normalizar(nombre), set()).add(float(precio))
+
+    for plato, precio in zip(catalogo.menu["Plato"], catalogo.menu["Precio"]):
+        agregar(plato, precio)
+    for postre, precio in zip(catalogo.postres["Postres"], catalogo.postres["Precio"]):
+        agregar(postre, precio)
+    bebidas = catalogo.bebidas
+    for tipo, descripcion, precio in zip(bebidas["bebida"], bebidas["descripcion"], bebidas["precio"]):
+        agregar(descripcion, precio)
+        agregar(descripcion.split("(")[0], precio)
+        agregar(tipo, precio)
+    with _lock:
+        _precios.clear()  # Solo interesa la versión vigente
+        _precios[catalogo.version] = precios
+    return precios
+
+
+def validar(pedido, catalogo):
+    """Precio unitario de cada línea del pedido; PedidoInvalido si algo no cuadra con el catálogo."""
+    precios = precios_catalogo(catalogo)
+    errores, unitarios, suma = [], [], 0.0
+    for linea in pedido.lineas:
+        candidatos = precios.get(normalizar(linea.plato))
+        if not candidatos:
+            errores.append(f"{linea.plato!r} no está en el catálogo")
+            continue
+        if linea.cantidad <= 0:
+            errores.append(f"cantidad {linea.cantidad} de {linea.plato!r}")
+            continue
+        precio_total = linea.precio_total
+        if precio_total is None:
+            precio_total = linea.cantidad * min(candidatos)
+        unitario = next((p for p in candidatos if abs(linea.cantidad * p - precio_total) <= TOLERANCIA), None)
+        if unitario is None:
+            errores.append(f"{linea.plato!r}: {linea.cantidad} x {sorted(candidatos)} no suma {precio_total}")
+            continue
+        unitarios.append(unitario)
+        suma += precio_total
+    if not pedido.lineas:
+        errores.append("el pedido no tiene platos")
+    if not errores and abs(suma - pedido.total) > TOLERANCIA:
+        errores.append(f"el total {pedido.total} no es la suma de los platos ({suma})")
+    if errores:
+        raise PedidoInvalido("; ".join(errores))
+    return unitarios
+
+
+class IdsPorDia:
+    """Ids de pedido ya vistos, agrupados por día ("YYYY-MM-DD"), sin crecer indefinidamente.
+
+    Solo se recuerdan los `dias` días más recientes: un pedido repetido (una
+    extracción reintentada) llega segundos después del original, no días, y
+    dos días cubren los que se confirman alrededor de la medianoche. No es
+    thread-safe; quien lo usa lo protege con su propio lock.
+    """
+
+    def __init__(self, dias=DIAS_DEDUPLICACION):
+        self.dias = dias
+        self._por_dia = {}  # fecha -> ids
+
+    def agregar(self, fecha, id):
+        """Anotar el id en su día; False si ya estaba."""
+        ids = self._por_dia.get(fecha)
+        if ids is None:
+            ids = self._por_dia[fecha] = set()
+            for vieja in sorted(self._por_dia)[:-self.dias]:
+                del self._por_dia[vieja]
+        elif id in ids:
+            return False
+        ids.add(id)
+        return True
+
+    def __len__(self):
+        return sum(len(ids) for ids in self._por_dia.values())
+
+
+def _fecha_hora(creado):
+    """Fecha de confirmación del pedido; si no se entiende, la hora actual de Lima."""
+    try:
+        return datetime.strptime(str(creado)[:19], "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return datetime.now(pytz.timezone("America/Lima")).replace(tzinfo=None, microsecond=0)
+
+
+def filas_pedido(pedido, catalogo):
+    """Filas (una por plato) del pedido ya validado."""
+    unitarios = validar(pedido, catalogo)
+    creado = _fecha_hora(pedido.creado)
+    return creado.strftime("%Y-%m-%d"), [
+        {
+            "pedido_id": pedido.id,
+            "creado": creado,
+            "distrito": pedido.distrito,
+            "metodo_pago": pedido.metodo_pago,
+            "plato": linea.plato,
+            "cantidad": linea.cantidad,
+            "precio_unitario": unitario,
+            "precio_total": linea.cantidad * unitario if linea.precio_total is None else linea.precio_total,
+            "total_pedido": pedido.total,
+            "version_catalogo": catalogo.version,
+        }
+        for linea, unitario in zip(pedido.lineas, unitarios)
+    ]
+
+
+class HistoricoPedidos:
+    """Buffer de filas por día que se vuelca a archivos Parquet nuevos."""
+
+    def __init__(self, directorio=DIRECTORIO_HISTORICO, tamano_buffer=TAMANO_BUFFER, espera_maxima=ESPERA_MAXIMA):
+        self.directorio = directorio
+        self.tamano_buffer = tamano_buffer
+        self.espera_maxima = espera_maxima
+        self._buffer = {}  # fecha -> filas
+        self._filas = 0
+        self._desde = None  # Momento en que entró la fila más antigua del buffer
+        self._archivados = IdsPorDia()  # Ids de pedido ya agregados por el proceso, de los últimos días
+        self._partes = itertools.count()
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        threading.Thread(target=self._vigilar, daemon=True, name="historico").start()
+
+    def agregar(self, pedido, catalogo):
+        """Validar el pedido y acumular sus filas; vuelca si el buffer está lleno.
+
+        Devuelve las filas del pedido (vacías si ya se había archivado).
+        """
+        fecha, filas = filas_pedido(pedido, catalogo)
+        with self._lock:
+            if not self._archivados.agregar(fecha, pedido.id):
+                return []
+            self._buffer.setdefault(fecha, []).extend(filas)
+            self._filas += len(filas)
+            if self._desde is None:
+                self._desde = time.monotonic()
+                self._despertar.set()
+            lleno = self._filas >= self.tamano_buffer
+        if lleno:
+            self.volcar()
+        return filas
+
+    def _vigilar(self):
+        # Vuelca el buffer cuando su fila más antigua cumple espera_maxima, aunque no lleguen más pedidos
+        while True:
+            with self._lock:
+                desde = self._desde
+            if desde is None:
+                self._despertar.wait()
+                self._despertar.clear()
+                continue
+            restante = desde + self.espera_maxima - time.monotonic()
+            if restante > 0:
+                time.sleep(restante)
+            else:
+                self.volcar()
+
+    def pendientes(self):
+        """Copia de las filas que aún no se volcaron."""
+        with self._lock:
+            return [fila for filas in self._buffer.values() for fila in filas]
+
+    def volcar(self):
+        """Escribir el buffer en archivos nuevos de cada día; devuelve las filas volcadas.
+
+        El lock solo se toma para tomar y, si falla la escritura, devolver las
+        filas: la escritura a disco ocurre fuera de él.
+        """
+        with self._lock:
+            buffer, self._buffer = self._buffer, {}
+            self._filas, self._desde = 0, None
+            partes = {fecha: next(self._partes) for fecha in buffer}
+        escritas = 0
+        for fecha, filas in sorted(buffer.items()):
+            try:
+                self._escribir(fecha, filas, partes[fecha])
+            except (OSError, pa.ArrowException) as e:
+                # Se reintenta en el próximo volcado
+                logging.error(f"No se pudo escribir el histórico del {fecha}: {e}")
+                with self._lock:
+                    self._buffer.setdefault(fecha, []).extend(filas)
+                    self._filas += len(filas)
+                    self._desde = self._desde or time.monotonic()
+                continue
+            escritas += len(filas)
+        return escritas
+
+    def _escribir(self, fecha, filas, parte):
+        carpeta = os.path.join(self.directorio, f"fecha={fecha}")
+        os.makedirs(carpeta, exist_ok=True)
+        # Único entre procesos y volcados: hora, pid y número de volcado del proceso
+        nombre = f"parte-{time.time_ns()}-{os.getpid()}-{parte}.parquet"
+        temporal = os.path.join(carpeta, f".{nombre}.tmp")  # Los lectores ignoran los archivos con punto
+        pq.write_table(pa.Table.from_pylist(filas, schema=ESQUEMA), temporal)
+        os.replace(temporal, os.path.join(carpeta, nombre))
+
+
+def obtener_historico(directorio=None):
+    """Histórico compartido por el proceso; el buffer se vuelca al terminar."""
+    directorio = directorio or DIRECTORIO_HISTORICO
+    historico = _historicos.get(directorio)
+    if historico is not None:
+        return historico
+    with _lock:
+        historico = _historicos.get(directorio)
+        if historico is None:
+            historico = HistoricoPedidos(directorio)
+            atexit.register(historico.volcar)
+            _historicos[directorio] = historico
+        return historico
+
+
+def archivar(pedido, catalogo):
+    """Agregar un pedido confirmado al histórico; devuelve sus filas o None si no se archivó."""
+    try:
+        return obtener_historico().agregar(pedido, catalogo)
+    except PedidoInvalido as e:
+        logging.warning(f"Pedido {pedido.id} rechazado en el histórico: {e}")
+        return None
+
+
+def leer(desde=None, hasta=None, directorio=None, columnas=None):
+    """Filas del histórico entre las fechas `desde` y `hasta` ("YYYY-MM-DD", inclusive) como DataFrame.
+
+    Solo se abren las particiones de esos días.
+    """
+    directorio = directorio or DIRECTORIO_HISTORICO
+    if not os.path.isdir(directorio):
+        return pa.Table.from_pylist([], schema=ESQUEMA).to_pandas()
+    dataset = pds.dataset(directorio, format="parquet", partitioning=PARTICIONES)
+    filtro = None
+    if desde:
+        filtro = pds.field("fecha") >= desde
+    if hasta:
+        condicion = pds.field("fecha") <= hasta
+        filtro = condicion if filtro is None else filtro & condicion
+    return dataset.to_table(columns=columnas, filter=filtro).to_pandas()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--desde")
+    parser.add_argument("--hasta")
+    parser.add_argument("--directorio", default=DIRECTORIO_HISTORICO)
+    args = parser.parse_args()
+    filas = leer(args.desde, args.hasta, args.directorio)
+    if filas.empty:
+        print("No hay pedidos en ese rango")
+    else:
+        diario = filas.groupby("fecha").agg(
+            pedidos=("pedido_id", "nunique"),
+            platos=("cantidad", "sum"),
+            ventas=("precio_total", "sum"),
+        )
+        print(diario.to_string())
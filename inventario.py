@@ -0,0 +1,327 @@
+"""Inventario en vivo de los platos de la carta según la columna Stock de carta.csv.
+
+Cada sesión tiene a lo sumo una reserva: la última cantidad pedida de cada
+plato se aparta del stock mientras el cliente arma su pedido. Al confirmarse
+el pedido la reserva se consume con las cantidades confirmadas y el resto se
+devuelve; si la sesión se abandona, la reserva vence a los VIGENCIA_RESERVA
+segundos (un hilo de fondo las vence cada INTERVALO_VENCIMIENTO segundos).
+
+El stock y las reservas están en SQLite (inventario.db), compartidos por los
+hilos y procesos (workers) del API: una reserva descuenta con
+`UPDATE ... WHERE disponible >= ?`, así que dos workers no pueden vender la
+misma unidad.
+
+Si cambia carta.csv (otra versión del catálogo) lo vendido en el día se
+mantiene: solo vuelven a empezar desde el CSV los platos cuyo Stock cambió
+(una reposición), no los que cambiaron de precio o de nombre de otro plato.
+Otro día se empieza con el Stock del CSV: la primera operación después de
+medianoche (hora de Lima), en cualquier worker, repone los platos con la
+fecha vieja; las reservas vigentes se conservan y se descuentan del Stock.
+
+Bebidas y postres no tienen stock y no se controlan.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytz
+
+from catalogo import normalizar
+
+RUTA_BD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inventario.db")
+ESPERA_BLOQUEO_MS = 5000  # Cuánto espera una escritura si otro proceso tiene el lock
+VIGENCIA_RESERVA = 15 * 60  # Segundos sin actividad tras los que se libera una reserva
+INTERVALO_VENCIMIENTO = 30.0
+VIGENCIA_AGOTADOS = 2.0  # Segundos que se reutiliza la lista de platos agotados
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS stock (
+    plato TEXT PRIMARY KEY,          -- nombre normalizado
+    nombre TEXT NOT NULL,
+    inicial INTEGER NOT NULL,        -- Stock del CSV del que se partió
+    disponible INTEGER NOT NULL,     -- sin lo vendido ni lo reservado
+    fecha TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reservas (
+    sesion TEXT NOT NULL,
+    plato TEXT NOT NULL,
+    cantidad INTEGER NOT NULL,
+    vence REAL NOT NULL,
+    PRIMARY KEY (sesion, plato)
+);
+CREATE INDEX IF NOT EXISTS idx_reservas_vence ON reservas(vence);
+"""
+
+# Repone con el Stock inicial los platos de otro día, descontando lo que siguen reservando las sesiones
+REPONER = (
+    "UPDATE stock SET fecha = ?, disponible = inicial - "
+    "COALESCE((SELECT SUM(cantidad) FROM reservas WHERE reservas.plato = stock.plato), 0) "
+    "WHERE fecha <> ?"
+)
+
+# Devuelve al stock las reservas que cumplen la condición `{}` (sobre la tabla reservas)
+DEVOLVER = (
+    "UPDATE stock SET disponible = disponible + "
+    "(SELECT SUM(cantidad) FROM reservas WHERE reservas.plato = stock.plato AND {0}) "
+    "WHERE plato IN (SELECT plato FROM reservas WHERE {0})"
+)
+
+_lock = threading.Lock()
+_inventarios = {}  # ruta de la base -> Inventario
+
+
+class SinStock(Exception):
+    """No hay unidades suficientes; `faltantes` es plato -> unidades disponibles."""
+
+    def __init__(self, faltantes):
+        super().__init__(", ".join(f"{plato} ({n} disponibles)" for plato, n in faltantes.items()))
+        self.faltantes = faltantes
+
+
+def _hoy():
+    return datetime.now(pytz.timezone("America/Lima")).strftime("%Y-%m-%d")
+
+
+class Inventario:
+    """Stock disponible y reservas por sesión en SQLite.
+
+    Cada hilo usa su propia conexión; las operaciones que tocan varias filas
+    van en una transacción BEGIN IMMEDIATE, que toma el lock de escritura de
+    la base antes de leer.
+    """
+
+    def __init__(self, catalogo, ruta=RUTA_BD, vigencia=VIGENCIA_RESERVA):
+        self.version = catalogo.version
+        self.ruta = ruta
+        self.vigencia = vigencia
+        self._local = threading.local()
+        self._nombres = {normalizar(plato): plato for plato in catalogo.menu["Plato"]}
+        self._agotados = (0.0, frozenset())  # (momento, platos agotados)
+        self._fecha = None  # Día en que se repuso el stock por última vez desde este proceso
+        self._conexion().executescript(ESQUEMA)
+        self._sincronizar({
+            normalizar(plato): int(stock) for plato, stock in zip(catalogo.menu["Plato"], catalogo.menu["Stock"])
+        })
+
+    def _conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=ESPERA_BLOQUEO_MS / 1000, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            conexion.execute(f"PRAGMA busy_timeout={ESPERA_BLOQUEO_MS}")
+            self._local.conexion = conexion
+        return conexion
+
+    @contextmanager
+    def _transaccion(self):
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            yield conexion
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        conexion.execute("COMMIT")
+
+    def _sincronizar(self, stock):
+        """Partir del stock guardado: lo vendido hoy se conserva en los platos con el mismo Stock.
+
+        En los platos repuestos (o nuevos) las reservas vigentes se descuentan
+        del Stock nuevo; los platos que ya no están en la carta se quitan.
+        """
+        hoy = _hoy()
+        with self._transaccion() as conexion:
+            conexion.execute(REPONER, (hoy, hoy))
+            guardado = dict(conexion.execute("SELECT plato, inicial FROM stock"))
+            reservado = dict(conexion.execute("SELECT plato, SUM(cantidad) FROM reservas GROUP BY plato"))
+            for plato, inicial in stock.items():
+                if guardado.get(plato) != inicial:
+                    conexion.execute(
+                        "INSERT OR REPLACE INTO stock (plato, nombre, inicial, disponible, fecha) VALUES (?, ?, ?, ?, ?)",
+                        (plato, self._nombres[plato], inicial, inicial - reservado.get(plato, 0), hoy),
+                    )
+            quitados = [(plato,) for plato in guardado.keys() - stock.keys()]
+            conexion.executemany("DELETE FROM stock WHERE plato = ?", quitados)
+            conexion.executemany("DELETE FROM reservas WHERE plato = ?", quitados)
+        self._fecha = hoy
+
+    def _al_dia(self):
+        """Reponer el stock si cambió el día desde la última operación."""
+        hoy = _hoy()
+        if hoy == self._fecha:
+            return
+        with self._transaccion() as conexion:
+            repuestos = conexion.execute(REPONER, (hoy, hoy)).rowcount
+        self._fecha = hoy
+        if repuestos:
+            logging.info(f"Stock repuesto para el {hoy}: {repuestos} platos")
+            self._cambio()
+
+    @property
+    def agotados(self):
+        """Platos de la carta sin unidades disponibles (se relee cada VIGENCIA_AGOTADOS segundos)."""
+        momento, agotados = self._agotados
+        if time.monotonic() - momento > VIGENCIA_AGOTADOS:
+            self._al_dia()
+            filas = self._conexion().execute("SELECT plato FROM stock WHERE disponible <= 0")
+            agotados = frozenset(self._nombres[plato] for plato, in filas if plato in self._nombres)
+            self._agotados = (time.monotonic(), agotados)
+        return agotados
+
+    def _cambio(self):
+        # Hubo cambios en este proceso: la próxima consulta de agotados relee la base
+        self._agotados = (0.0, self._agotados[1])
+
+    def disponible(self, plato):
+        """Unidades que se pueden reservar; None si el plato no lleva stock."""
+        plato = normalizar(plato)
+        if plato not in self._nombres:
+            return None
+        self._al_dia()
+        fila = self._conexion().execute("SELECT disponible FROM stock WHERE plato = ?", (plato,)).fetchone()
+        return fila[0] if fila else None
+
+    def reservar(self, sesion, items):
+        """Apartar para la sesión `items` (plato -> cantidad), reemplazando lo reservado de esos platos.
+
+        Es todo o nada: si algún plato no alcanza se lanza SinStock y la
+        reserva queda como estaba. Cada llamada renueva el vencimiento.
+        """
+        items = {normalizar(p): int(n) for p, n in items.items() if normalizar(p) in self._nombres}
+        vence = time.time() + self.vigencia
+        self._al_dia()
+        if not items:
+            self._conexion().execute("UPDATE reservas SET vence = ? WHERE sesion = ?", (vence, sesion))
+            return
+        with self._transaccion() as conexion:
+            reserva = dict(conexion.execute("SELECT plato, cantidad FROM reservas WHERE sesion = ?", (sesion,)))
+            faltantes = {}
+            for plato, n in items.items():
+                delta = n - reserva.get(plato, 0)
+                cursor = conexion.execute(
+                    "UPDATE stock SET disponible = disponible - ? WHERE plato = ? AND disponible >= ?",
+                    (delta, plato, delta),
+                )
+                if cursor.rowcount == 0:
+                    fila = conexion.execute("SELECT disponible FROM stock WHERE plato = ?", (plato,)).fetchone()
+                    if fila is not None:
+                        faltantes[self._nombres[plato]] = fila[0] + reserva.get(plato, 0)
+            if faltantes:
+                raise SinStock(faltantes)  # El rollback devuelve lo ya descontado
+            conexion.executemany(
+                "INSERT OR REPLACE INTO reservas (sesion, plato, cantidad, vence) VALUES (?, ?, ?, ?)",
+                [(sesion, plato, n, vence) for plato, n in items.items() if n > 0],
+            )
+            conexion.executemany("DELETE FROM reservas WHERE sesion = ? AND plato = ?",
+                                 [(sesion, plato) for plato, n in items.items() if n <= 0])
+            conexion.execute("UPDATE reservas SET vence = ? WHERE sesion = ?", (vence, sesion))
+        self._cambio()
+
+    def _soltar(self, conexion, sesion):
+        # Dentro de una transacción: devuelve la reserva de la sesión; True si tenía una
+        conexion.execute(DEVOLVER.format("sesion = ?"), (sesion, sesion))
+        return conexion.execute("DELETE FROM reservas WHERE sesion = ?", (sesion,)).rowcount > 0
+
+    def confirmar(self, sesion, items, conservar_resto=False):
+        """Consumir el pedido confirmado (plato -> cantidad) y devolver el resto de la reserva.
+
+        Si se confirmó más de lo reservado se descuenta lo que quede. Con
+        `conservar_resto` lo reservado de platos que no están en `items`
+        también se consume (el pedido tiene líneas que no se reconocieron).
+        """
+        cambios = {}
+        for plato, n in items.items():
+            plato = normalizar(plato)
+            if plato in self._nombres:
+                cambios[plato] = cambios.get(plato, 0) + int(n)
+        self._al_dia()
+        with self._transaccion() as conexion:
+            if conservar_resto:
+                for plato, n in conexion.execute("SELECT plato, cantidad FROM reservas WHERE sesion = ?", (sesion,)):
+                    cambios.setdefault(plato, n)
+            reservada = self._soltar(conexion, sesion)
+            cortos = []
+            for plato, n in cambios.items():
+                fila = conexion.execute("SELECT disponible FROM stock WHERE plato = ?", (plato,)).fetchone()
+                if fila is not None and fila[0] < n:
+                    cortos.append(self._nombres[plato])
+                conexion.execute("UPDATE stock SET disponible = MAX(disponible - ?, 0) WHERE plato = ?", (n, plato))
+        if cortos:
+            logging.warning(f"Pedido confirmado sin stock suficiente de {', '.join(cortos)}")
+        self._cambio()
+        return reservada
+
+    def liberar(self, sesion):
+        """Devolver al stock la reserva de la sesión (conversación eliminada)."""
+        with self._transaccion() as conexion:
+            liberada = self._soltar(conexion, sesion)
+        self._cambio()
+        return liberada
+
+    def vencer(self, ahora=None):
+        """Liberar las reservas de sesiones inactivas; devuelve cuántas se liberaron."""
+        ahora = ahora or time.time()
+        self._al_dia()  # También repone a medianoche sin tráfico (lo llama el hilo de fondo)
+        with self._transaccion() as conexion:
+            vencidas = conexion.execute(
+                "SELECT COUNT(DISTINCT sesion) FROM reservas WHERE vence <= ?", (ahora,)
+            ).fetchone()[0]
+            if vencidas:
+                conexion.execute(DEVOLVER.format("vence <= ?"), (ahora, ahora))
+                conexion.execute("DELETE FROM reservas WHERE vence <= ?", (ahora,))
+        if vencidas:
+            self._cambio()
+        return vencidas
+
+
+def mensaje_sin_stock(faltantes):
+    """Aviso al cliente cuando no alcanza el stock de uno o más platos."""
+    partes = [
+        f"**{plato}** está agotado por hoy" if n <= 0 else f"de **{plato}** solo quedan {n} unidades"
+        for plato, n in faltantes.items()
+    ]
+    return f"Lo siento, {', y '.join(partes)}. ¿Quieres ajustar tu pedido?"
+
+
+def mensaje_agotados(agotados):
+    """Mensaje del sistema que avisa al modelo de los platos agotados."""
+    return {
+        "role": "system",
+        "content": f"Platos agotados por hoy (no los ofrezcas ni los aceptes en el pedido): {', '.join(sorted(agotados))}.",
+    }
+
+
+def _mantener():
+    while True:
+        time.sleep(INTERVALO_VENCIMIENTO)
+        for inventario in list(_inventarios.values()):
+            try:
+                inventario.vencer()
+            except sqlite3.Error as e:
+                logging.error(f"No se pudieron vencer las reservas del inventario: {e}")
+
+
+def obtener_inventario(catalogo, ruta=None):
+    """Inventario compartido por todas las sesiones del proceso.
+
+    Si cambia la versión del catálogo se crea uno nuevo sobre la misma base,
+    que conserva lo vendido y las reservas vigentes (ver Inventario._sincronizar).
+    """
+    ruta = ruta or RUTA_BD
+    inventario = _inventarios.get(ruta)
+    if inventario is not None and inventario.version == catalogo.version:
+        return inventario
+    with _lock:
+        anterior = _inventarios.get(ruta)
+        if anterior is not None and anterior.version == catalogo.version:
+            return anterior
+        inventario = Inventario(catalogo, ruta)
+        if not _inventarios:
+            threading.Thread(target=_mantener, daemon=True, name="inventario").start()
+        _inventarios[ruta] = inventario
+        return inventario
@@ -0,0 +1,356 @@
+import os
+import random
+import threading
+import time
+from functools import partial
+from types import SimpleNamespace
+from typing import NamedTuple
+
+import httpx
+
+# Plazo máximo de cada llamada al proveedor, incluidos los reintentos
+PLAZO_SEGUNDOS = 30.0
+TIEMPO_CONEXION = 5.0
+REINTENTOS = 3
+ESPERA_BASE = 0.5  # Segundos; se duplica en cada reintento, con jitter
+ESPERA_MAXIMA = 8.0
+# Circuito: tras FALLOS_PARA_ABRIR fallos seguidos se deja de llamar durante ENFRIAMIENTO
+FALLOS_PARA_ABRIR = 5
+ENFRIAMIENTO_SEGUNDOS = 30.0
+
+MENSAJE_NO_DISPONIBLE = (
+    "Lo sentimos, en este momento tenemos problemas para atenderte. "
+    "Por favor, intenta de nuevo en unos segundos."
+)
+
+_lock = threading.Lock()
+_clientes = {}  # (proveedor, api_key, base_url) -> ClienteResiliente
+
+
+class ServicioNoDisponible(Exception):
+    """El proveedor no responde o el circuito está abierto; el mensaje es apto para el cliente."""
+
+    def __init__(self, mensaje=MENSAJE_NO_DISPONIBLE):
+        super().__init__(mensaje)
+
+
+class Circuito:
+    """Circuit breaker: cerrado -> abierto tras varios fallos -> semiabierto tras el enfriamiento."""
+
+    def __init__(self, fallos_para_abrir=FALLOS_PARA_ABRIR, enfriamiento=ENFRIAMIENTO_SEGUNDOS):
+        self.fallos_para_abrir = fallos_para_abrir
+        self.enfriamiento = enfriamiento
+        self.fallos = 0
+        self.abierto_desde = None
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self):
+        if self.abierto_desde is None:
+            return "cerrado"
+        if time.monotonic() - self.abierto_desde >= self.enfriamiento:
+            return "semiabierto"
+        return "abierto"
+
+    def permitir(self):
+        """¿Se puede intentar una llamada? En semiabierto se deja pasar una de prueba."""
+        with self._lock:
+            if self.estado != "abierto":
+                if self.estado == "semiabierto":
+                    # Mientras la llamada de prueba está en curso el resto falla rápido
+                    self.abierto_desde = time.monotonic()
+                return True
+            return False
+
+    def exito(self):
+        with self._lock:
+            self.fallos = 0
+            self.abierto_desde = None
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            if self.fallos >= self.fallos_para_abrir:
+                self.abierto_desde = time.monotonic()
+
+
+def _errores_reintentables():
+    """Errores transitorios de los SDK de OpenAI y Groq (conexión, timeout, 429, 5xx)."""
+    conexion, estado = [httpx.TransportError], []
+    for modulo in ("openai", "groq"):
+        try:
+            sdk = __import__(modulo)
+        except ImportError:
+            continue
+        conexion.append(sdk.APIConnectionError)  # Incluye APITimeoutError
+        estado.append(sdk.APIStatusError)
+    return tuple(conexion), tuple(estado)
+
+
+def _es_reintentable(error, conexion, estado):
+    if isinstance(error, conexion):
+        return True
+    if isinstance(error, estado):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+class ClienteResiliente:
+    """Envuelve un cliente de OpenAI o Groq con plazos, reintentos y circuit breaker.
+
+    Expone `chat.completions.create` y `moderations.create` con la misma
+    firma que el SDK, de modo que el código que lo usa no cambia.
+    """
+
+    def __init__(self, cliente, circuito=None, plazo=PLAZO_SEGUNDOS, reintentos=REINTENTOS):
+        self.cliente = cliente
+        self.circuito = circuito or Circuito()
+        self.plazo = plazo
+        self.reintentos = reintentos
+        self._conexion, self._estado = _errores_reintentables()
+        self.chat = SimpleNamespace(
+            completions=SimpleNamespace(create=partial(self.llamar, cliente.chat.completions.create))
+        )
+        if hasattr(cliente, "moderations"):
+            self.moderations = SimpleNamespace(create=partial(self.llamar, cliente.moderations.create))
+
+    def llamar(self, funcion, *args, **kwargs):
+        """Llamar a `funcion` respetando el plazo, con backoff exponencial con jitter."""
+        if not self.circuito.permitir():
+            raise ServicioNoDisponible()
+        limite = time.monotonic() + kwargs.pop("timeout", self.plazo)
+        intento = 0
+        while True:
+            restante = limite - time.monotonic()
+            try:
+                resultado = funcion(*args, timeout=max(restante, 0.1), **kwargs)
+            except Exception as error:
+                if not _es_reintentable(error, self._conexion, self._estado):
+                    raise
+                espera = random.uniform(0, min(ESPERA_MAXIMA, ESPERA_BASE * 2 ** intento))
+                intento += 1
+                if intento > self.reintentos or time.monotonic() + espera >= limite:
+                    self.circuito.fallo()
+                    raise ServicioNoDisponible() from error
+                time.sleep(espera)
+                continue
+            self.circuito.exito()
+            return resultado
+
+
+def _http_client():
+    """Cliente HTTP con conexiones keep-alive reutilizadas entre sesiones."""
+    return httpx.Client(
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60),
+        timeout=httpx.Timeout(PLAZO_SEGUNDOS, connect=TIEMPO_CONEXION),
+    )
+
+
+def obtener_cliente(proveedor, api_key, base_url=None):
+    """Cliente compartido por todo el proceso para `proveedor` ("openai" o "groq")."""
+    clave = (proveedor, api_key, base_url)
+    cliente = _clientes.get(clave)
+    if cliente is not None:
+        return cliente
+    with _lock:
+        cliente = _clientes.get(clave)
+        if cliente is None:
+            if proveedor == "groq":
+                from groq import Groq as Sdk
+            else:
+                from openai import OpenAI as Sdk
+            # Los reintentos los hace ClienteResiliente, no el SDK
+            sdk = Sdk(api_key=api_key, base_url=base_url, http_client=_http_client(), max_retries=0)
+            cliente = ClienteResiliente(sdk)
+            _clientes[clave] = cliente
+        return cliente
+
+
+# Precio por millón de tokens (entrada, salida) en USD, para comparar proveedores
+PRECIOS = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "llama3-8b-8192": (0.05, 0.08),
+    "llama-guard-3-8b": (0.20, 0.20),
+    "local": (0.0, 0.0),
+}
+
+
+class Uso(NamedTuple):
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class Respuesta(NamedTuple):
+    texto: str
+    uso: Uso
+    modelo: str
+
+
+def costo(modelo, uso):
+    """Costo en USD de una llamada según PRECIOS."""
+    entrada, salida = PRECIOS.get(modelo, (0.0, 0.0))
+    return (uso.prompt_tokens * entrada + uso.completion_tokens * salida) / 1_000_000
+
+
+def _uso(usage):
+    if usage is None:
+        return Uso()
+    return Uso(usage.prompt_tokens or 0, usage.completion_tokens or 0)
+
+
+class FlujoRespuesta:
+    """Respuesta en streaming: se itera texto a texto y se puede cancelar con close().
+
+    Al terminar la iteración, `texto` tiene la respuesta completa y `uso` los
+    tokens informados por el proveedor (si los envía). Solo la apertura del
+    stream pasa por los reintentos; si se corta a mitad de la respuesta no se
+    reintenta (el cliente ya vio parte del texto): se anota el fallo en el
+    `circuito` y se lanza ServicioNoDisponible.
+    """
+
+    def __init__(self, stream, modelo, circuito=None):
+        self.stream = stream
+        self.modelo = modelo
+        self.circuito = circuito
+        self.partes = []
+        self.uso = Uso()
+
+    def __iter__(self):
+        try:
+            for chunk in self.stream:
+                if getattr(chunk, "usage", None):
+                    self.uso = _uso(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    self.partes.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        except Exception as error:
+            if self.circuito is not None:
+                self.circuito.fallo()
+            raise ServicioNoDisponible() from error
+
+    @property
+    def texto(self):
+        return "".join(self.partes)
+
+    def close(self):
+        self.stream.close()
+
+
+class BackendLLM:
+    """Interfaz común de los proveedores: chat, streaming, moderación y extracción.
+
+    Las subclases solo indican los modelos y, si hace falta, cómo moderar;
+    todas hablan el protocolo de chat de OpenAI a través de un ClienteResiliente.
+    """
+    nombre = None
+    modelo_chat = None
+    modelo_extraccion = None
+
+    def __init__(self, cliente):
+        self.cliente = cliente
+
+    def completar(self, mensajes, temperature=0, max_tokens=1000, modelo=None):
+        """Respuesta completa del modelo como Respuesta(texto, uso, modelo)."""
+        modelo = modelo or self.modelo_chat
+        completion = self.cliente.chat.completions.create(
+            model=modelo,
+            messages=mensajes,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=False,
+        )
+        return Respuesta(completion.choices[0].message.content, _uso(completion.usage), modelo)
+
+    def completar_stream(self, mensajes, temperature=0, max_tokens=1000, modelo=None):
+        """Respuesta del modelo como FlujoRespuesta, token a token."""
+        modelo = modelo or self.modelo_chat
+        stream = self.cliente.chat.completions.create(
+            model=modelo,
+            messages=mensajes,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            **self._opciones_stream(),
+        )
+        return FlujoRespuesta(stream, modelo, getattr(self.cliente, "circuito", None))
+
+    def _opciones_stream(self):
+        return {"stream_options": {"include_usage": True}}
+
+    def extraer(self, mensajes, max_tokens=300):
+        """Llamada determinista para extraer datos estructurados (JSON) de un texto."""
+        return self.completar(mensajes, temperature=0, max_tokens=max_tokens, modelo=self.modelo_extraccion)
+
+    def moderar(self, texto, anotar=None):
+        """True si el texto es inapropiado según la API de moderación del proveedor.
+
+        Si la moderación usa un modelo de chat, se llama a `anotar(respuesta)`
+        con la Respuesta para contar sus tokens; la API de moderación no cobra.
+        """
+        response = self.cliente.moderations.create(input=texto)
+        return response.results[0].flagged
+
+
+class BackendOpenAI(BackendLLM):
+    nombre = "openai"
+    modelo_chat = "gpt-3.5-turbo"
+    modelo_extraccion = "gpt-3.5-turbo"
+
+
+class BackendGroq(BackendLLM):
+    nombre = "groq"
+    modelo_chat = "llama3-8b-8192"
+    modelo_extraccion = "llama3-8b-8192"
+    modelo_moderacion = "llama-guard-3-8b"
+
+    def _opciones_stream(self):
+        return {}  # Groq envía el uso en el último fragmento sin pedirlo
+
+    def moderar(self, texto, anotar=None):
+        """Groq no tiene API de moderación: se clasifica con Llama Guard, que responde "safe" o "unsafe"."""
+        respuesta = self.completar([{"role": "user", "content": texto}], max_tokens=10,
+                                   modelo=self.modelo_moderacion)
+        if anotar is not None:
+            anotar(respuesta)
+        return respuesta.texto.strip().lower().startswith("unsafe")
+
+
+class BackendLocal(BackendOpenAI):
+    """Servidor falso local (servidor_falso.py) con el protocolo de OpenAI, para pruebas sin red."""
+    nombre = "local"
+    modelo_chat = "local"
+    modelo_extraccion = "local"
+
+
+_backends = {}  # proveedor -> BackendLLM
+
+
+def obtener_backend(config=None, por_defecto="openai"):
+    """Backend compartido por el proceso según la configuración.
+
+    `config` es un mapeo como st.secrets; se usa LLM_BACKEND ("openai", "groq"
+    o "local"), OPENAI_API_KEY / GROQ_API_KEY y, para "local", LOCAL_LLM_URL.
+    Si falta una clave se busca en las variables de entorno. Con "local" y
+    sin URL se levanta un servidor falso dentro del proceso.
+    """
+    def valor(clave, defecto=None):
+        if config is not None and clave in config:
+            return config[clave]
+        return os.environ.get(clave, defecto)
+
+    proveedor = valor("LLM_BACKEND", por_defecto)
+    backend = _backends.get(proveedor)
+    if backend is not None:
+        return backend
+    if proveedor == "groq":
+        backend = BackendGroq(obtener_cliente("groq", valor("GROQ_API_KEY")))
+    elif proveedor == "local":
+        url = valor("LOCAL_LLM_URL")
+        if url is None:
+            from servidor_falso import iniciar_servidor
+            _, url = iniciar_servidor()
+        backend = BackendLocal(obtener_cliente("openai", "local", base_url=f"{url}/v1"))
+    else:
+        backend = BackendOpenAI(obtener_cliente("openai", valor("OPENAI_API_KEY")))
+    with _lock:
+        return _backends.setdefault(proveedor, backend)
@@ -2,9 +2,15 @@ import pandas as pd
 import streamlit as st
 from datetime import datetime
 from copy import deepcopy
-from openai import OpenAI
+from llm import ServicioNoDisponible, obtener_backend
+import uuid
+from almacen import LineaPedido, nuevo_pedido
+from escritor import obtener_escritor
+from inventario import obtener_inventario
+from catalogo import cargar_catalogo, indice_menu, leer_csv, normalizar
 
-client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
+# Backend del LLM (OpenAI por defecto; LLM_BACKEND en los secrets permite "groq" o "local")
+backend = obtener_backend(st.secrets)
 
 # Cargar el API key de OpenAI desde Streamlit Secrets
 
@@ -19,12 +25,12 @@ st.markdown(intro)
 
 # Función para cargar el menú desde un archivo CSV
 def load_menu(csv_file):
-    menu = pd.read_csv(csv_file)
+    menu = leer_csv(csv_file)  # Se lee una sola vez por proceso y se comparte entre sesiones
     return menu
 
 # Función para cargar los distritos de reparto desde otro CSV
 def load_districts(csv_file):
-    districts = pd.read_csv(csv_file)
+    districts = leer_csv(csv_file)
     return districts['Distrito'].tolist()
 
 # Función para mostrar el menú en un formato más amigable
@@ -42,6 +48,9 @@ def format_menu(menu):
 # Cargar menú y distritos (asegúrate de que los archivos CSV existen)
 menu = load_menu("carta.csv")  # Archivo 'menu.csv' debe tener columnas: Plato, Descripción, Precio
 districts = load_districts("distritos.csv")  # Archivo 'distritos.csv' debe tener una columna: Distrito
+indice = indice_menu(cargar_catalogo())  # Índice nombre normalizado -> plato, precio y stock
+inventario = obtener_inventario(cargar_catalogo())  # Stock compartido por todas las sesiones
+menu = menu[~menu["Plato"].isin(inventario.agotados)]  # Sin los platos agotados
 
 # Estado inicial del chatbot
 initial_state = [
@@ -52,14 +61,18 @@ initial_state = [
     },
 ]
 
-# Función para registrar los pedidos en un archivo
-def save_order(order, total_price):
-    with open("orders.csv", "a") as f:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        f.write(f"{timestamp}, {order}, {total_price}\n")
+# Función para registrar los pedidos en el almacén SQLite (antes orders.csv)
+# Solo se encola: el escritor de fondo lo guarda sin bloquear la respuesta
+def save_order(order, total_price, district=None, order_id=None):
+    lineas = []
+    for dish, quantity in order.items():
+        plato = indice.get(normalizar(dish))
+        lineas.append(LineaPedido(dish, quantity, plato.precio * quantity if plato else None))
+    obtener_escritor().encolar(nuevo_pedido(lineas, total_price, distrito=district, origen="main", id=order_id))
+    inventario.confirmar(order_id, order)  # Descontar del stock
 
 # Función para validar si los platos pedidos existen en el menú
-def validate_order(prompt, menu):
+def validate_order(prompt, indice):
     order_details = {}
     total_price = 0
     for item in prompt.split(" y "):  # Dividir la entrada por "y" para varios platos
@@ -67,9 +80,10 @@ def validate_order(prompt, menu):
         try:
             quantity = int(item_parts[0])
             dish_name = " ".join(item_parts[1:]).strip().lower()
-            menu_names = menu['Plato'].str.lower().values
-            if dish_name in menu_names:
-                price = menu.loc[menu['Plato'].str.lower() == dish_name, 'Precio'].values[0]
+            plato = indice.get(normalizar(dish_name))  # Búsqueda O(1) en el índice del menú
+            # Solo si queda stock suficiente (consulta O(1) al inventario)
+            if plato and inventario.disponible(plato.plato) >= quantity:
+                price = plato.precio
                 order_details[dish_name] = quantity
                 total_price += price * quantity
             else:
@@ -112,25 +126,31 @@ if prompt := st.chat_input("¿Qué te gustaría pedir?"):
     with st.chat_message("user", avatar="👤"):
         st.markdown(prompt)
 
-    # Llamar a GPT-3.5 con un límite de tokens en la respuesta
-    response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant for a food ordering service."},
-                {"role": "user", "content": prompt},
-            ],
-            max_tokens=150, # Establece el límite de tokens en la respuesta
-            temperature=0.5
-        )
+    # Llamar al LLM con un límite de tokens en la respuesta
+    try:
+        response = backend.completar(
+                [
+                    {"role": "system", "content": "You are a helpful assistant for a food ordering service."},
+                    {"role": "user", "content": prompt},
+                ],
+                max_tokens=150, # Establece el límite de tokens en la respuesta
+                temperature=0.5
+            )
+    except ServicioNoDisponible as e:
+        # El proveedor no responde o el circuito está abierto: aviso amable en lugar del error
+        with st.chat_message("assistant", avatar="🍲"):
+            st.markdown(str(e))
+        st.stop()
 
-    parsed_message = response.choices[0].message['content']
+    parsed_message = response.texto
 
     # Validar el pedido del usuario
-    order_details, total_price = validate_order(parsed_message, menu)
+    order_details, total_price = validate_order(parsed_message, indice)
 
     if order_details:
         # Guardar el pedido en el estado
         st.session_state["order"] = order_details
+        st.session_state["order_id"] = uuid.uuid4().hex  # Clave de idempotencia al guardar
         st.session_state["total_price"] = total_price
 
         # Mostrar resumen del pedido
@@ -160,8 +180,9 @@ if st.session_state["order"]:
         with st.chat_message("assistant", avatar="🍲"):
             st.markdown(response_text)
 
-        # Si el distrito es válido, guardar el pedido en el archivo
+        # Si el distrito es válido, guardar el pedido en el almacén
         if is_valid_district(district_input, districts):
-            save_order(st.session_state["order"], st.session_state["total_price"])
+            save_order(st.session_state["order"], st.session_state["total_price"], district_input,
+                       st.session_state["order_id"])
             st.session_state["order"] = None
             st.session_state["total_price"] = 0
@@ -2,13 +2,21 @@ import pandas as pd
 import streamlit as st
 from datetime import datetime
 from copy import deepcopy
-from groq import Groq
+from llm import ServicioNoDisponible, obtener_backend
 import re
+import logging
+import uuid
+from almacen import LineaPedido, nuevo_pedido
+from escritor import obtener_escritor
+from inventario import obtener_inventario
+from catalogo import cargar_catalogo, indice_menu, leer_csv, normalizar
+from pedidos import estadisticas_interprete, interpretar_pedido
 
-# Inicializar el cliente de Groq
-client = Groq(
-    api_key=st.secrets["GROQ_API_KEY"],
-)
+# Configura el logger
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Backend del LLM (Groq por defecto; LLM_BACKEND en los secrets permite "openai" o "local")
+backend = obtener_backend(st.secrets, por_defecto="groq")
 
 # Configuración inicial de la página
 st.set_page_config(page_title="SazónBot", page_icon=":pot_of_food:")
@@ -21,27 +29,32 @@ st.markdown(intro)
 
 # Cargar menú y distritos desde archivos CSV
 def load_menu(csv_file):
-    menu = pd.read_csv(csv_file)
+    menu = leer_csv(csv_file)  # Se lee una sola vez por proceso y se comparte entre sesiones
     return menu
 
 def load_districts(csv_file):
-    districts = pd.read_csv(csv_file)
+    districts = leer_csv(csv_file)
     return districts['Distrito'].tolist()
 
 def format_menu(menu):
     if menu.empty:
         return "No hay platos disponibles."
 
-    formatted_menu = []
-    for idx, row in menu.iterrows():
-        formatted_menu.append(
-            f"**{row['Plato']}**\n{row['Descripción']}\n**Precio:** S/{row['Precio']}"
+    # Columnas enteras y un solo join, sin iterrows (como en presentacion.py)
+    return "\n\n".join(
+        f"**{plato}**\n{descripcion}\n**Precio:** S/{precio}"
+        for plato, descripcion, precio in zip(
+            menu["Plato"].tolist(), menu["Descripción"].tolist(), menu["Precio"].tolist()
         )
-    return "\n\n".join(formatted_menu)
+    )
 
 # Cargar el menú y distritos
 menu = load_menu("carta.csv")
 districts = load_districts("distritos.csv")
+catalogo = cargar_catalogo()
+indice = indice_menu(catalogo)  # Índice nombre normalizado -> plato, precio y stock
+inventario = obtener_inventario(catalogo)  # Stock compartido por todas las sesiones
+menu = menu[~menu["Plato"].isin(inventario.agotados)]  # Sin los platos agotados
 
 # Estado inicial del chatbot
 initial_state = [
@@ -52,13 +65,17 @@ initial_state = [
     },
 ]
 
-# Función para guardar los pedidos
-def save_order(order, total_price):
-    with open("orders.csv", "a") as f:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        f.write(f"{timestamp}, {order}, {total_price}\n")
-
-def validate_order(prompt, menu):
+# Función para guardar los pedidos en el almacén SQLite (antes orders.csv)
+# Solo se encola: el escritor de fondo lo guarda sin bloquear la respuesta
+def save_order(order, total_price, district=None, order_id=None):
+    lineas = []
+    for dish, quantity in order.items():
+        plato = indice.get(normalizar(dish))
+        lineas.append(LineaPedido(dish, quantity, plato.precio * quantity if plato else None))
+    obtener_escritor().encolar(nuevo_pedido(lineas, total_price, distrito=district, origen="main2", id=order_id))
+    inventario.confirmar(order_id, order)  # Descontar del stock
+
+def validate_order(prompt, indice):
     order_details = {}
     total_price = 0
     pattern = r'(\d+)\s*(?:platos|plato)?\s*([a-zA-Z\s]+)'   # Regex actualizado
@@ -70,11 +87,13 @@ def validate_order(prompt, menu):
         try:
             quantity = int(quantity_str.strip())
             dish_name = dish_name.strip()
-            # Normalizar el nombre del plato
-            normalized_dish_name = dish_name.lower()
-            # Comparar con el menú
-            if normalized_dish_name in menu['Plato'].str.lower().values:
-                price = menu.loc[menu['Plato'].str.lower() == normalized_dish_name, 'Precio'].values[0]
+            # Normalizar el nombre del plato (minúsculas, sin tildes ni espacios repetidos)
+            normalized_dish_name = normalizar(dish_name)
+            # Comparar con el índice del menú
+            plato = indice.get(normalized_dish_name)
+            # Solo si queda stock suficiente (consulta O(1) al inventario)
+            if plato and inventario.disponible(plato.plato) >= quantity:
+                price = plato.precio
                 order_details[dish_name] = quantity
                 total_price += price * quantity
             else:
@@ -109,40 +128,45 @@ for message in st.session_state.messages:
         st.markdown(message["content"])
 
 def format_order_table(order_details):
-    table = "| Cantidad | Plato |\n"
-    table += "|----------|-------|\n"
-    
-    for dish, quantity in order_details.items():
-        if dish and quantity:
-            table += f"| {quantity}        | {dish}  |\n"
-    
-    return table
+    # Todas las filas en un solo join en lugar de concatenar la tabla fila por fila
+    filas = "".join(
+        f"| {quantity}        | {dish}  |\n" for dish, quantity in order_details.items() if dish and quantity
+    )
+    return "| Cantidad | Plato |\n|----------|-------|\n" + filas
 
 # Entrada del usuario para el pedido
 if user_input := st.chat_input("¿Qué te gustaría pedir?"):
     with st.chat_message("user", avatar="👤"):
         st.markdown(user_input)
 
-    # Llamar a Groq para obtener una respuesta
-    chat_completion = client.chat.completions.create(
-        messages=[{"role": "system", "content": "You are a helpful assistant for a food ordering service."},
-                  {"role": "user", "content": f"Extrae la cantidad y el plato de la siguiente solicitud: '{user_input}'.Limitate a solo devolver la cantidad y el plato de la solicitud sin un caracter adicional."}],
-        model="llama3-8b-8192",
-        temperature=0.5,
-        max_tokens=150,
-        top_p=1,
-        stop=None,
-        stream=False,
-    )
+    # Intentar extraer la cantidad y el plato localmente, sin llamar al LLM
+    parsed_message = interpretar_pedido(user_input, catalogo)
+
+    if parsed_message is None:
+        # Confianza baja: llamar al LLM para obtener una respuesta
+        try:
+            chat_completion = backend.completar(
+                [{"role": "system", "content": "You are a helpful assistant for a food ordering service."},
+                 {"role": "user", "content": f"Extrae la cantidad y el plato de la siguiente solicitud: '{user_input}'.Limitate a solo devolver la cantidad y el plato de la solicitud sin un caracter adicional."}],
+                temperature=0.5,
+                max_tokens=150,
+            )
+        except ServicioNoDisponible as e:
+            # El proveedor no responde o el circuito está abierto: aviso amable en lugar del error
+            with st.chat_message("assistant", avatar="🍲"):
+                st.markdown(str(e))
+            st.stop()
 
-    parsed_message = chat_completion.choices[0].message.content.strip()
+        parsed_message = chat_completion.texto.strip()
+    logging.info(f"Intérprete local: {estadisticas_interprete()}")
     
     # Validar el pedido del usuario
-    order_details, total_price = validate_order(parsed_message, menu)
+    order_details, total_price = validate_order(parsed_message, indice)
 
     if order_details:
         # Guardar el pedido en el estado
         st.session_state["order"] = order_details
+        st.session_state["order_id"] = uuid.uuid4().hex  # Clave de idempotencia al guardar
         st.session_state["total_price"] = total_price
         
         # Solicitar confirmación del pedido
@@ -175,7 +199,8 @@ if "order" in st.session_state and st.session_state["order"]:
                 # Verificar si el distrito es válido
                 if is_valid_district(district_input, districts):
                     response_text = f"Gracias por proporcionar tu distrito: {district_input}. Procederemos a entregar tu pedido allí. ¡Que disfrutes de tu almuerzo!"
-                    save_order(st.session_state["order"], st.session_state["total_price"])
+                    save_order(st.session_state["order"], st.session_state["total_price"], district_input,
+                               st.session_state["order_id"])
                     st.session_state["order"] = None
                     st.session_state["total_price"] = 0
                 else:
@@ -1,20 +1,34 @@
 import pandas as pd
 import streamlit as st
 from datetime import datetime
-from copy import deepcopy
 #from groq import Groq
 #import openai
-from openai import OpenAI
+from llm import obtener_backend
 import csv
 import re
 import pytz
 import json
 import logging
+from catalogo import cargar_catalogo
+from consultas import estadisticas_consultas
+from historial import mostrar_historial, reiniciar_historial
+from metricas import iniciar_exportacion, tramo
+from conversacion import Conversacion
+from motor import MotorChat, Sesion
+from prompts import prompt_inicial
 # Configura el logger
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 # Inicializar el cliente de Groq con la clave API
 #client = Groq(api_key=st.secrets["GROQ_API_KEY"])
-client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
+# Backend del LLM (OpenAI por defecto; LLM_BACKEND en los secrets permite "groq" o "local")
+backend = obtener_backend(st.secrets)
+# Tramos de tiempo por fase, etiquetados con la sesión y el turno (ver metricas.py)
+iniciar_exportacion(st.secrets)
+
+# Historial de la conversación de esta sesión del navegador
+if "sesion" not in st.session_state:
+    st.session_state["sesion"] = Sesion([])
+sesion = st.session_state["sesion"]
 
 # Configuración inicial de la página
 st.set_page_config(page_title="SazónBot", page_icon=":pot_of_food:")
@@ -26,318 +40,39 @@ Comienza a chatear con Sazón Bot y descubre qué puedes pedir, cuánto cuesta y
 st.markdown(intro)
 
 
-# Cargar el menú desde un archivo CSV
-def load(file_path):
-    """Cargar el menú desde un archivo CSV con columnas Plato, Descripción y Precio."""
-    load = pd.read_csv(file_path)
-    return load
-
-# Cargar los distritos de reparto desde un archivo CSV
-#def load_distritos(file_path):
- #   """Cargar los distritos de reparto desde un archivo CSV."""
-  #  distritos = pd.read_csv(file_path)
-   # return distritos
-
-def format_menu(menu):
-    if menu.empty:
-        return "No hay platos disponibles."
-
-    else:
-        # Encabezados de la tabla
-        table = "| **Plato** | **Descripción** | **Precio** |\n"
-        table += "|-----------|-----------------|-------------|\n"  # Línea de separación
-        
-        # Filas de la tabla
-        for idx, row in menu.iterrows():
-            table += f"| {row['Plato']} | {row['Descripción']} | S/{row['Precio']:.2f} |\n"
-        
-        return table
-
-
-# Mostrar el menú con descripciones
-def display_menu(menu):
-    """Mostrar el menú con descripciones."""
-    menu_text = "Aquí está nuestra carta:\n"
-    for index, row in menu.iterrows():
-        menu_text += f"{row['Plato']}: {row['Descripción']} - {row['Precio']} soles\n"
-    return menu_text
-
-# Mostrar los distritos de reparto
-def display_distritos(distritos):
-    """Mostrar los distritos de reparto disponibles."""
-    distritos_text = "Los distritos de reparto son:\n"
-    for index, row in distritos.iterrows():
-        distritos_text += f"**{row['Distrito']}**\n"
-    return distritos_text
-
-#def display_postre(postre):
-  #  """Mostrar el menú con descripciones."""
-   # postre_text = "Aquí está lista de postres:\n"
-    #for index, row in postre.iterrows():
-     #   postre_text += f"{row['Postres']}: {row['Descripción']} - {row['Precio']} soles\n"
-   # return postre_text
-def display_postre(postre):
-    """Mostrar el menú en formato de tabla."""
-    # Encabezado de la tabla
-    menu_text = "Aquí está nuestra carta:\n"
-    menu_text += "| Postre           | Descripción                 | Precio (S/) |\n"
-    menu_text += "|-----------------|-----------------------------|-------------|\n"
-    
-    # Agregar cada plato a la tabla
-    for index, row in postre.iterrows():
-        menu_text += f"| {row['Postres']:<15} | {row['Descripción']:<27} | {row['Precio']:>11} |\n"
-    
-    return menu_text
-
-def display_bebida(bebida):
-    """Mostrar el menú en formato de tabla."""
-    # Encabezado de la tabla
-    menu_text = "Aquí está nuestra carta:\n"
-    menu_text += "| Bebida           | Descripción                 | Precio (S/) |\n"
-    menu_text += "|-----------------|-----------------------------|-------------|\n"
-    
-    # Agregar cada plato a la tabla
-    for index, row in bebida.iterrows():
-        menu_text += f"| {row['bebida']:<15} | {row['descripcion']:<27} | {row['precio']:>11} |\n"
-    
-    return menu_text
-#def display_bebida(bebida):
- #   """Mostrar el menú con descripciones."""
-  #  bebida_text = "Aquí está lista de bebidas:\n"
-   # for index, row in bebida.iterrows():
-    #    bebida_text += f"{row['bebida']}: {row['descripcion']} - {row['precio']} soles\n"
-    #return bebida_text
-		
-# Cargar el menú y distritos
-menu = load("carta.csv")
-distritos = load("distritos.csv")
-bebidas= load("Bebidas.csv")
-postres= load("Postres.csv")
-
-def display_confirmed_order(order_details):
-    """Genera una tabla en formato Markdown para el pedido confirmado."""
-    table = "| **Plato** | **Cantidad** | **Precio Total** |\n"
-    table += "|-----------|--------------|------------------|\n"
-    for item in order_details:
-        table += f"| {item['Plato']} | {item['Cantidad']} | S/{item['Precio Total']:.2f} |\n"
-    table += "| **Total** |              | **S/ {:.2f}**      |\n".format(sum(item['Precio Total'] for item in order_details))
-    return table
-
-##Pendiente
-
-def palabras_a_numero(palabra):
-    """Convierte un número en palabras a su valor en cifras."""
-    
-    # Diccionario básico para los números escritos en español
-    numeros = {
-        "uno": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5,
-        "seis": 6, "siete": 7, "ocho": 8, "nueve": 9, "diez": 10,
-        "once": 11, "doce": 12, "trece": 13, "catorce": 14, "quince": 15,
-        "dieciséis": 16, "diecisiete": 17, "dieciocho": 18, "diecinueve": 19, "veinte": 20,
-        "veintiuno": 21, "veintidós": 22, "veintitrés": 23, "veinticuatro": 24, "veinticinco": 25,
-        "veintiséis": 26, "veintisiete": 27, "veintiocho": 28, "veintinueve": 29, "treinta": 30,
-        "cuarenta": 40, "cincuenta": 50, "sesenta": 60, "setenta": 70, "ochenta": 80, "noventa": 90,
-        "cien": 100
-    }
-    
-    # Manejo de números compuestos (como "treinta y cinco")
-    if " y " in palabra:
-        partes = palabra.split(" y ")
-        return numeros[partes[0]] + numeros[partes[1]]
-    
-    # Si es un número exacto (como "cinco" o "veintitrés")
-    return numeros.get(palabra.lower(), None)
-
-def verificar_rango(numero):
-    return 1 <= numero <= 100
-	
-
-def get_system_prompt(menu, distritos):
-    """Define el prompt del sistema para el bot de Sazón incluyendo el menú y distritos."""
-    lima_tz = pytz.timezone('America/Lima')  # Define la zona horaria de Lima
-    hora_lima = datetime.now(lima_tz).strftime("%Y-%m-%d %H:%M:%S")  # Obtiene la hora actual en Lima
-    system_prompt = f"""
-    Eres el bot de pedidos de Sazón, amable y servicial. Ayudas a los clientes a hacer sus pedidos y siempre confirmas que solo pidan platos que están en el menú oficial. Aquí tienes el menú para mostrárselo a los clientes:\n{display_menu(menu)}\n
-    También repartimos en los siguientes distritos: {display_distritos(distritos)}.\n
-    Primero, saluda al cliente y ofrécele el menú. Asegúrate de que el cliente solo seleccione platos que están en el menú actual y explícales que no podemos preparar platos fuera del menú.
-
-    Los clientes pueden indicar la cantidad de platos de dos maneras:
-    1. En formato numérico (por ejemplo, "5", "23", "50").
-    2. En formato de palabras (por ejemplo, "cinco", "veintitrés", "setenta").
-
-    **Instrucciones Clave**:
-    1. **Identificación de Cantidades**: Al recibir el mensaje del cliente, identifica inmediatamente cualquier cantidad solicitada, ya sea en palabras o en números. Usa la función **palabras_a_numero()** para convertir cantidades en palabras a números. 
-    2. **Verificación de Rango**: Después de identificar la cantidad, usa la función **verificar_rango()** para confirmar que esté en el rango permitido de 1 a 100.
-
-    - **Si la cantidad está dentro del rango** (1-100), confirma el pedido de manera adecuada.
-    - **Si la cantidad está fuera del rango**, responde educadamente pidiendo al usuario que ajuste la cantidad.
-
-    Ejemplos de manejo de cantidades:
-    1. Si el cliente pide "setenta arroz chaufa", convierte "setenta" a 70 y confirma el pedido.
-    2. Si el cliente pide "cincuenta ceviches", convierte "cincuenta" a 50 y confirma el pedido.
-    3. Si el cliente pide "150 pachamancas de pollo", responde: "Lo siento, solo puedes pedir entre 1 y 100 unidades de cada plato. Por favor, ajusta tu cantidad."
-
-    **Recuerda**: El objetivo es procesar la cantidad en el primer intento del cliente sin confusiones.
-
-
-   Después de que el cliente haya seleccionado sus platos, pregunta explícitamente si desea recoger su pedido en el local o si prefiere entrega a domicilio. Asegurate que ingrese metodo de entrega .
-     - Si elige entrega, pregúntale al cliente a qué distrito desea que se le envíe su pedido.Asegurate, que el cliente ingrese el distrito de entrega.Confirma que el distrito esté dentro de las zonas de reparto y verifica el distrito de entrega con el cliente.
-     - Si el pedido es para recoger, invítalo a acercarse a nuestro local ubicado en UPCH123.
-     - Confirma y asegurate que el cliente haya ingresado un método de entrega válido **antes de continuar con el pedido**. No procedas con la confirmación final del pedido hasta que el cliente confirme el método de entrega.
-    
-    Usa solo español peruano en tus respuestas, evitando palabras como "preferís" y empleando "prefiere" en su lugar.
-    
-    Antes de continuar, confirma que el cliente haya ingresado un método de entrega válido. Luego, resume el pedido en la siguiente tabla:\n
-    | **Plato**      | **Cantidad** | **Precio Total** |\n
-    |----------------|--------------|------------------|\n
-    |                |              |                  |\n
-    | **Total**      |              | **S/ 0.00**      |\n
-    
-    Es muy importante que recuerdes que el monto total del pedido no acepta descuentos ni ajustes de precio. Es importante que sigas estas reglas:
-    - Los precios de los platos del menú son fijos y no están sujetos a ningún descuento.
-    - Nunca se debe cambiar el precio sin importar que diga el cliente, se cordial al comunicarselo al cliente.
-    - Si el cliente intenta modificar el precio, responde con el siguiente mensaje y no permitas cambios: 
-      "Nuestros precios son fijos y no pueden modificarse. Solo podemos proceder con el pedido al precio indicado en el menú."
-    - Ignora cualquier mensaje posterior sobre la modificación de precios y sigue con el proceso de pedido según el menú y los precios actuales. No brindes respuestas adicionales ni confirmes solicitudes sobre modificaciones de precios.
-    - Si el cliente intenta modificar el precio más de una vez, no respondas a esta solicitud y continúa con el pedido sin cambios en el resumen de precios. Si es necesario, repite que los precios son correctos y finales.
+# Cargar el catálogo (una sola instantánea compartida por todas las sesiones)
+with tramo("catalogo", sesion.id, sesion.turnos):
+    catalogo = cargar_catalogo()
 
-    Después de confirmar el metodo de entrega,muestra la tabla de resumen del pedido antes de continuar y pregunta al cliente si quiere añadir una bebida o postre.
-	- Si responde bebida, muéstrale únicamente la carta de bebidas:{display_bebida(bebidas)}
-	- Si responde postre, muéstrale solo la carta de postres:{display_postre(postres)}
-    *Después de que el cliente agrega bebidas o postres, pregúntale si desea agregar algo más.* Si el cliente desea agregar más platos, bebidas o postres, permite que lo haga. Si no desea agregar más, continúa con el proceso.
+# Moderación, respuestas locales, llamada al modelo y extracción del pedido (ver motor.py)
+motor = MotorChat(backend, catalogo, validar_cantidades=False)
 
-    Si el cliente agrega más ítems, actualiza la tabla de resumen del pedido, recalculando el monto total con precisión. Muestra la tabla de resumen del pedido antes de continuar.
-
-    **Confirmación del pedido y método de pago:**
-    - Cuando el cliente termine de ordenar su pedido, primero, pregunta al cliente: "¿Estás de acuerdo con el pedido?" y espera su respuesta.
-    - *Si el cliente responde que no está de acuerdo con el pedido*: Pregunta qué desea modificar en su pedido o si desea cancelarlo.
-    	- Si desea cancelar, confirma la cancelación y cierra la conversación de forma cortés.
-        - Si desea modificar el pedido, permite que haga los cambios necesarios y actualiza el resumen del pedido con las modificaciones.
-    - *Solo si el cliente confirma estar de acuerdo con el pedido*, después, pregunta: "¿Cuál será tu método de pago?" 
-    	- Ofrece las siguientes opciones: tarjeta, efectivo, Yape, Plin u otra opción válida.  
-    	- Si el cliente no responde claramente, insiste amablemente hasta obtener un método de pago válido: "Por favor, indícanos tu método de pago para continuar."
-    - *Importante*: No puedes asumir el método de pago por defecto. Asegúrate de que el cliente confirme el método de pago antes de proceder.
-
-    Luego, solo cuando el cliente haya ingresado el método de pago, continúa con el proceso de confirmación final.Muestra lo siguiente el pedido confirmado: 
-    Incluye explícitamente:
-    	El pedido confirmado será:\n
-    	{display_confirmed_order([{'Plato': '', 'Cantidad': 0, 'Precio Total': 0}])}\n
-	- *Método de pago*: el método que el cliente eligió.
-	- *Lugar de entrega*: el distrito de entrega o indica la dirección del local.
-	- *Timestamp Confirmacion*: hora exacta de confirmación del pedido, el valor '{hora_lima}'.
-         
-    Recuerda siempre confirmar que el pedido, el metodo de pago y el lugar de entrega estén hayan sido ingresados, completos y correctos antes de registrarlo.
-    """
-    return system_prompt.replace("\n", " ")
-   
 def extract_order_json(response):
     """Extrae el pedido confirmado en formato JSON desde la respuesta del bot solo si todos los campos tienen valores completos."""
-    prompt = f"""
-		A partir de la siguiente respuesta del asistente, extrae la información del pedido confirmado.
-
-		Respuesta del asistente:
-		'''{response}'''
-
-		Proporciona un JSON con el siguiente formato:
-
-		{{
-    			"Platos": [
-        			{{"Plato": "Nombre del plato", "Cantidad": cantidad, "Precio Total": precio_total}},
-        			...
-    				],
-    			"Total": total_pedido,
-    			"Metodo de Pago": "metodo_de_pago",
-    			"Lugar de Entrega": "lugar_entrega",
-    			"Timestamp Confirmacion": "timestamp_confirmacion"
-		}}
+    return motor.extract_order_json(response)
 
-		Si algún campo no aparece en la respuesta, asígnale el valor null.
+def check_for_inappropriate_content(prompt):
+    """Verifica si el prompt contiene contenido inapropiado utilizando la API de Moderación de OpenAI."""
+    return motor.check_for_inappropriate_content(prompt)
 
-		Si el pedido no está confirmado explícitamente en la respuesta, devuelve un JSON vacío: {{}}.
-  		Responde *solo* con el JSON, sin explicaciones adicionales.
-    		"""
-    #prompt = f"Extrae la información del pedido confirmado solo de la siguiente respuesta: '{response}'. Si el pedido está confirmado, proporciona una salida en formato JSON con las siguientes claves: 'Platos' (contiene los platos, cada uno con su cantidad y precio_total), 'Total', 'metodo de pago', 'lugar_entrega', y 'timestamp_confirmacion'. Si algún campo como 'metodo de pago' o 'lugar_entrega'o 'timestamp_confirmacion' no está presente, asígnale el valor null. Si el pedido no está confirmado, devuelve un diccionario vacio."
-    #prompt = f"Extrae la información del pedido de la siguiente respuesta: '{response}'. Si el pedido está confirmado proporciona una salida en formato JSON con las claves: Platos(contine los platos con la cantidad y precio_total),Total,metodo de pago,lugar_entrega y timestamp_confirmacion. Si el pedido no está confirmado devuelve una diccionario vacio."
+def generate_response(prompt, temperature=0, max_tokens=1000, stream=True):
+    """Resolver el turno del usuario y mostrarlo en el chat con un límite de tokens.
 
-    extraction = client.chat.completions.create(
-        messages=[
-            {"role": "system", "content": "Eres un asistente que extrae información de pedidos en formato JSON a partir de la respuesta proporcionada."},
-            {"role": "user", "content": prompt}
-        ],
-        model="gpt-3.5-turbo",
-        temperature=0,
-        max_tokens=300,
-        top_p=1,
-        stop=None,
-        stream=False,
-    )
-#"gemma2-9b-it"
-    response_content = extraction.choices[0].message.content
-    
-    # Intenta cargar como JSON
-    try:
-        order_json = json.loads(response_content)
-        #st.markdown(order_json)
-        #st.markdown(type(order_json))
-        # Verifica si el JSON es un diccionario
-        if isinstance(order_json, dict):
-            if all(order_json[key] not in (None, '', [], {}) for key in order_json):
-                return order_json
-            else:
-                print("Advertencia: Hay claves con valores nulos o vacíos en el pedido.")
-                return {}
-            # Verifica que todas las claves en order_json tengan valores no nulos
-            #return order_json if order_json else {}
-        
-        # Si el JSON es una lista, devuelves un diccionario vacío o manejas la lista de otro modo
-        elif isinstance(order_json, list):
-            print("Advertencia: Se recibió una lista en lugar de un diccionario.")
-            return {}
-        
-        # Si no es ni lista ni diccionario, retorna un diccionario vacío
-        else:
-            return {}
-    
-    except json.JSONDecodeError:
-        # Manejo de error en caso de que el JSON no sea válido
-        return {}
-def generate_response(prompt, temperature=0,max_tokens=1000):
-    """Enviar el prompt a Groq y devolver la respuesta con un límite de tokens."""
-    st.session_state["messages"].append({"role": "user", "content": prompt})
+    La moderación corre en paralelo con la respuesta (local o del modelo) y,
+    si el mensaje resulta inapropiado, la respuesta se descarta y se devuelve
+    None. Con `stream=True` los tokens se muestran a medida que llegan.
+    """
+    turno = motor.iniciar_turno(sesion, prompt, stream=stream, temperature=temperature, max_tokens=max_tokens)
+    if not turno.aprobado():
+        return None
 
-    completion = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=st.session_state["messages"],
-        temperature=temperature,
-        max_tokens=max_tokens,
-        stream=False,
-    )
-    response = completion.choices[0].message.content
-    st.session_state["messages"].append({"role": "assistant", "content": response})
-    # Extraer JSON del pedido confirmado
-    order_json = extract_order_json(response)
-    #st.markdown(order_json)
-    #st.markdown(type(order_json))
-    logging.info(json.dumps(order_json, indent=4) if order_json else '{}')
+    if turno.mostrar_usuario:
+        with st.chat_message("user", avatar="👤"):
+            st.markdown(prompt)
+    with st.chat_message("assistant", avatar="👨‍🍳"):
+        response = st.write_stream(turno.fragmentos())
+    turno.cerrar(response)
     return response
-
-# Función para verificar contenido inapropiado
-def check_for_inappropriate_content(prompt):
-    """Verifica si el prompt contiene contenido inapropiado utilizando la API de Moderación de OpenAI."""
-    try:
-        response = client.moderations.create(input=prompt)
-        logging.info(f"Moderation API response: {response}")
-         # Acceso correcto a los resultados de la respuesta de moderación
-        moderation_result = response.results[0]
-        
-        # Verifica si está marcado como inapropiado
-        if moderation_result.flagged:
-            return True
-        else:
-            return False
-    except Exception as e:
-        logging.error(f"Error al llamar a la API de Moderación: {e}")
-        return False
 	
 # Ajustar el tono del bot
 def adjust_tone(tone="friendly"):
@@ -350,46 +85,30 @@ def adjust_tone(tone="friendly"):
         return "Eres un asistente amigable y relajado."
 
         
-initial_state = [
-    {"role": "system", "content": get_system_prompt(menu,distritos)},
-    {
-        "role": "assistant",
-        "content": f"¡Hola! Bienvenido a Sazón Bot. Este es el menú del día:\n\n{format_menu(menu)}\n\n¿Qué te puedo ofrecer?",
-    },
-]
+# Las sesiones solo guardan una referencia al prompt inicial compartido (el mismo que usan main2 y el API)
+initial_state = prompt_inicial(catalogo, motor.inventario.agotados)
 
 
-if "messages" not in st.session_state:
-    st.session_state["messages"] = deepcopy(initial_state)
+if not sesion.mensajes:
+    sesion.reiniciar(Conversacion(initial_state))
 
 # eliminar conversación
 clear_button = st.button("Eliminar conversación", key="clear")
 if clear_button:
-    st.session_state["messages"] = deepcopy(initial_state)
+    motor.reiniciar_sesion(sesion, Conversacion(initial_state))
+    reiniciar_historial()
 
 # Display chat messages from history on app rerun
-for message in st.session_state.messages:
-    if message["role"] == "system":
-        continue
-    elif message["role"] == "assistant":
-        with st.chat_message(message["role"], avatar="👨‍🍳"):
-            st.markdown(message["content"])
-    else:
-        with st.chat_message(message["role"], avatar="👤"):
-            st.markdown(message["content"])
+with tramo("render", sesion.id, sesion.turnos):
+    # Solo los últimos mensajes; los anteriores quedan detrás de "Ver más"
+    mostrar_historial(sesion.mensajes, {"assistant": "👨‍🍳", "user": "👤"})
 
 if prompt := st.chat_input():
-    # Verificar si el contenido es inapropiado
-    if check_for_inappropriate_content(prompt):
+    # Moderación en paralelo; las preguntas sobre la carta se responden sin el LLM
+    output = generate_response(prompt)
+    logging.info(f"Enrutamiento: {estadisticas_consultas()}")
+    logging.info(f"Consumo de la sesión {sesion.id}: {sesion.consumo}")
+    logging.info(f"Memoria de la sesión {sesion.id}: {sesion.memoria():,} bytes")
+    if output is None:
         with st.chat_message("assistant", avatar="👨‍🍳"):
             st.markdown("Por favor, mantengamos la conversación respetuosa.")
-		
-    else:
-        with st.chat_message("user", avatar="👤"):
-            st.markdown(prompt)
-        output = generate_response(prompt)
-        with st.chat_message("assistant", avatar="👨‍🍳"):
-            st.markdown(output)
-    
-
-
@@ -0,0 +1,235 @@
+"""Tramos de tiempo de cada fase de un turno, agregados en histogramas.
+
+Fases: moderacion, primer_token, completion, extraccion, turno, catalogo,
+render y escritura (lotes de pedidos guardados en segundo plano). Cada tramo
+se suma a un histograma por fase (siempre, es barato) y, para una fracción
+de los turnos, se escribe además como línea JSON en el log con la sesión y
+el número de turno. Los histogramas se exportan en formato
+de texto de Prometheus a un archivo o en un endpoint HTTP /metrics, junto
+con medidores como la profundidad de la cola de pedidos.
+
+Con varios procesos (los workers del API) cada uno exporta lo suyo: el
+archivo lleva el pid en el nombre y en la etiqueta `proceso`, y el endpoint
+toma el primer puerto libre desde METRICAS_PUERTO.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Límites superiores de las cubetas, en segundos
+LIMITES = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Fracción de turnos cuyos tramos se escriben en el log
+MUESTREO = 0.1
+INTERVALO_ARCHIVO = 15.0  # Segundos entre escrituras del archivo de Prometheus
+PUERTOS_WORKERS = 16  # Puertos que se prueban desde METRICAS_PUERTO, uno por worker
+
+_lock = threading.Lock()
+_histogramas = {}  # fase -> Histograma
+_medidores = {}  # nombre -> último valor (gauges, p. ej. profundidad de una cola)
+_exportando = {}  # "archivo" / "puerto" -> hilo o servidor ya iniciado
+_tasa_muestreo = MUESTREO
+_logger = logging.getLogger("sazonbot.metricas")
+
+
+class Histograma:
+    """Cuenta acumulada por cubeta, suma y cantidad de observaciones (como en Prometheus)."""
+
+    def __init__(self, limites=LIMITES):
+        self.limites = limites
+        self.cubetas = [0] * len(limites)
+        self.suma = 0.0
+        self.cuenta = 0
+
+    def observar(self, segundos):
+        for i, limite in enumerate(self.limites):
+            if segundos <= limite:
+                self.cubetas[i] += 1
+                break
+        self.suma += segundos
+        self.cuenta += 1
+
+    def acumuladas(self):
+        total = 0
+        for cantidad in self.cubetas:
+            total += cantidad
+            yield total
+
+
+def muestreado(sesion, turno):
+    """¿Se registran en el log los tramos de este turno? Decisión estable por (sesión, turno).
+
+    Los tramos sin sesión (trabajo de fondo) solo van al histograma.
+    """
+    if sesion is None:
+        return False
+    return zlib.crc32(f"{sesion}:{turno}".encode()) / 2 ** 32 < _tasa_muestreo
+
+
+def registrar(fase, segundos, sesion=None, turno=None):
+    """Sumar un tramo al histograma de su fase y, si el turno está muestreado, al log."""
+    with _lock:
+        histograma = _histogramas.get(fase)
+        if histograma is None:
+            histograma = _histogramas[fase] = Histograma()
+        histograma.observar(segundos)
+    if muestreado(sesion, turno):
+        _logger.info(json.dumps({
+            "evento": "tramo",
+            "fase": fase,
+            "ms": round(segundos * 1000, 3),
+            "sesion": sesion,
+            "turno": turno,
+            "ts": round(time.time(), 3),
+        }))
+
+
+def fijar(nombre, valor):
+    """Actualizar un medidor (gauge) que se exporta con su último valor."""
+    with _lock:
+        _medidores[nombre] = valor
+
+
+@contextmanager
+def tramo(fase, sesion=None, turno=None):
+    """Medir el bloque como un tramo de `fase`."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar(fase, time.perf_counter() - inicio, sesion, turno)
+
+
+def resumen():
+    """Cantidad, suma y media en milisegundos de cada fase."""
+    with _lock:
+        return {
+            fase: {
+                "cuenta": h.cuenta,
+                "suma_ms": h.suma * 1000,
+                "media_ms": h.suma * 1000 / h.cuenta if h.cuenta else 0.0,
+            }
+            for fase, h in sorted(_histogramas.items())
+        }
+
+
+def texto_prometheus(proceso=None):
+    """Histogramas en el formato de texto de exposición de Prometheus.
+
+    Con `proceso` cada serie lleva además la etiqueta proceso="...".
+    """
+    extra = f',proceso="{proceso}"' if proceso is not None else ""
+    solo = f'{{proceso="{proceso}"}}' if proceso is not None else ""
+    lineas = [
+        "# HELP sazonbot_fase_segundos Duración de cada fase de un turno del chat.",
+        "# TYPE sazonbot_fase_segundos histogram",
+    ]
+    with _lock:
+        for fase, h in sorted(_histogramas.items()):
+            for limite, acumulada in zip(h.limites, h.acumuladas()):
+                lineas.append(f'sazonbot_fase_segundos_bucket{{fase="{fase}",le="{limite}"{extra}}} {acumulada}')
+            lineas.append(f'sazonbot_fase_segundos_bucket{{fase="{fase}",le="+Inf"{extra}}} {h.cuenta}')
+            lineas.append(f'sazonbot_fase_segundos_sum{{fase="{fase}"{extra}}} {h.suma:.6f}')
+            lineas.append(f'sazonbot_fase_segundos_count{{fase="{fase}"{extra}}} {h.cuenta}')
+        for nombre, valor in sorted(_medidores.items()):
+            lineas.append(f"# TYPE sazonbot_{nombre} gauge")
+            lineas.append(f"sazonbot_{nombre}{solo} {valor}")
+    return "\n".join(lineas) + "\n"
+
+
+def archivo_del_proceso(ruta):
+    """`ruta` con el pid antes de la extensión: metricas.prom -> metricas-1234.prom."""
+    base, extension = os.path.splitext(ruta)
+    return f"{base}-{os.getpid()}{extension}"
+
+
+def exportar_prometheus(ruta, proceso=None):
+    """Escribir los histogramas en `ruta` de forma atómica (para el textfile collector)."""
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        f.write(texto_prometheus(proceso))
+    os.replace(temporal, ruta)
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    def log_message(self, formato, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        cuerpo = texto_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+
+def _escribir_periodicamente(ruta):
+    while True:
+        time.sleep(INTERVALO_ARCHIVO)
+        try:
+            exportar_prometheus(ruta, os.getpid())
+        except OSError as e:
+            _logger.error(f"No se pudo escribir {ruta}: {e}")
+
+
+def _borrar(ruta):
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+
+def _servir(puerto):
+    """Endpoint /metrics en el primer puerto libre desde `puerto`; None si no hay ninguno."""
+    for candidato in range(puerto, puerto + PUERTOS_WORKERS):
+        try:
+            servidor = ThreadingHTTPServer(("0.0.0.0", candidato), _Manejador)
+        except OSError:
+            continue  # Lo tiene otro worker
+        servidor.daemon_threads = True
+        threading.Thread(target=servidor.serve_forever, daemon=True, name="metricas-http").start()
+        _logger.info(f"Métricas del proceso {os.getpid()} en el puerto {candidato}")
+        return servidor
+    _logger.error(f"Sin puerto libre para las métricas entre {puerto} y {puerto + PUERTOS_WORKERS - 1}")
+    return None
+
+
+def iniciar_exportacion(config=None):
+    """Iniciar la exportación una sola vez por proceso según la configuración.
+
+    `config` es un mapeo como st.secrets; se usa METRICAS_MUESTREO (fracción
+    de turnos en el log), METRICAS_ARCHIVO (archivo .prom que se reescribe
+    cada INTERVALO_ARCHIVO segundos, uno por proceso) y METRICAS_PUERTO
+    (endpoint /metrics). Si falta una clave se busca en las variables de
+    entorno. Un error al exportar se registra en el log: no detiene la app.
+    """
+    global _tasa_muestreo
+
+    def valor(clave):
+        if config is not None and clave in config:
+            return config[clave]
+        return os.environ.get(clave)
+
+    muestreo = valor("METRICAS_MUESTREO")
+    if muestreo is not None:
+        _tasa_muestreo = float(muestreo)
+    archivo, puerto = valor("METRICAS_ARCHIVO"), valor("METRICAS_PUERTO")
+    with _lock:
+        if archivo and "archivo" not in _exportando:
+            archivo = archivo_del_proceso(archivo)
+            hilo = threading.Thread(target=_escribir_periodicamente, args=(archivo,), daemon=True,
+                                    name="metricas-archivo")
+            hilo.start()
+            atexit.register(_borrar, archivo)  # Las cifras de un proceso terminado no se siguen exportando
+            _exportando["archivo"] = hilo
+        if puerto and "puerto" not in _exportando:
+            _exportando["puerto"] = _servir(int(puerto))
@@ -0,0 +1,109 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from catalogo import normalizar
+from pedidos import NUMEROS, tokenizar
+
+# Veredictos de moderación cacheados por texto normalizado
+TAMANO_CACHE = 10000
+TTL_SEGUNDOS = 3600
+# Los mensajes más largos que esto siempre se envían a la API
+MAX_PALABRAS_PREFILTRO = 12
+
+# Vocabulario habitual de un pedido que no necesita moderación
+VOCABULARIO_PEDIDO = {
+    "si", "no", "ok", "okay", "vale", "claro", "listo", "correcto", "perfecto", "bueno",
+    "hola", "buenas", "buenos", "dias", "tardes", "noches", "gracias", "porfa", "por", "favor",
+    "quiero", "quisiera", "deseo", "me", "das", "da", "dame", "pedir", "agregar", "anadir", "mas",
+    "nada", "eso", "es", "todo", "solo", "tambien", "otra", "otro", "y", "o", "de", "del", "con",
+    "sin", "el", "la", "los", "las", "al", "a", "en", "para", "mi", "un", "una", "unos", "unas",
+    "plato", "platos", "bebida", "bebidas", "postre", "postres", "menu", "carta",
+    "pedido", "pago", "pagar", "efectivo", "tarjeta", "yape", "plin",
+    "delivery", "domicilio", "entrega", "recoger", "recojo", "local", "tienda",
+    "estoy", "acuerdo", "confirmo", "cancelar",
+}
+
+_lock = threading.Lock()
+_cache = OrderedDict()  # hash del texto normalizado -> (marcado, expira)
+_vocabularios = {}  # versión del catálogo -> conjunto de palabras permitidas
+_estadisticas = {"prefiltro": 0, "cache_hit": 0, "cache_miss": 0}
+
+
+def _vocabulario(catalogo):
+    """Palabras permitidas: las del pedido más las de platos, bebidas, postres y distritos."""
+    vocabulario = _vocabularios.get(catalogo.version)
+    if vocabulario is not None:
+        return vocabulario
+    vocabulario = set(VOCABULARIO_PEDIDO) | set(NUMEROS)
+    nombres = (
+        catalogo.menu["Plato"].tolist()
+        + catalogo.bebidas["descripcion"].tolist()
+        + catalogo.bebidas["bebida"].tolist()
+        + catalogo.postres["Postres"].tolist()
+        + catalogo.distritos["Distrito"].tolist()
+    )
+    for nombre in nombres:
+        for token in tokenizar(nombre):
+            vocabulario.add(token)
+            vocabulario.add(token + "s")  # Plurales: "ceviches", "gaseosas"
+    with _lock:
+        _vocabularios.clear()
+        _vocabularios[catalogo.version] = vocabulario
+    return vocabulario
+
+
+def es_benigno(texto, catalogo):
+    """Prefiltro local: mensajes cortos formados solo por vocabulario del pedido."""
+    tokens = tokenizar(texto)
+    if not tokens or len(tokens) > MAX_PALABRAS_PREFILTRO:
+        return False
+    vocabulario = _vocabulario(catalogo)
+    return all(token.isdigit() or token in vocabulario for token in tokens)
+
+
+def _clave(texto):
+    return hashlib.sha1(normalizar(texto).encode()).hexdigest()
+
+
+def moderar(texto, catalogo, llamar_api):
+    """Devuelve True si el texto es inapropiado, llamando a la API solo para texto nuevo.
+
+    `llamar_api(texto)` debe devolver el veredicto de la API y lanzar una
+    excepción si falla; los errores no se cachean.
+    """
+    if es_benigno(texto, catalogo):
+        with _lock:
+            _estadisticas["prefiltro"] += 1
+        return False
+
+    clave = _clave(texto)
+    ahora = time.monotonic()
+    with _lock:
+        guardado = _cache.get(clave)
+        if guardado is not None and guardado[1] > ahora:
+            _cache.move_to_end(clave)
+            _estadisticas["cache_hit"] += 1
+            return guardado[0]
+        _estadisticas["cache_miss"] += 1
+
+    marcado = llamar_api(texto)
+    with _lock:
+        _cache[clave] = (marcado, ahora + TTL_SEGUNDOS)
+        _cache.move_to_end(clave)
+        while len(_cache) > TAMANO_CACHE:
+            _cache.popitem(last=False)
+    return marcado
+
+
+def estadisticas_moderacion():
+    """Contadores del prefiltro y de la caché de moderación."""
+    with _lock:
+        estadisticas = dict(_estadisticas)
+        estadisticas["tamano_cache"] = len(_cache)
+    consultas = sum(estadisticas[clave] for clave in ("prefiltro", "cache_hit", "cache_miss"))
+    estadisticas["tasa_sin_api"] = (
+        (estadisticas["prefiltro"] + estadisticas["cache_hit"]) / consultas if consultas else 0.0
+    )
+    return estadisticas
@@ -0,0 +1,406 @@
+"""Camino de cada turno del chat, sin Streamlit.
+
+main3.py y main4.py lo usan para responder al usuario y benchmarks/replay.py
+para reproducir conversaciones grabadas con exactamente el mismo código.
+"""
+import json
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from almacen import pedido_desde_json
+from catalogo import indice_menu, normalizar
+from consultas import clasificar_consulta, registrar_ruta
+from consumo import (CONTEXTO_COMPACTADO, FRACCION_COMPACTAR, MENSAJE_PRESUPUESTO, PRESUPUESTO_SESION,
+                     TURNOS_COMPACTADOS, ConsumoSesion, registrar_llamada, registrar_pedido, sumar_a_sesion)
+from contexto import ResumenConversacion, estimar_tokens, mensaje_hora_lima, preparar_contexto
+from conversacion import Conversacion, Mensaje, tamano
+from escritor import obtener_escritor
+from historico import archivar
+from inventario import SinStock, mensaje_agotados, mensaje_sin_stock, obtener_inventario
+from llm import ServicioNoDisponible, Uso
+from metricas import registrar, tramo
+from moderacion import estadisticas_moderacion, moderar
+from pedidos import buscador, es_pedido_confirmado, procesar_mensaje_usuario
+from presentacion import respuesta_consulta
+from prompts import prompt_extraccion, prompt_inicial
+
+MENSAJE_RESPETO = "Por favor, mantengamos la conversación respetuosa."
+
+# Hilos compartidos por todas las sesiones para moderar y extraer pedidos sin bloquear la respuesta
+_ejecutor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="segundo-plano")
+
+
+class Sesion:
+    """Historial y resumen de una conversación (en Streamlit vive en st.session_state)."""
+
+    __slots__ = ("id", "mensajes", "resumen", "turnos", "consumo")
+
+    def __init__(self, mensajes, resumen=None, id=None):
+        self.id = id or uuid.uuid4().hex[:12]  # Etiqueta de las métricas y clave de la reserva
+        self.mensajes = mensajes
+        self.resumen = resumen if resumen is not None else ResumenConversacion()
+        self.turnos = 0
+        self.consumo = ConsumoSesion()
+
+    def reiniciar(self, mensajes):
+        """Empezar de nuevo la conversación (botón "Eliminar conversación")."""
+        self.mensajes = mensajes
+        self.resumen = ResumenConversacion()
+        self.turnos = 0
+        self.consumo = ConsumoSesion()
+
+    def memoria(self):
+        """Bytes que ocupa la sesión, sin contar el prompt inicial compartido."""
+        return tamano(self, [getattr(self.mensajes, "prompt", None)])
+
+
+class CuentaFondo:
+    """Id de la sesión y consumo de un trabajo de fondo del turno (la moderación o la extracción del pedido).
+
+    El trabajo de fondo no toca la Sesion, que a esa altura puede estar
+    guardándose; al terminar, quien atiende el turno suma `consumo` a la
+    sesión (ver Turno.aprobado y Turno.extraer).
+    """
+
+    __slots__ = ("id", "consumo")
+
+    def __init__(self, id):
+        self.id = id
+        self.consumo = ConsumoSesion()
+
+
+class Turno:
+    """Un mensaje del usuario en curso.
+
+    `ruta` indica cómo se resuelve: "llm", la intención de una consulta local,
+    "cantidad" (error en las cantidades), "sin_stock" (no alcanza el stock),
+    "no_disponible" (falla el proveedor) o "presupuesto" (la sesión agotó sus
+    tokens).
+    La respuesta ya está pedida; antes de mostrarla hay que llamar a aprobado().
+    """
+
+    def __init__(self, motor, sesion, numero, prompt, inicio, ruta, respuesta, moderacion, pedido=None,
+                 enviados=None, cuenta_moderacion=None):
+        self.motor = motor
+        self.sesion = sesion
+        self.numero = numero
+        self.prompt = prompt
+        self.inicio = inicio
+        self.ruta = ruta
+        self.respuesta = respuesta  # Texto, Respuesta o FlujoRespuesta
+        self.moderacion = moderacion
+        self.texto = None
+        self.confirmacion = None  # Respuesta con el pedido confirmado, pendiente de extraer
+        self.extraccion = None  # Future de la extracción del pedido confirmado
+        self.fondo = None  # CuentaFondo de la extracción
+        self.pedido = pedido  # Momento en que se pidió la respuesta al modelo
+        self.enviados = enviados  # Mensajes enviados al modelo
+        self.cuenta_moderacion = cuenta_moderacion  # CuentaFondo de la moderación
+
+    def _registrar(self, fase, desde):
+        registrar(fase, time.perf_counter() - desde, self.sesion.id, self.numero)
+
+    @property
+    def mostrar_usuario(self):
+        """¿Se muestra el mensaje del usuario? No en los avisos de error."""
+        return self.ruta not in ("cantidad", "sin_stock", "no_disponible")
+
+    def aprobado(self):
+        """Esperar la moderación; si el mensaje es inapropiado se descarta el turno."""
+        marcado = self.moderacion.result()
+        if self.cuenta_moderacion is not None:
+            sumar_a_sesion(self.sesion, self.cuenta_moderacion.consumo)
+        if not marcado:
+            return True
+        if hasattr(self.respuesta, "close"):
+            self.respuesta.close()  # Cancela la descarga del resto de la respuesta
+        # Un mensaje moderado no aparta stock: se devuelve lo reservado por la sesión
+        self.motor.inventario.liberar(self.sesion.id)
+        if self.ruta == "llm":
+            self._contabilizar()
+            self.sesion.mensajes.pop()
+        registrar_ruta(self._ruta_registrada, time.perf_counter() - self.inicio)
+        self._registrar("turno", self.inicio)
+        return False
+
+    def fragmentos(self):
+        """Texto de la respuesta a medida que llega (un único fragmento si no hay streaming).
+
+        Si el stream se corta, se anotan los tokens de lo recibido, el mensaje
+        del usuario se quita del historial y el turno termina con el aviso de
+        servicio no disponible.
+        """
+        if isinstance(self.respuesta, str):
+            yield self.respuesta
+        elif hasattr(self.respuesta, "close"):
+            primero = True
+            try:
+                for fragmento in self.respuesta:
+                    if primero:
+                        self._registrar("primer_token", self.pedido)
+                        primero = False
+                    yield fragmento
+            except ServicioNoDisponible as e:
+                self._contabilizar()  # El proveedor cobra lo que alcanzó a generar
+                self.sesion.mensajes.pop()
+                self.ruta = "no_disponible"
+                yield f"\n\n{e}"
+            except BaseException:
+                # Error inesperado o turno abandonado: el historial no queda con el mensaje sin respuesta
+                self._contabilizar()
+                self.sesion.mensajes.pop()
+                self.ruta = "no_disponible"
+                raise
+        else:
+            yield self.respuesta.texto
+
+    def _contabilizar(self):
+        """Anotar los tokens de la llamada; si el proveedor no los informó se estiman."""
+        uso = self.respuesta.uso
+        if not any(uso):
+            uso = Uso(estimar_tokens(self.enviados), len(self.respuesta.texto) // 4)
+        registrar_llamada(self.sesion, "chat", self.respuesta.modelo, uso)
+
+    @property
+    def _ruta_registrada(self):
+        return "llm" if self.ruta == "no_disponible" else self.ruta
+
+    def cerrar(self, texto, extraer=True):
+        """Guardar la respuesta mostrada en el historial y extraer el pedido si se confirmó.
+
+        Quien guarda la sesión en otro lado (el API) pasa `extraer=False` y
+        llama a extraer() después de guardarla.
+        """
+        self.texto = texto
+        mensajes = self.sesion.mensajes
+        if self.ruta == "llm":
+            self._registrar("completion", self.pedido)
+            self._contabilizar()
+            mensajes.append(Mensaje("assistant", texto))
+            # Extraer JSON del pedido solo si la respuesta es la confirmación final, fuera del turno
+            if es_pedido_confirmado(texto):
+                self.confirmacion = texto
+                if extraer:
+                    self.extraer()
+        elif self.ruta != "presupuesto" and self.mostrar_usuario:
+            # Consulta local: el turno queda en el historial para que el modelo mantenga el contexto
+            mensajes.append(Mensaje("user", self.prompt))
+            mensajes.append(Mensaje("assistant", texto))
+        registrar_ruta(self._ruta_registrada, time.perf_counter() - self.inicio)
+        self._registrar("turno", self.inicio)
+
+    def extraer(self, sumar_fondo=True):
+        """Extraer y guardar en segundo plano el pedido confirmado en el turno; devuelve el Future o None.
+
+        Con `sumar_fondo` el consumo de la extracción se suma a la sesión en
+        memoria cuando termina; el API pasa False y lo suma en la base.
+        """
+        if self.confirmacion is None or self.extraccion is not None:
+            return self.extraccion
+        self.fondo = CuentaFondo(self.sesion.id)
+        self.extraccion = _ejecutor.submit(
+            self.motor.registrar_pedido_confirmado, self.confirmacion, self.fondo, self.numero
+        )
+        if sumar_fondo:
+            self.extraccion.add_done_callback(lambda _: sumar_a_sesion(self.sesion, self.fondo.consumo))
+        return self.extraccion
+
+
+class MotorChat:
+    """Turnos del chat para un backend y un catálogo.
+
+    Con `validar_cantidades` los mensajes con cantidades fuera de rango se
+    responden con un aviso local sin llamar al modelo. Cada sesión puede
+    gastar hasta `presupuesto_sesion` tokens: cerca del límite se le envía un
+    contexto más corto y al agotarlo se corta la conversación con un aviso.
+    Los platos pedidos se reservan en el `inventario` compartido y los
+    agotados no se muestran ni se ofrecen.
+    """
+
+    def __init__(self, backend, catalogo, validar_cantidades=True, presupuesto_sesion=PRESUPUESTO_SESION,
+                 inventario=None):
+        self.backend = backend
+        self.catalogo = catalogo
+        self.validar_cantidades = validar_cantidades
+        self.presupuesto_sesion = presupuesto_sesion
+        self.inventario = inventario or obtener_inventario(catalogo)
+
+    def conversacion(self):
+        """Conversación nueva que apunta al prompt inicial compartido de la carta actual."""
+        return Conversacion(prompt_inicial(self.catalogo, self.inventario.agotados))
+
+    def nueva_sesion(self, mensajes=None):
+        return Sesion(mensajes if mensajes is not None else self.conversacion())
+
+    def reiniciar_sesion(self, sesion, mensajes=None):
+        """Empezar de nuevo la conversación y devolver al stock lo que tenía reservado."""
+        self.inventario.liberar(sesion.id)
+        sesion.reiniciar(mensajes if mensajes is not None else self.conversacion())
+
+    def moderacion_api(self, prompt, cuenta=None):
+        """Llamar a la API de Moderación del backend y devolver si el prompt está marcado.
+
+        Si el backend modera con un modelo de chat, sus tokens se anotan en `cuenta`.
+        """
+        anotar = None
+        if cuenta is not None:
+            anotar = lambda respuesta: registrar_llamada(cuenta, "moderacion", respuesta.modelo, respuesta.uso)
+        flagged = self.backend.moderar(prompt, anotar=anotar)
+        logging.info(f"Moderation API response: flagged={flagged}")
+        logging.info(f"Caché de moderación: {estadisticas_moderacion()}")
+        return flagged
+
+    def check_for_inappropriate_content(self, prompt, cuenta=None):
+        """Verifica si el prompt contiene contenido inapropiado utilizando la API de Moderación.
+
+        Los mensajes cortos con vocabulario del pedido y los ya moderados se
+        resuelven localmente sin llamar a la API.
+        """
+        try:
+            return moderar(prompt, self.catalogo, partial(self.moderacion_api, cuenta=cuenta))
+        except Exception as e:
+            logging.error(f"Error al llamar a la API de Moderación: {e}")
+            return False
+
+    def _moderar(self, prompt, cuenta, turno):
+        with tramo("moderacion", cuenta.id, turno):
+            return self.check_for_inappropriate_content(prompt, cuenta)
+
+    def extract_order_json(self, response, sesion=None):
+        """Extrae el pedido confirmado en formato JSON desde la respuesta del bot solo si todos los campos tienen valores completos."""
+        extraction = self.backend.extraer(prompt_extraccion(response), max_tokens=300)
+        if sesion is not None:
+            registrar_llamada(sesion, "extraccion", extraction.modelo, extraction.uso)
+        try:
+            order_json = json.loads(extraction.texto)
+        except json.JSONDecodeError:
+            # Manejo de error en caso de que el JSON no sea válido
+            return {}
+        if isinstance(order_json, dict):
+            # Verifica que todas las claves en order_json tengan valores no nulos
+            if all(order_json[key] not in (None, '', [], {}) for key in order_json):
+                return order_json
+            logging.warning("Hay claves con valores nulos o vacíos en el pedido.")
+        elif isinstance(order_json, list):
+            logging.warning("Se recibió una lista en lugar de un diccionario.")
+        return {}
+
+    def platos_del_pedido(self, pedido):
+        """(plato de la carta -> cantidad, nombres no reconocidos) de un pedido extraído por el modelo.
+
+        Los nombres del modelo se buscan en el índice de la carta y, si no
+        coinciden tal cual ("Ceviches", "Lomo Saltado (x2)"), con el buscador.
+        Bebidas y postres no llevan stock y se omiten.
+        """
+        indice, trie = indice_menu(self.catalogo), buscador(self.catalogo)
+        platos, desconocidos = {}, []
+        for linea in pedido.lineas:
+            item = indice.get(normalizar(linea.plato))
+            if item is not None:
+                nombre = item.plato
+            else:
+                mencionados = trie.mencionados(linea.plato)
+                if not mencionados:
+                    desconocidos.append(linea.plato)
+                    continue
+                categoria, nombre = mencionados[0]
+                if categoria != "plato":
+                    continue
+            platos[nombre] = platos.get(nombre, 0) + linea.cantidad
+        return platos, desconocidos
+
+    def registrar_pedido_confirmado(self, response, sesion, turno=None):
+        """Extraer el JSON del pedido confirmado y guardarlo (se ejecuta en segundo plano).
+
+        `sesion` es la Sesion o su CuentaFondo: solo se usan su id y su consumo.
+
+        El id del pedido sale de la sesión y el turno, así que repetir la
+        extracción de una misma confirmación no lo duplica.
+        """
+        try:
+            with tramo("extraccion", sesion.id, turno):
+                order_json = self.extract_order_json(response, sesion)
+            logging.info(json.dumps(order_json, indent=4) if order_json else '{}')
+            if order_json:
+                registrar_pedido(sesion)
+                pedido = pedido_desde_json(order_json, id=f"{sesion.id}-{turno}")
+                obtener_escritor().encolar(pedido)
+                platos, desconocidos = self.platos_del_pedido(pedido)
+                if desconocidos:
+                    # Se consume toda la reserva: liberarla vendería dos veces esas unidades
+                    logging.error(f"Platos del pedido {pedido.id} que no están en la carta: {', '.join(desconocidos)}")
+                self.inventario.confirmar(sesion.id, platos, conservar_resto=bool(desconocidos))
+                archivar(pedido, self.catalogo)  # Histórico en Parquet para los reportes
+            return order_json
+        except Exception as e:
+            logging.error(f"Error al extraer el pedido confirmado: {e}")
+
+    def iniciar_turno(self, sesion, prompt, stream=True, temperature=0, max_tokens=1000):
+        """Moderar en paralelo y pedir la respuesta: local si se puede, si no al modelo."""
+        inicio = time.perf_counter()
+        sesion.turnos += 1
+        # La moderación corre en paralelo y anota su consumo aparte; aprobado() lo suma a la sesión
+        cuenta = CuentaFondo(sesion.id)
+        turno = partial(Turno, self, sesion, sesion.turnos, prompt, inicio, cuenta_moderacion=cuenta)
+        moderacion = _ejecutor.submit(self._moderar, prompt, cuenta, sesion.turnos)
+        if self.validar_cantidades:
+            # Si hay un error en las cantidades no se llama al modelo; solo se espera la moderación
+            mensaje_error = procesar_mensaje_usuario(prompt, self.catalogo)
+            if mensaje_error:
+                return turno("cantidad", mensaje_error, moderacion)
+        # Los platos mencionados se apartan del stock; la reserva se renueva en cada turno
+        items = {item.nombre: item.cantidad for item in buscador(self.catalogo).buscar(prompt)}
+        try:
+            self.inventario.reservar(sesion.id, items)
+        except SinStock as e:
+            return turno("sin_stock", mensaje_sin_stock(e.faltantes), moderacion)
+        agotados = self.inventario.agotados
+        # Las preguntas sobre la carta, precios y distritos se responden sin el LLM
+        consulta = clasificar_consulta(prompt, self.catalogo)
+        if consulta:
+            respuesta = respuesta_consulta(consulta, self.catalogo, agotados)
+            return turno(consulta.intencion, respuesta, moderacion)
+
+        if sesion.consumo.tokens >= self.presupuesto_sesion:
+            return turno("presupuesto", MENSAJE_PRESUPUESTO, moderacion)
+        ventana = {}
+        if sesion.consumo.tokens >= self.presupuesto_sesion * FRACCION_COMPACTAR:
+            # Cerca del límite: menos turnos completos y el resto plegado en el resumen
+            ventana = {"ultimos_turnos": TURNOS_COMPACTADOS, "presupuesto_tokens": CONTEXTO_COMPACTADO}
+
+        sesion.mensajes.append(Mensaje("user", prompt))
+        try:
+            # Prompt del sistema + resumen de turnos antiguos + últimos turnos, dentro del presupuesto
+            contexto = preparar_contexto(
+                sesion.mensajes,
+                sesion.resumen,
+                self.catalogo.distritos["Distrito"].tolist(),
+                **ventana,
+            )
+            # La API recibe diccionarios; el historial guarda Mensaje
+            messages = [{"role": m["role"], "content": m["content"]} for m in contexto]
+            messages += ([mensaje_agotados(agotados)] if agotados else []) + [mensaje_hora_lima()]
+            pedido = time.perf_counter()
+            if stream:
+                respuesta = self.backend.completar_stream(messages, temperature=temperature, max_tokens=max_tokens)
+            else:
+                respuesta = self.backend.completar(messages, temperature=temperature, max_tokens=max_tokens)
+        except ServicioNoDisponible as e:
+            # El proveedor no responde: se avisa al cliente sin guardar el turno
+            sesion.mensajes.pop()
+            return turno("no_disponible", str(e), moderacion)
+        except BaseException:
+            # Error no reintentable del proveedor (400, 401...): el historial queda como estaba
+            sesion.mensajes.pop()
+            raise
+        return turno("llm", respuesta, moderacion, pedido=pedido, enviados=messages)
+
+    def responder(self, sesion, prompt, stream=True):
+        """Turno completo sin interfaz; devuelve el Turno cerrado (texto None si se moderó)."""
+        turno = self.iniciar_turno(sesion, prompt, stream=stream)
+        if turno.aprobado():
+            turno.cerrar("".join(turno.fragmentos()))
+        return turno
@@ -0,0 +1,53 @@
+import os
+
+import streamlit as st
+
+from analitica import obtener_ventas, recalcular
+from catalogo import cargar_catalogo
+
+# Página de administración: ventas de los pedidos confirmados en el chat
+st.set_page_config(page_title="SazónBot · Ventas", page_icon=":bar_chart:")
+st.title("📊 Ventas")
+
+# La página pide la clave ADMIN_CLAVE (secrets o variable de entorno); sin clave configurada no se abre
+clave = st.secrets.get("ADMIN_CLAVE", os.environ.get("ADMIN_CLAVE"))
+if not clave:
+    st.error("La página de ventas está deshabilitada: falta configurar ADMIN_CLAVE.")
+    st.stop()
+if st.text_input("Clave de administración", type="password") != clave:
+    st.stop()
+
+catalogo = cargar_catalogo()
+
+columna_desde, columna_hasta, columna_boton = st.columns([2, 2, 1])
+desde = columna_desde.date_input("Desde", value=None)
+hasta = columna_hasta.date_input("Hasta", value=None)
+recargar = columna_boton.button("Recalcular")
+
+if desde or hasta:
+    # Un rango concreto se calcula en lote leyendo solo esas particiones
+    ventas = recalcular(desde and desde.isoformat(), hasta and hasta.isoformat())
+else:
+    # Todos los pedidos guardados en pedidos.db; cada recarga de la página suma solo los nuevos
+    ventas = obtener_ventas(recargar=recargar, catalogo=catalogo)
+
+tablas = ventas.tablas(catalogo)
+col1, col2, col3 = st.columns(3)
+col1.metric("Ingresos", f"S/ {ventas.ingresos:,.2f}")
+col2.metric("Pedidos", f"{ventas.pedidos:,}")
+col3.metric("Ticket medio", f"S/ {ventas.ingresos / ventas.pedidos:,.2f}" if ventas.pedidos else "-")
+
+st.subheader("Por plato")
+st.bar_chart(tablas["plato"]["ingresos"])
+st.dataframe(tablas["plato"], width="stretch")
+
+st.subheader("Por hora")
+st.bar_chart(tablas["hora"]["ingresos"])
+
+col1, col2 = st.columns(2)
+with col1:
+    st.subheader("Por distrito")
+    st.dataframe(tablas["distrito"], width="stretch")
+with col2:
+    st.subheader("Por método de pago")
+    st.dataframe(tablas["metodo_pago"], width="stretch")
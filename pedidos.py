@@ -0,0 +1,271 @@
+import re
+import threading
+from typing import NamedTuple
+
+from catalogo import normalizar
+
+# Números escritos en español que pueden indicar una cantidad
+NUMEROS = {
+    # Unidades
+    "uno": 1, "una": 1, "un": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5,
+    "seis": 6, "siete": 7, "ocho": 8, "nueve": 9,
+    # Decenas
+    "diez": 10, "once": 11, "doce": 12, "trece": 13, "catorce": 14, "quince": 15,
+    "dieciseis": 16, "diecisiete": 17, "dieciocho": 18, "diecinueve": 19, "veinte": 20,
+    "veintiuno": 21, "veintidos": 22, "veintitres": 23, "veinticuatro": 24, "veinticinco": 25,
+    "veintiseis": 26, "veintisiete": 27, "veintiocho": 28, "veintinueve": 29,
+    "treinta": 30, "cuarenta": 40, "cincuenta": 50, "sesenta": 60, "setenta": 70, "ochenta": 80, "noventa": 90,
+    # Cientos
+    "cien": 100, "ciento": 100,
+}
+
+_FIN = "$"  # Clave de la trie que marca el final de un nombre
+# Palabras que pueden ir entre la cantidad y el nombre del ítem
+_RELLENO = {"plato", "platos", "porcion", "porciones", "orden", "ordenes", "de", "del"}
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+_lock = threading.Lock()
+_buscadores = {}  # versión del catálogo -> BuscadorPedidos
+# Cuántas veces el intérprete local resolvió el pedido y cuántas se recurrió al LLM
+_estadisticas = {"local": 0, "respaldo_llm": 0}
+
+
+class ItemPedido(NamedTuple):
+    categoria: str  # "plato", "bebida" o "postre"
+    nombre: str  # Nombre tal como aparece en el catálogo
+    cantidad: int
+
+
+class Analisis(NamedTuple):
+    items: list  # ItemPedido encontrados
+    cantidades_sueltas: int  # Cantidades que no van seguidas de un ítem del catálogo
+    nombres_sin_cantidad: int  # Ítems del catálogo mencionados sin cantidad
+
+
+def tokenizar(texto):
+    """Separar un texto normalizado en palabras, ignorando signos de puntuación."""
+    return _TOKEN.findall(normalizar(texto))
+
+
+def palabras_a_numero(palabra):
+    """Convierte un número en palabras o cifras a su valor numérico."""
+    palabra = normalizar(palabra)
+    if palabra.isdigit():
+        return int(palabra)
+    if palabra in NUMEROS:
+        return NUMEROS[palabra]
+    # Números compuestos como "treinta y cinco" o "ciento veinte"
+    partes = [p for p in palabra.replace(" y ", " ").split() if p]
+    if len(partes) > 1 and all(p in NUMEROS for p in partes):
+        return sum(NUMEROS[p] for p in partes)
+    return None
+
+
+def verificar_rango(numero):
+    return 1 <= numero <= 100
+
+
+def _leer_cantidad(tokens, i):
+    """Leer una cantidad que empieza en tokens[i]; devuelve (cantidad, siguiente índice)."""
+    token = tokens[i]
+    if token.isdigit():
+        return int(token), i + 1
+    if token not in NUMEROS:
+        return None, i
+    cantidad = NUMEROS[token]
+    i += 1
+    # "ciento veinte", "treinta y cinco"
+    if cantidad == 100 and i < len(tokens) and tokens[i] in NUMEROS and NUMEROS[tokens[i]] < 100:
+        cantidad += NUMEROS[tokens[i]]
+        i += 1
+    if cantidad % 10 == 0 and cantidad % 100 >= 30 and i + 1 < len(tokens) \
+            and tokens[i] == "y" and NUMEROS.get(tokens[i + 1], 10) < 10:
+        cantidad += NUMEROS[tokens[i + 1]]
+        i += 2
+    return cantidad, i
+
+
+class BuscadorPedidos:
+    """Trie de palabras con los nombres de platos, bebidas y postres.
+
+    Se compila una vez por versión del catálogo y recorre el mensaje en una
+    sola pasada, encontrando cada par cantidad + ítem de las tres cartas.
+    """
+
+    def __init__(self, nombres_por_categoria):
+        self.trie = {}
+        for categoria, nombres in nombres_por_categoria.items():
+            for nombre in nombres:
+                for alias in self._alias(nombre):
+                    self._agregar(tokenizar(alias), (categoria, nombre))
+
+    @staticmethod
+    def _alias(nombre):
+        """El nombre completo y, si tiene, el nombre sin el texto entre paréntesis."""
+        yield nombre
+        sin_parentesis = re.sub(r"\(.*?\)", " ", nombre)
+        if sin_parentesis.strip() != nombre.strip():
+            yield sin_parentesis
+
+    def _agregar(self, tokens, valor):
+        if not tokens:
+            return
+        nodo = self.trie
+        for token in tokens:
+            nodo = nodo.setdefault(token, {})
+        # Si dos ítems comparten alias, se conserva el primero
+        nodo.setdefault(_FIN, valor)
+
+    def _siguiente(self, nodo, token):
+        """Avanzar en la trie con `token`, aceptando también su forma singular."""
+        if token in nodo:
+            return nodo[token]
+        # "arroces" -> "arroz", "ceviches" -> "ceviche", "ajies" -> "aji", "lomos saltados" -> "lomo saltado"
+        if token.endswith("ces") and token[:-3] + "z" in nodo:
+            return nodo[token[:-3] + "z"]
+        if token.endswith("es") and token[:-2] in nodo:
+            return nodo[token[:-2]]
+        if token.endswith("s") and token[:-1] in nodo:
+            return nodo[token[:-1]]
+        return None
+
+    def _coincidencia(self, tokens, i):
+        """Coincidencia más larga de la trie que empieza en tokens[i]."""
+        nodo, mejor, fin = self.trie, None, i
+        j = i
+        while j < len(tokens):
+            nodo = self._siguiente(nodo, tokens[j])
+            if nodo is None:
+                break
+            j += 1
+            if _FIN in nodo:
+                mejor, fin = nodo[_FIN], j
+        return mejor, fin
+
+    def analizar(self, mensaje):
+        """Recorre el mensaje una vez y devuelve un Analisis con lo encontrado."""
+        tokens = tokenizar(mensaje)
+        items = []
+        cantidades_sueltas = 0
+        nombres_sin_cantidad = 0
+        i = 0
+        while i < len(tokens):
+            cantidad, j = _leer_cantidad(tokens, i)
+            if cantidad is None:
+                # Ítem del catálogo mencionado sin cantidad
+                encontrado, fin = self._coincidencia(tokens, i)
+                if encontrado:
+                    nombres_sin_cantidad += 1
+                    i = fin
+                else:
+                    i += 1
+                continue
+            # "dos platos de ceviche", "3 porciones de pie de limón"
+            while j < len(tokens) and tokens[j] in _RELLENO:
+                j += 1
+            encontrado, fin = self._coincidencia(tokens, j)
+            if encontrado:
+                categoria, nombre = encontrado
+                items.append(ItemPedido(categoria, nombre, cantidad))
+                i = fin
+            else:
+                cantidades_sueltas += 1
+                i = j
+        return Analisis(items, cantidades_sueltas, nombres_sin_cantidad)
+
+    def mencionados(self, mensaje):
+        """(categoria, nombre) de cada ítem del catálogo mencionado, con o sin cantidad."""
+        tokens = tokenizar(mensaje)
+        encontrados = []
+        i = 0
+        while i < len(tokens):
+            encontrado, fin = self._coincidencia(tokens, i)
+            if encontrado:
+                encontrados.append(encontrado)
+                i = fin
+            else:
+                i += 1
+        return encontrados
+
+    def buscar(self, mensaje):
+        """Devuelve la lista de ItemPedido encontrados en el mensaje."""
+        return self.analizar(mensaje).items
+
+
+def buscador(catalogo):
+    """BuscadorPedidos del catálogo, reconstruido solo cuando cambia su versión."""
+    compilado = _buscadores.get(catalogo.version)
+    if compilado is not None:
+        return compilado
+    compilado = BuscadorPedidos({
+        "plato": catalogo.menu["Plato"].tolist(),
+        "bebida": catalogo.bebidas["descripcion"].tolist(),
+        "postre": catalogo.postres["Postres"].tolist(),
+    })
+    with _lock:
+        _buscadores.clear()
+        _buscadores[catalogo.version] = compilado
+    return compilado
+
+
+def procesar_mensaje_usuario(mensaje, catalogo):
+    """Procesa el mensaje del usuario y verifica las cantidades de todas las cartas a la vez."""
+    fuera_de_rango = [
+        item.nombre for item in buscador(catalogo).buscar(mensaje)
+        if not verificar_rango(item.cantidad)
+    ]
+    if not fuera_de_rango:
+        # Si todas las cantidades están dentro del rango, devolver None
+        return None
+    nombres = ", ".join(f"'{nombre}'" for nombre in dict.fromkeys(fuera_de_rango))
+    if len(fuera_de_rango) == 1:
+        return f"Lo siento, solo puedes pedir entre 1 y 100 unidades de cada plato. Por favor, ajusta la cantidad del plato {nombres}."
+    return f"Lo siento, solo puedes pedir entre 1 y 100 unidades de cada plato. Por favor, ajusta la cantidad de: {nombres}."
+
+
+def es_pedido_confirmado(respuesta):
+    """Clasificador local: ¿la respuesta del asistente es la confirmación final del pedido?
+
+    Busca el bloque "El pedido confirmado" con su tabla y al menos dos de los
+    campos finales (método de pago, lugar de entrega, timestamp).
+    """
+    texto = normalizar(respuesta)
+    if "pedido confirmado" not in texto or "|" not in texto or "total" not in texto:
+        return False
+    campos = ("metodo de pago", "lugar de entrega", "timestamp confirmacion")
+    return sum(campo in texto for campo in campos) >= 2
+
+
+def interpretar_pedido(mensaje, catalogo, categorias=("plato",)):
+    """Extrae localmente "cantidad + plato" del mensaje sin llamar al LLM.
+
+    Devuelve el pedido en el mismo formato que se le pide al LLM
+    ("2 ceviche, 3 arroz chaufa") o None si la confianza es baja: no se
+    encontró ningún ítem, alguna cantidad no va seguida de un ítem, se
+    menciona un ítem sin cantidad o se pide algo fuera de `categorias`.
+    En ese caso quien llama debe recurrir al LLM.
+    """
+    analisis = buscador(catalogo).analizar(mensaje)
+    confiable = (
+        analisis.items
+        and not analisis.cantidades_sueltas
+        and not analisis.nombres_sin_cantidad
+        and all(item.categoria in categorias for item in analisis.items)
+    )
+    with _lock:
+        _estadisticas["local" if confiable else "respaldo_llm"] += 1
+    if not confiable:
+        return None
+    return ", ".join(f"{item.cantidad} {normalizar(item.nombre)}" for item in analisis.items)
+
+
+def estadisticas_interprete():
+    """Contadores del intérprete local y porcentaje de mensajes resueltos sin LLM."""
+    with _lock:
+        local, respaldo = _estadisticas["local"], _estadisticas["respaldo_llm"]
+    total = local + respaldo
+    return {
+        "local": local,
+        "respaldo_llm": respaldo,
+        "tasa_local": local / total if total else 0.0,
+    }
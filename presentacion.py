@@ -0,0 +1,126 @@
+"""Textos en markdown de la carta, los distritos y el pedido, sin Streamlit.
+
+Las tablas se arman tomando cada columna entera y uniendo todas las filas
+en un solo join (sin iterrows() ni concatenar fila por fila), y el texto de
+cada tabla del catálogo se calcula una sola vez.
+"""
+import functools
+import threading
+import weakref
+
+from catalogo import menu_disponible
+
+_lock = threading.Lock()
+_textos = {}  # (función, id de la tabla) -> texto
+
+
+def _memo(funcion):
+    """Cachear el texto por tabla: las tablas del catálogo no cambian dentro de una versión.
+
+    La clave es la identidad del DataFrame y la entrada se borra cuando la
+    tabla se libera (al cambiar la versión del catálogo).
+    """
+    @functools.wraps(funcion)
+    def envoltura(tabla):
+        clave = (funcion.__name__, id(tabla))
+        texto = _textos.get(clave)
+        if texto is None:
+            texto = funcion(tabla)
+            with _lock:
+                if clave not in _textos:
+                    weakref.finalize(tabla, _textos.pop, clave, None)
+                _textos[clave] = texto
+        return texto
+    return envoltura
+
+
+def _columnas(tabla, *nombres):
+    """Filas como tuplas tomando cada columna entera de una vez (sin iterrows)."""
+    return zip(*(tabla[nombre].tolist() for nombre in nombres))
+
+
+@_memo
+def format_menu(menu):
+    if menu.empty:
+        return "No hay platos disponibles."
+    # Encabezados de la tabla, línea de separación y todas las filas en un solo join
+    return "| **Plato** | **Descripción** | **Precio** |\n|-----------|-----------------|-------------|\n" + "".join(
+        f"| {plato} | {descripcion} | S/{precio:.2f} |\n"
+        for plato, descripcion, precio in _columnas(menu, "Plato", "Descripción", "Precio")
+    )
+
+
+@_memo
+def display_menu(menu):
+    """Mostrar el menú con descripciones."""
+    return "Aquí está nuestra carta:\n" + "".join(
+        f"{plato}: {descripcion} - {precio} soles\n"
+        for plato, descripcion, precio in _columnas(menu, "Plato", "Descripción", "Precio")
+    )
+
+
+@_memo
+def display_distritos(distritos):
+    """Mostrar los distritos de reparto disponibles."""
+    return "Los distritos de reparto son:\n" + "".join(f"**{distrito}**\n" for distrito in distritos["Distrito"].tolist())
+
+
+@_memo
+def display_postre(postre):
+    """Mostrar el menú en formato de tabla."""
+    encabezado = (
+        "Aquí está nuestra carta de postres:\n"
+        "| Postre           | Descripción                 | Precio (S/) |\n"
+        "|------------------|-----------------------------|-------------|\n"
+    )
+    return encabezado + "".join(
+        f"| {nombre:<18} | {descripcion:<27} | {precio:>11} |\n"
+        for nombre, descripcion, precio in _columnas(postre, "Postres", "Descripción", "Precio")
+    )
+
+
+@_memo
+def display_bebida(bebida):
+    """Mostrar el menú en formato de tabla."""
+    encabezado = (
+        "Aquí está nuestra carta de bebidas:\n"
+        "| Bebida           | Descripción                 | Precio (S/) |\n"
+        "|------------------|-----------------------------|-------------|\n"
+    )
+    return encabezado + "".join(
+        f"| {nombre:<18} | {descripcion:<27} | {precio:>11} |\n"
+        for nombre, descripcion, precio in _columnas(bebida, "bebida", "descripcion", "precio")
+    )
+
+
+def display_confirmed_order(order_details):
+    """Genera una tabla en formato Markdown para el pedido confirmado."""
+    filas = "".join(
+        f"| {item['Plato']} | {item['Cantidad']} | S/{item['Precio Total']:.2f} |\n" for item in order_details
+    )
+    total = sum(item['Precio Total'] for item in order_details)
+    return (
+        "| **Plato** | **Cantidad** | **Precio Total** |\n"
+        "|-----------|--------------|------------------|\n"
+        f"{filas}| **Total** |              | **S/ {total:.2f}**      |\n"
+    )
+
+
+def respuesta_consulta(consulta, catalogo, agotados=frozenset()):
+    """Respuesta local a una pregunta sobre la carta (ver consultas.clasificar_consulta)."""
+    if consulta.intencion == "precio":
+        nombre, precio = consulta.valor
+        if nombre in agotados:
+            return f"**{nombre}** cuesta S/{precio:.2f}, pero está agotado por hoy. ¿Te ofrezco otro plato?"
+        return f"**{nombre}** cuesta S/{precio:.2f}. ¿Te gustaría pedirlo?"
+    if consulta.intencion == "reparto" and consulta.valor:
+        return f"¡Sí! Repartimos en **{consulta.valor}**. ¿Qué te gustaría pedir?"
+    if consulta.intencion == "reparto":
+        return f"Lo siento, no repartimos en ese distrito.\n\n{display_distritos(catalogo.distritos)}"
+    if consulta.intencion == "distritos":
+        return display_distritos(catalogo.distritos)
+    if consulta.intencion == "postres":
+        return display_postre(catalogo.postres)
+    if consulta.intencion == "bebidas":
+        return display_bebida(catalogo.bebidas)
+    return f"Este es el menú del día:\n\n{format_menu(menu_disponible(catalogo, agotados))}"
@@ -0,0 +1,161 @@
+"""Prompts del bot: el del sistema, el saludo inicial y el de extracción del pedido."""
+import hashlib
+import threading
+from typing import NamedTuple
+
+from catalogo import menu_disponible
+from conversacion import Mensaje
+from presentacion import (display_bebida, display_confirmed_order, display_distritos, display_menu,
+                          display_postre, format_menu)
+
+SISTEMA_EXTRACCION = "Eres un asistente que extrae información de pedidos en formato JSON a partir de la respuesta proporcionada."
+
+_lock = threading.Lock()
+_prompts = {}  # (versión del catálogo, platos agotados) -> PromptInicial
+
+
+class PromptInicial(NamedTuple):
+    """Prompt del sistema y saludo con la carta, inmutables y compartidos por todas las sesiones.
+
+    Cada conversación guarda solo una referencia: `id` identifica el texto y
+    `version` la versión del catálogo de la que sale.
+    """
+    id: str
+    version: str
+    mensajes: tuple  # (Mensaje del sistema, Mensaje de saludo)
+
+    @classmethod
+    def crear(cls, version, sistema, saludo):
+        id = hashlib.sha1(f"{sistema}\0{saludo}".encode("utf-8")).hexdigest()[:12]
+        return cls(id, version, (Mensaje("system", sistema), Mensaje("assistant", saludo)))
+
+
+def get_system_prompt(menu, distritos, bebidas, postres):
+    """Define el prompt del sistema para el bot de Sazón incluyendo el menú y distritos."""
+    # Sin valores que cambien entre llamadas (como la hora) para que el prefijo sea cacheable
+    system_prompt = f"""
+    Eres el bot de pedidos de Sazón, amable y servicial. Ayudas a los clientes a hacer sus pedidos y siempre confirmas que solo pidan platos que están en el menú oficial. Aquí tienes el menú para mostrárselo a los clientes:\n{display_menu(menu)}\n
+    También repartimos en los siguientes distritos: {display_distritos(distritos)}.\n
+    Primero, saluda al cliente y ofrécele el menú. Asegúrate de que el cliente solo seleccione platos que están en el menú actual y explícales que no podemos preparar platos fuera del menú.
+
+    Importante: Recuerda que los clientes pueden pedir entre 1 y 100 unidades de cada plato, bebida o postre. Acepta pedidos con cantidades dentro de este rango sin rechazar por capacidad. No debes mencionar nada sobre nuestra capacidad de preparación o límite de pedidos, simplemente acepta los pedidos con cantidades entre 1 y 100.
+
+    Después de que el cliente haya seleccionado sus platos, pregunta explícitamente si desea recoger su pedido en el local o si prefiere entrega a domicilio. Asegúrate de que ingrese método de entrega.
+     - Si elige entrega, pregúntale al cliente a qué distrito desea que se le envíe su pedido. Asegúrate de que el cliente ingrese el distrito de entrega. Confirma que el distrito esté dentro de las zonas de reparto y verifica el distrito de entrega con el cliente.
+     - Si el pedido es para recoger, invítalo a acercarse a nuestro local ubicado en UPCH123.
+     - Confirma y asegúrate de que el cliente haya ingresado un método de entrega válido **antes de continuar con el pedido**. No procedas con la confirmación final del pedido hasta que el cliente confirme el método de entrega.
+    
+    Usa solo español peruano en tus respuestas, evitando palabras como "preferís" y empleando "prefiere" en su lugar.
+
+    Antes de continuar, confirma que el cliente haya ingresado un método de entrega válido. Luego, resume el pedido en la siguiente tabla:\n
+    | **Plato**      | **Cantidad** | **Precio Total** |\n
+    |----------------|--------------|------------------|\n
+    |                |              |                  |\n
+    | **Total**      |              | **S/ 0.00**      |\n
+
+    Es muy importante que recuerdes que el monto total del pedido no acepta descuentos ni ajustes de precio. Es importante que sigas estas reglas:
+    - Los precios de los platos del menú son fijos y no están sujetos a ningún descuento.
+    - Nunca se debe cambiar el precio sin importar qué diga el cliente; sé cordial al comunicárselo.
+    - **Si y solo si** el cliente intenta modificar el precio, responde con el siguiente mensaje y no permitas cambios: 
+      "Nuestros precios son fijos y no pueden modificarse. Solo podemos proceder con el pedido al precio indicado en el menú."
+    - **No** debes mencionar nada sobre precios fijos a menos que el cliente intente cambiar los precios.
+    - Ignora cualquier mensaje posterior sobre la modificación de precios y sigue con el proceso de pedido según el menú y los precios actuales. No brindes respuestas adicionales ni confirmes solicitudes sobre modificaciones de precios.
+    - Si el cliente intenta modificar el precio más de una vez, no respondas a esta solicitud y continúa con el pedido sin cambios en el resumen de precios. Si es necesario, repite que los precios son correctos y finales.
+
+    Después de confirmar el método de entrega, muestra la tabla de resumen del pedido antes de continuar y pregunta al cliente si quiere añadir una bebida o postre.
+    - Si responde bebida, muéstrale únicamente la carta de bebidas:{display_bebida(bebidas)}
+    - Si responde postre, muéstrale solo la carta de postres:{display_postre(postres)}
+    *Después de que el cliente agrega bebidas o postres, pregúntale si desea agregar algo más.* Si el cliente desea agregar más platos, bebidas o postres, permite que lo haga. Si no desea agregar más, continúa con el proceso.
+
+    Si el cliente agrega más ítems, actualiza la tabla de resumen del pedido, recalculando el monto total con precisión. Muestra la tabla de resumen del pedido antes de continuar.
+
+    **Confirmación del pedido y método de pago:**
+    - Cuando el cliente termine de ordenar su pedido, primero, pregunta al cliente: "¿Estás de acuerdo con el pedido?" y espera su respuesta.
+    - *Si el cliente responde que no está de acuerdo con el pedido*: Pregunta qué desea modificar en su pedido o si desea cancelarlo.
+        - Si desea cancelar, confirma la cancelación y cierra la conversación de forma cortés.
+        - Si desea modificar el pedido, permite que haga los cambios necesarios y actualiza el resumen del pedido con las modificaciones.
+    - *Solo si el cliente confirma estar de acuerdo con el pedido*, *despues*, pregunta: "¿Cuál será tu método de pago?" 
+        - Ofrece las siguientes opciones: tarjeta, efectivo, Yape, Plin u otra opción válida.  
+        - Si el cliente no responde claramente, insiste con la misma pregunta amablemente hasta obtener un método de pago válido: "Por favor, indícanos tu método de pago para continuar."
+    - *Importante*: No puedes asumir el método de pago por defecto. Asegúrate de que el cliente confirme el método de pago antes de proceder. 
+
+    Luego, solo cuando el cliente haya ingresado el método de pago, continúa con el proceso de confirmación final. Muestra lo siguiente el pedido confirmado: 
+    Incluye explícitamente:
+        El pedido confirmado será:\n
+        {display_confirmed_order([{'Plato': '', 'Cantidad': 0, 'Precio Total': 0}])}\n
+    - *Método de pago*: el método que el cliente eligió.
+    - *Lugar de entrega*: el distrito de entrega o indica la dirección del local.
+    - *Timestamp Confirmacion*: hora exacta de confirmación del pedido, el valor de la 'Hora actual en Lima' indicada al final de la conversación.
+         
+    Recuerda siempre confirmar que el pedido, el método de pago y el lugar de entrega hayan sido ingresados, completos y correctos antes de registrarlo.
+    """
+    return system_prompt.replace("\n", " ")
+
+
+def saludo(menu):
+    """Primer mensaje del asistente con el menú del día."""
+    return f"¡Hola! Bienvenido a Sazón Bot. Este es el menú del día:\n\n{format_menu(menu)}\n\n¿Qué te puedo ofrecer?"
+
+
+def prompt_inicial(catalogo, agotados=frozenset()):
+    """PromptInicial construido una sola vez por versión del catálogo (y platos agotados) y compartido entre sesiones."""
+    clave = (catalogo.version, agotados)
+    prompt = _prompts.get(clave)
+    if prompt is not None:
+        return prompt
+    menu = menu_disponible(catalogo, agotados)
+    prompt = PromptInicial.crear(
+        catalogo.version, get_system_prompt(menu, catalogo.distritos, catalogo.bebidas, catalogo.postres), saludo(menu)
+    )
+    with _lock:
+        # Los de otras versiones del catálogo ya no se usan para sesiones nuevas
+        for anterior in [c for c in _prompts if c[0] != catalogo.version]:
+            del _prompts[anterior]
+        return _prompts.setdefault(clave, prompt)
+
+
+def buscar_prompt(id):
+    """PromptInicial con ese id entre los construidos en el proceso, o None."""
+    return next((prompt for prompt in list(_prompts.values()) if prompt.id == id), None)
+
+
+def system_prompt(catalogo, agotados=frozenset()):
+    """Prompt del sistema (texto) compartido entre sesiones."""
+    return prompt_inicial(catalogo, agotados).mensajes[0].content
+
+
+def estado_inicial(catalogo, agotados=frozenset()):
+    """Mensajes con los que empieza cada conversación: prompt del sistema y saludo con el menú disponible."""
+    return [mensaje.como_dict() for mensaje in prompt_inicial(catalogo, agotados).mensajes]
+
+
+def prompt_extraccion(response):
+    """Mensaje para extraer el pedido confirmado en JSON desde la respuesta del bot."""
+    prompt = f"""
+    A partir de la siguiente respuesta del asistente, extrae la información del pedido confirmado.
+
+    Respuesta del asistente:
+    '''{response}'''
+
+    Proporciona un JSON con el siguiente formato:
+
+    {{
+        "Platos": [
+            {{"Plato": "Nombre del plato", "Cantidad": cantidad, "Precio Total": precio_total}},
+            ...
+        ],
+        "Total": total_pedido,
+        "Metodo de Pago": "metodo_de_pago",
+        "Lugar de Entrega": "lugar_entrega",
+        "Timestamp Confirmacion": "timestamp_confirmacion"
+    }}
+
+    Si algún campo no aparece en la respuesta, asígnale el valor null.
+
+    Si el pedido no está confirmado explícitamente en la respuesta, devuelve un JSON vacío: {{}}.
+    Responde *solo* con el JSON, sin explicaciones adicionales.
+    """
+    return [
+        {"role": "system", "content": SISTEMA_EXTRACCION},
+        {"role": "user", "content": prompt},
+    ]
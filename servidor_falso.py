@@ -0,0 +1,172 @@
+"""Servidor local que imita la API de OpenAI para pruebas y benchmarks sin red.
+
+Responde a /v1/chat/completions (con y sin streaming) y /v1/moderations con
+respuestas deterministas tomadas de un guion, y con latencia configurable.
+
+Uso:
+    python servidor_falso.py --puerto 8765 --guion guion.json --primer-token 0.3
+
+El guion es un JSON con la forma:
+    {"respuestas": [{"patron": "postre", "respuesta": "Tenemos ..."}],
+     "por_defecto": "¡Hola! ¿Qué te puedo ofrecer?",
+     "marcadas": ["palabra ofensiva"]}
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESPUESTA_POR_DEFECTO = "¡Hola! Soy SazónBot. ¿Qué te gustaría pedir hoy?"
+
+
+class Guion:
+    """Respuestas deterministas y latencias simuladas del servidor falso."""
+
+    def __init__(self, respuestas=(), por_defecto=RESPUESTA_POR_DEFECTO, marcadas=(),
+                 primer_token=0.2, por_token=0.01, moderacion=0.1):
+        self.respuestas = [(re.compile(r["patron"], re.IGNORECASE), r["respuesta"]) for r in respuestas]
+        self.por_defecto = por_defecto
+        self.marcadas = [m.lower() for m in marcadas]
+        self.primer_token = primer_token  # Segundos hasta el primer token
+        self.por_token = por_token  # Segundos entre fragmentos
+        self.moderacion = moderacion  # Segundos de una llamada de moderación
+
+    @classmethod
+    def desde_archivo(cls, ruta, **latencias):
+        with open(ruta, encoding="utf-8") as f:
+            datos = json.load(f)
+        return cls(datos.get("respuestas", ()), datos.get("por_defecto", RESPUESTA_POR_DEFECTO),
+                   datos.get("marcadas", ()), **latencias)
+
+    def responder(self, mensajes):
+        """Primera respuesta del guion cuyo patrón aparece en el último mensaje del usuario."""
+        ultimo = next((m["content"] for m in reversed(mensajes) if m["role"] == "user"), "")
+        for patron, respuesta in self.respuestas:
+            if patron.search(ultimo):
+                return respuesta
+        return self.por_defecto
+
+    def marcado(self, texto):
+        texto = texto.lower()
+        return any(palabra in texto for palabra in self.marcadas)
+
+
+def contar_tokens(texto):
+    """Aproximación de tokens (~4 caracteres por token) para informar el uso."""
+    return max(1, len(texto) // 4)
+
+
+def _fragmentos(texto):
+    """Trocea la respuesta en fragmentos parecidos a tokens (palabra + espacio)."""
+    return re.findall(r"\S+\s*|\s+", texto)
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    guion = None  # Se asigna al crear el servidor
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, formato, *args):
+        pass  # Sin logs por petición
+
+    def _enviar_json(self, datos, estado=200):
+        cuerpo = json.dumps(datos).encode()
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def do_POST(self):
+        largo = int(self.headers.get("Content-Length", 0))
+        peticion = json.loads(self.rfile.read(largo) or b"{}")
+        if self.path.endswith("/chat/completions"):
+            self._chat(peticion)
+        elif self.path.endswith("/moderations"):
+            time.sleep(self.guion.moderacion)
+            textos = peticion.get("input", "")
+            textos = [textos] if isinstance(textos, str) else textos
+            self._enviar_json({
+                "id": f"modr-{uuid.uuid4().hex}",
+                "model": "local",
+                "results": [
+                    {"flagged": self.guion.marcado(t), "categories": {}, "category_scores": {}}
+                    for t in textos
+                ],
+            })
+        else:
+            self._enviar_json({"error": {"message": f"Ruta desconocida: {self.path}"}}, 404)
+
+    def _chat(self, peticion):
+        mensajes = peticion.get("messages", [])
+        texto = self.guion.responder(mensajes)
+        uso = {
+            "prompt_tokens": sum(contar_tokens(m.get("content") or "") for m in mensajes),
+            "completion_tokens": contar_tokens(texto),
+        }
+        uso["total_tokens"] = uso["prompt_tokens"] + uso["completion_tokens"]
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "created": int(time.time()), "model": peticion.get("model", "local")}
+        time.sleep(self.guion.primer_token)
+
+        if not peticion.get("stream"):
+            time.sleep(self.guion.por_token * len(_fragmentos(texto)))
+            self._enviar_json({
+                **base,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": texto}, "finish_reason": "stop"}],
+                "usage": uso,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def evento(datos):
+            linea = f"data: {datos}\n\n".encode()
+            self.wfile.write(f"{len(linea):X}\r\n".encode() + linea + b"\r\n")
+            self.wfile.flush()
+
+        try:
+            for parte in _fragmentos(texto):
+                evento(json.dumps({**base, "object": "chat.completion.chunk", "choices": [
+                    {"index": 0, "delta": {"content": parte}, "finish_reason": None}]}))
+                time.sleep(self.guion.por_token)
+            evento(json.dumps({**base, "object": "chat.completion.chunk", "choices": [
+                {"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+            if (peticion.get("stream_options") or {}).get("include_usage"):
+                evento(json.dumps({**base, "object": "chat.completion.chunk", "choices": [], "usage": uso}))
+            evento("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # El cliente canceló el stream
+
+
+def iniciar_servidor(guion=None, puerto=0, host="127.0.0.1"):
+    """Levanta el servidor en un hilo de fondo; devuelve (servidor, url base)."""
+    manejador = type("Manejador", (_Manejador,), {"guion": guion or Guion()})
+    servidor = ThreadingHTTPServer((host, puerto), manejador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True, name="servidor-falso").start()
+    return servidor, f"http://{host}:{servidor.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--guion", help="JSON con respuestas, respuesta por defecto y palabras marcadas")
+    parser.add_argument("--primer-token", type=float, default=0.2, help="segundos hasta el primer token")
+    parser.add_argument("--por-token", type=float, default=0.01, help="segundos entre fragmentos")
+    parser.add_argument("--moderacion", type=float, default=0.1, help="segundos por moderación")
+    args = parser.parse_args()
+    latencias = {"primer_token": args.primer_token, "por_token": args.por_token, "moderacion": args.moderacion}
+    guion = Guion.desde_archivo(args.guion, **latencias) if args.guion else Guion(**latencias)
+    servidor, url = iniciar_servidor(guion, args.puerto)
+    print(f"Servidor falso escuchando en {url}/v1 (LLM_BACKEND=local, LOCAL_LLM_URL={url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.shutdown()
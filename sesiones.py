@@ -0,0 +1,226 @@
+"""Estado de las conversaciones del API guardado en SQLite (modo WAL).
+
+Cada fila guarda lo mínimo para retomar una sesión en cualquier worker: el
+id y la versión del prompt inicial compartido (ver prompts.PromptInicial),
+los mensajes propios de la sesión, el resumen, los turnos y el consumo.
+El texto de cada prompt inicial se guarda una sola vez en la tabla
+`prompts`, así que cualquier worker retoma la sesión con el mismo prompt
+aunque no lo haya construido (o la carta haya cambiado desde entonces).
+La columna `revision` sube con cada guardado; si dos workers atienden a la
+vez la misma sesión, el segundo en guardar recibe Conflicto en lugar de
+pisar el turno del primero. El consumo se guarda sumando lo gastado desde
+que se cargó la sesión, así que el de la extracción en segundo plano
+(sumar_consumo) no se pierde ni cambia la revisión.
+
+Uso:
+    python sesiones.py --purgar  # Borrar las sesiones inactivas
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, replace
+from typing import NamedTuple
+
+from consumo import ConsumoSesion
+from contexto import ResumenConversacion
+from conversacion import Conversacion, Mensaje
+from motor import Sesion
+from prompts import PromptInicial, buscar_prompt
+
+RUTA_BD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sesiones.db")
+ESPERA_BLOQUEO_MS = 5000  # Cuánto espera una escritura si otro proceso tiene el lock
+VIGENCIA_SESION = 24 * 60 * 60  # Segundos sin actividad tras los que se borra una sesión
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS sesiones (
+    id TEXT PRIMARY KEY,
+    prompt_id TEXT NOT NULL,
+    version TEXT NOT NULL,
+    mensajes TEXT NOT NULL,
+    resumen TEXT NOT NULL,
+    turnos INTEGER NOT NULL,
+    consumo TEXT NOT NULL,
+    revision INTEGER NOT NULL,
+    actualizado REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sesiones_actualizado ON sesiones(actualizado);
+CREATE TABLE IF NOT EXISTS prompts (
+    id TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    sistema TEXT NOT NULL,
+    saludo TEXT NOT NULL
+);
+"""
+
+# Suma al consumo guardado (JSON) el de los parámetros: llamadas, tokens de entrada y salida, costo
+SUMAR_CONSUMO = (
+    "consumo = json_object("
+    "'llamadas', json_extract(consumo, '$.llamadas') + ?, "
+    "'prompt_tokens', json_extract(consumo, '$.prompt_tokens') + ?, "
+    "'completion_tokens', json_extract(consumo, '$.completion_tokens') + ?, "
+    "'costo_usd', json_extract(consumo, '$.costo_usd') + ?)"
+)
+
+_lock = threading.Lock()
+_almacenes = {}  # ruta -> AlmacenSesiones
+
+
+class SesionNoEncontrada(KeyError):
+    """No hay una sesión con ese id (nunca existió o se borró por inactividad)."""
+
+
+class Conflicto(Exception):
+    """Otro worker guardó la sesión después de que se cargara."""
+
+
+class Revision(NamedTuple):
+    """Versión guardada de una sesión: el número y el consumo y el prompt que tenía al cargarla."""
+    numero: int
+    consumo: ConsumoSesion
+    prompt_id: str
+
+
+def _fila(sesion):
+    conversacion = sesion.mensajes
+    return (
+        conversacion.prompt.id,
+        conversacion.prompt.version,
+        json.dumps([[m.role, m.content] for m in conversacion.propios], ensure_ascii=False),
+        json.dumps(asdict(sesion.resumen), ensure_ascii=False),
+        sesion.turnos,
+    )
+
+
+def _valores(consumo):
+    return consumo.llamadas, consumo.prompt_tokens, consumo.completion_tokens, consumo.costo_usd
+
+
+class AlmacenSesiones:
+    """Sesiones en SQLite, compartidas por los hilos y procesos (workers) del API.
+
+    Cada hilo usa su propia conexión y cada operación es una sola sentencia,
+    así que no hacen falta transacciones explícitas.
+    """
+
+    def __init__(self, ruta=RUTA_BD):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._prompts = {}  # id -> PromptInicial leído de la base
+        self._conexion().executescript(ESQUEMA)
+
+    def _conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=ESPERA_BLOQUEO_MS / 1000, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            conexion.execute(f"PRAGMA busy_timeout={ESPERA_BLOQUEO_MS}")
+            self._local.conexion = conexion
+        return conexion
+
+    def _guardar_prompt(self, prompt):
+        sistema, saludo = (mensaje.content for mensaje in prompt.mensajes)
+        self._conexion().execute(
+            "INSERT OR IGNORE INTO prompts (id, version, sistema, saludo) VALUES (?, ?, ?, ?)",
+            (prompt.id, prompt.version, sistema, saludo),
+        )
+
+    def _prompt(self, prompt_id):
+        # Primero los construidos en el proceso, después los guardados por otros workers
+        prompt = buscar_prompt(prompt_id) or self._prompts.get(prompt_id)
+        if prompt is None:
+            fila = self._conexion().execute(
+                "SELECT version, sistema, saludo FROM prompts WHERE id = ?", (prompt_id,)
+            ).fetchone()
+            if fila is not None:
+                prompt = self._prompts[prompt_id] = PromptInicial.crear(*fila)
+        return prompt
+
+    def crear(self, sesion):
+        """Guardar una sesión nueva; devuelve su Revision (la 0)."""
+        prompt = sesion.mensajes.prompt
+        self._guardar_prompt(prompt)
+        self._conexion().execute(
+            "INSERT INTO sesiones (prompt_id, version, mensajes, resumen, turnos, consumo, id, revision, actualizado) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)",
+            (*_fila(sesion), json.dumps(asdict(sesion.consumo)), sesion.id, time.time()),
+        )
+        return Revision(0, replace(sesion.consumo), prompt.id)
+
+    def cargar(self, id, respaldo):
+        """(Sesion, Revision) guardada con ese id.
+
+        El prompt inicial sale de la tabla `prompts`; `respaldo()` devuelve
+        el actual para las sesiones guardadas antes de que existiera.
+        """
+        fila = self._conexion().execute(
+            "SELECT prompt_id, mensajes, resumen, turnos, consumo, revision FROM sesiones WHERE id = ?", (id,)
+        ).fetchone()
+        if fila is None:
+            raise SesionNoEncontrada(id)
+        prompt_id, mensajes, resumen, turnos, consumo, revision = fila
+        conversacion = Conversacion(
+            self._prompt(prompt_id) or respaldo(),
+            (Mensaje(rol, contenido) for rol, contenido in json.loads(mensajes)),
+        )
+        sesion = Sesion(conversacion, ResumenConversacion(**json.loads(resumen)), id=id)
+        sesion.turnos = turnos
+        sesion.consumo = ConsumoSesion(**json.loads(consumo))
+        return sesion, Revision(revision, replace(sesion.consumo), prompt_id)
+
+    def guardar(self, sesion, revision):
+        """Guardar la sesión cargada en `revision`; devuelve la Revision nueva o lanza Conflicto."""
+        consumo = replace(sesion.consumo)
+        prompt = sesion.mensajes.prompt
+        if prompt.id != revision.prompt_id:
+            self._guardar_prompt(prompt)
+        cursor = self._conexion().execute(
+            "UPDATE sesiones SET prompt_id = ?, version = ?, mensajes = ?, resumen = ?, turnos = ?, "
+            f"{SUMAR_CONSUMO}, revision = revision + 1, actualizado = ? WHERE id = ? AND revision = ?",
+            (*_fila(sesion), *_valores(consumo.menos(revision.consumo)), time.time(), sesion.id, revision.numero),
+        )
+        if cursor.rowcount == 0:
+            raise Conflicto(sesion.id)
+        return Revision(revision.numero + 1, consumo, prompt.id)
+
+    def sumar_consumo(self, id, consumo):
+        """Sumar al consumo guardado el de un trabajo de fondo, sin cambiar la revisión."""
+        self._conexion().execute(f"UPDATE sesiones SET {SUMAR_CONSUMO} WHERE id = ?", (*_valores(consumo), id))
+
+    def purgar(self, vigencia=VIGENCIA_SESION, ahora=None):
+        """Borrar las sesiones sin actividad en `vigencia` segundos y los prompts sin sesiones; devuelve cuántas sesiones."""
+        limite = (ahora or time.time()) - vigencia
+        borradas = self._conexion().execute("DELETE FROM sesiones WHERE actualizado < ?", (limite,)).rowcount
+        self._conexion().execute("DELETE FROM prompts WHERE id NOT IN (SELECT prompt_id FROM sesiones)")
+        return borradas
+
+    def contar(self):
+        return self._conexion().execute("SELECT COUNT(*) FROM sesiones").fetchone()[0]
+
+
+def obtener_sesiones(ruta=None):
+    """Almacén de sesiones compartido por el proceso."""
+    ruta = ruta or RUTA_BD
+    almacen = _almacenes.get(ruta)
+    if almacen is not None:
+        return almacen
+    with _lock:
+        almacen = _almacenes.get(ruta)
+        if almacen is None:
+            almacen = _almacenes[ruta] = AlmacenSesiones(ruta)
+        return almacen
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bd", default=RUTA_BD)
+    parser.add_argument("--purgar", action="store_true", help="borrar las sesiones inactivas")
+    args = parser.parse_args()
+    almacen = AlmacenSesiones(args.bd)
+    if args.purgar:
+        print(f"{almacen.purgar()} sesiones inactivas borradas")
+    print(f"{almacen.contar()} sesiones en {args.bd}")
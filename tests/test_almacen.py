@@ -0,0 +1,47 @@
+import logging
+import os
+
+import pytest
+
+import almacen
+from almacen import AlmacenPedidos, migrar_csv
+
+ORDERS = (
+    "2024-05-01 12:00:00, {'Ceviche': 2, 'Lomo saltado': 1}, 78.0\n"
+    "2024-05-01 12:05:00, esto no es un pedido, 10\n"
+    "2024-05-01 12:10:00, {'Ceviche': 1}, 25.0\n"
+)
+
+
+@pytest.fixture
+def orders_csv(tmp_path):
+    ruta = tmp_path / "orders.csv"
+    ruta.write_text(ORDERS, encoding="utf-8")
+    return str(ruta)
+
+
+@pytest.fixture
+def pedidos(tmp_path):
+    return AlmacenPedidos(str(tmp_path / "pedidos.db"))
+
+
+def test_migrar_csv_una_sola_vez(pedidos, orders_csv, caplog):
+    with caplog.at_level(logging.WARNING):
+        assert migrar_csv(pedidos, orders_csv) == 2
+    assert "Línea 2" in caplog.text
+    assert os.path.exists(f"{orders_csv}.migrado")
+    assert migrar_csv(pedidos, orders_csv) == 0
+    assert pedidos.contar() == 2
+
+
+def test_migrar_csv_a_la_vez_que_otro_proceso(pedidos, orders_csv, monkeypatch):
+    leer = almacen.leer_orders_csv
+
+    def leer_y_migrar_en_otro_proceso(ruta):
+        leidos = leer(ruta)
+        os.replace(ruta, f"{ruta}.migrado")
+        return leidos
+
+    monkeypatch.setattr(almacen, "leer_orders_csv", leer_y_migrar_en_otro_proceso)
+    assert migrar_csv(pedidos, orders_csv) == 2
+    assert migrar_csv(pedidos, orders_csv) == 0
@@ -0,0 +1,36 @@
+import historico
+from almacen import AlmacenPedidos, LineaPedido, nuevo_pedido
+from analitica import Ventas
+from catalogo import cargar_catalogo
+
+
+def test_ventas_en_vivo_solo_cuentan_pedidos_validos(tmp_path):
+    catalogo = cargar_catalogo()
+    precio = float(catalogo.menu.loc[catalogo.menu["Plato"] == "Ceviche", "Precio"].iloc[0])
+    almacen = AlmacenPedidos(str(tmp_path / "pedidos.db"))
+    almacen.guardar(nuevo_pedido([LineaPedido("Ceviche", 2, 2 * precio)], 2 * precio, "Miraflores", "Yape"))
+    almacen.guardar(nuevo_pedido([LineaPedido("Pizza hawaiana", 1, 30.0)], 30.0))  # Rechazado por el histórico
+    almacen.guardar(nuevo_pedido([LineaPedido("Ceviche", 1, 1.0)], 1.0))  # Precio que no cuadra
+
+    ventas = Ventas.desde_almacen(almacen, catalogo)
+    assert (ventas.pedidos, ventas.ingresos) == (1, 2 * precio)
+
+    almacen.guardar(nuevo_pedido([LineaPedido("Ceviche", 1, precio)], precio, origen="main"))  # No es del chat
+    almacen.guardar(nuevo_pedido([LineaPedido("Ceviche", 1, 99.0)], 99.0))
+    almacen.guardar(nuevo_pedido([LineaPedido("Ceviche", 1, precio)], precio, "Surco", "Efectivo"))
+    assert ventas.actualizar(almacen, catalogo) == 1
+    assert (ventas.pedidos, ventas.ingresos) == (2, 3 * precio)
+    assert ventas.por_plato["Ceviche"] == [3, 3 * precio]
+
+
+def test_ventas_en_lote_recuerdan_solo_los_ids_recientes(tmp_path):
+    catalogo = cargar_catalogo()
+    precio = float(catalogo.menu.loc[catalogo.menu["Plato"] == "Ceviche", "Precio"].iloc[0])
+    almacen = AlmacenPedidos(str(tmp_path / "pedidos.db"))
+    pedidos = [nuevo_pedido([LineaPedido("Ceviche", 1, precio)], precio, creado=f"2024-05-{dia:02d} 12:00:00")
+               for dia in range(1, 11)]
+    almacen.guardar_lote(pedidos)
+
+    ventas = Ventas.desde_almacen(almacen, catalogo)
+    assert ventas.pedidos == 10 and len(ventas._ids) == 2
+    assert not ventas.agregar(historico.filas_pedido(pedidos[-1], catalogo)[1])
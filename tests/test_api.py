@@ -0,0 +1,92 @@
+import asyncio
+
+import httpx
+import pytest
+
+import consumo
+import inventario
+from api import API, ServicioChat
+from llm import Respuesta, Uso
+from sesiones import AlmacenSesiones, Conflicto
+
+CONFIRMACION = (
+    "El pedido confirmado será: | Plato | Cantidad | Precio Total | | Ceviche | 1 | S/ 25.00 | "
+    "Total: S/ 25.00. Método de pago: Yape. Lugar de entrega: Miraflores."
+)
+
+
+class _BackendConfirma:
+    """Backend que siempre responde con la confirmación del pedido y cuenta las extracciones."""
+
+    def __init__(self):
+        self.extracciones = 0
+
+    def completar(self, mensajes, **kwargs):
+        return Respuesta(CONFIRMACION, Uso(100, 20), "prueba")
+
+    def extraer(self, mensajes, max_tokens=300):
+        self.extracciones += 1
+        return Respuesta("{}", Uso(50, 2), "prueba")
+
+    def moderar(self, texto, anotar=None):
+        return False
+
+
+class _OtroWorker(AlmacenSesiones):
+    """Almacén en el que otro worker guarda la sesión justo después de que se cargue."""
+
+    def cargar(self, id, respaldo):
+        sesion, revision = super().cargar(id, respaldo)
+        otra, otra_revision = super().cargar(id, respaldo)
+        super().guardar(otra, otra_revision)
+        return sesion, revision
+
+
+@pytest.fixture
+def sesiones(tmp_path, monkeypatch):
+    monkeypatch.setattr(inventario, "RUTA_BD", str(tmp_path / "inventario.db"))
+    monkeypatch.setattr(consumo, "RUTA_BD", str(tmp_path / "consumo.db"))
+    monkeypatch.setattr(consumo, "CSV_ANTIGUO", str(tmp_path / "consumo.csv"))
+    return _OtroWorker(str(tmp_path / "sesiones.db"))
+
+
+def _pedir(app, metodo, ruta, **kwargs):
+    async def pedir():
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://api") as http:
+            return await http.request(metodo, ruta, **kwargs)
+    return asyncio.run(pedir())
+
+
+def test_guardar_con_revision_vieja_es_conflicto(sesiones):
+    servicio = ServicioChat(None, sesiones)
+    sesion = servicio.crear()
+    _, revision = AlmacenSesiones.cargar(sesiones, sesion.id, lambda: None)
+    sesiones.guardar(sesion, revision)
+    with pytest.raises(Conflicto):
+        sesiones.guardar(sesion, revision)
+
+
+def test_api_responde_409_si_otro_worker_guardo(sesiones):
+    app = API(ServicioChat(None, sesiones))
+    creada = _pedir(app, "POST", "/sesiones")
+    assert creada.status_code == 201
+    respuesta = _pedir(app, "POST", f"/sesiones/{creada.json()['sesion']}/reiniciar")
+    assert respuesta.status_code == 409
+    assert "vuelve a cargarla" in respuesta.json()["detalle"]
+
+
+def test_api_responde_404_si_la_sesion_no_existe(sesiones):
+    app = API(ServicioChat(None, sesiones))
+    assert _pedir(app, "GET", "/sesiones/no-existe").status_code == 404
+
+
+def test_conflicto_no_extrae_el_pedido_confirmado(sesiones):
+    backend = _BackendConfirma()
+    app = API(ServicioChat(backend, sesiones))
+    sesion = _pedir(app, "POST", "/sesiones").json()["sesion"]
+    respuesta = _pedir(app, "POST", f"/sesiones/{sesion}/mensajes",
+                       json={"mensaje": "sí, pago con yape", "stream": False})
+    assert respuesta.status_code == 409
+    # El turno no quedó en el historial: guardar el pedido permitiría confirmarlo dos veces
+    assert backend.extracciones == 0
@@ -0,0 +1,69 @@
+import json
+import sqlite3
+
+import pytest
+
+import escritor
+from almacen import AlmacenPedidos, LineaPedido, nuevo_pedido
+from escritor import EscritorPedidos
+
+
+def _pedido(id, distrito="Miraflores"):
+    return nuevo_pedido([LineaPedido("Ceviche", 2, 40.0)], 40.0, distrito=distrito, metodo_pago="Yape", id=id)
+
+
+@pytest.fixture
+def almacen(tmp_path):
+    return AlmacenPedidos(str(tmp_path / "pedidos.db"))
+
+
+@pytest.fixture
+def fallidos(tmp_path):
+    return tmp_path / "fallidos.jsonl"
+
+
+@pytest.fixture
+def escritor_pedidos(almacen, fallidos):
+    escritor_pedidos = EscritorPedidos(almacen, intervalo=0.05, fallidos=str(fallidos))
+    yield escritor_pedidos
+    escritor_pedidos.cerrar()
+
+
+def test_encolar_es_idempotente_por_id(escritor_pedidos, almacen):
+    assert escritor_pedidos.encolar(_pedido("p1"))
+    assert not escritor_pedidos.encolar(_pedido("p1"))  # Ya estaba en espera
+    assert escritor_pedidos.vaciar()
+    assert escritor_pedidos.encolar(_pedido("p1"))  # Ya guardado: se vuelve a encolar pero no se duplica
+    assert escritor_pedidos.vaciar()
+    assert almacen.contar() == 1
+    assert [linea.cantidad for linea in almacen.pedidos()[0].lineas] == [2]
+
+
+def test_pedido_invalido_no_se_lleva_el_lote(escritor_pedidos, almacen, fallidos):
+    for i in range(4):
+        escritor_pedidos.encolar(_pedido(f"p{i}"))
+    escritor_pedidos.encolar(_pedido("malo", distrito={"distrito": "Miraflores"}))
+    assert escritor_pedidos.vaciar()
+    assert almacen.contar() == 4
+    descartados = [json.loads(linea) for linea in fallidos.read_text(encoding="utf-8").splitlines()]
+    assert [d["pedido"]["id"] for d in descartados] == ["malo"]
+
+
+class _AlmacenBloqueado:
+    def __init__(self):
+        self.intentos = 0
+
+    def guardar_lote(self, lote):
+        self.intentos += 1
+        raise sqlite3.OperationalError("database is locked")
+
+
+def test_base_bloqueada_reintenta_y_descarta(monkeypatch, fallidos):
+    monkeypatch.setattr(escritor, "ESPERA_REINTENTO", 0)
+    bloqueado = _AlmacenBloqueado()
+    escritor_pedidos = EscritorPedidos(bloqueado, intervalo=0.05, fallidos=str(fallidos))
+    escritor_pedidos.encolar(_pedido("p1"))
+    assert escritor_pedidos.vaciar()
+    escritor_pedidos.cerrar()
+    assert bloqueado.intentos == escritor.REINTENTOS + 1
+    assert json.loads(fallidos.read_text(encoding="utf-8"))["pedido"]["id"] == "p1"
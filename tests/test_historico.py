@@ -0,0 +1,12 @@
+from historico import IdsPorDia
+
+
+def test_ids_por_dia_solo_recuerda_los_ultimos_dias():
+    ids = IdsPorDia(dias=2)
+    assert ids.agregar("2024-05-01", "a")
+    assert not ids.agregar("2024-05-01", "a")
+    assert ids.agregar("2024-05-02", "b")
+    assert ids.agregar("2024-05-03", "c")
+    assert len(ids) == 2  # El 1 de mayo se olvidó
+    assert ids.agregar("2024-05-01", "a")
+    assert not ids.agregar("2024-05-02", "b")
@@ -0,0 +1,116 @@
+import time
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from inventario import Inventario, SinStock
+
+
+@pytest.fixture
+def catalogo_stock():
+    """Catálogo mínimo con stock: lo único que usa el inventario es la versión y la carta."""
+    return SimpleNamespace(
+        version="v1",
+        menu=pd.DataFrame({"Plato": ["Ceviche", "Lomo saltado"], "Stock": [5, 3]}),
+    )
+
+
+@pytest.fixture
+def inventario(catalogo_stock, tmp_path):
+    return Inventario(catalogo_stock, str(tmp_path / "inventario.db"))
+
+
+def test_reservar_aparta_y_reemplaza(inventario):
+    inventario.reservar("s1", {"ceviche": 3})
+    assert inventario.disponible("Ceviche") == 2
+    inventario.reservar("s1", {"Ceviche": 1})  # La última cantidad pedida reemplaza a la anterior
+    assert inventario.disponible("Ceviche") == 4
+    assert inventario.disponible("Inca Kola") is None  # Sin stock controlado
+
+
+def test_reservar_es_todo_o_nada(inventario):
+    inventario.reservar("s1", {"Ceviche": 4})
+    with pytest.raises(SinStock) as e:
+        inventario.reservar("s2", {"Lomo saltado": 1, "Ceviche": 2})
+    assert e.value.faltantes == {"Ceviche": 1}
+    assert inventario.disponible("Lomo saltado") == 3
+    assert inventario.disponible("Ceviche") == 1
+
+
+def test_agotados(inventario):
+    inventario.reservar("s1", {"Lomo saltado": 3})
+    assert inventario.agotados == {"Lomo saltado"}
+    inventario.liberar("s1")
+    assert inventario.agotados == frozenset()
+
+
+def test_confirmar_consume_y_devuelve_el_resto(inventario):
+    inventario.reservar("s1", {"Ceviche": 3, "Lomo saltado": 2})
+    assert inventario.confirmar("s1", {"Ceviche": 2})
+    assert inventario.disponible("Ceviche") == 3
+    assert inventario.disponible("Lomo saltado") == 3
+    assert not inventario.liberar("s1")  # La reserva ya se consumió
+
+
+def test_confirmar_sin_stock_no_baja_de_cero(inventario):
+    inventario.reservar("s1", {"Ceviche": 5})
+    inventario.confirmar("s2", {"Ceviche": 2})
+    assert inventario.disponible("Ceviche") == 0
+
+
+def test_liberar(inventario):
+    inventario.reservar("s1", {"Ceviche": 2})
+    assert inventario.liberar("s1")
+    assert inventario.disponible("Ceviche") == 5
+    assert not inventario.liberar("s1")
+
+
+def test_vencer(inventario):
+    inventario.reservar("s1", {"Ceviche": 2})
+    inventario.reservar("s2", {"Ceviche": 1})
+    assert inventario.vencer(time.time()) == 0
+    assert inventario.vencer(time.time() + inventario.vigencia + 1) == 2
+    assert inventario.disponible("Ceviche") == 5
+
+
+def test_workers_comparten_el_stock(catalogo_stock, tmp_path):
+    ruta = str(tmp_path / "inventario.db")
+    uno, otro = Inventario(catalogo_stock, ruta), Inventario(catalogo_stock, ruta)
+    uno.reservar("s1", {"Lomo saltado": 2})
+    with pytest.raises(SinStock):
+        otro.reservar("s2", {"Lomo saltado": 2})
+    otro.confirmar("s1", {"Lomo saltado": 2})
+    assert uno.disponible("Lomo saltado") == 1
+
+
+def test_otra_version_conserva_lo_vendido(catalogo_stock, tmp_path):
+    ruta = str(tmp_path / "inventario.db")
+    Inventario(catalogo_stock, ruta).confirmar("s1", {"Ceviche": 2, "Lomo saltado": 1})
+    catalogo_stock.version = "v2"
+    catalogo_stock.menu.loc[catalogo_stock.menu["Plato"] == "Lomo saltado", "Stock"] = 10  # Reposición
+    repuesto = Inventario(catalogo_stock, ruta)
+    assert repuesto.disponible("Ceviche") == 3
+    assert repuesto.disponible("Lomo saltado") == 10
+
+
+def test_otro_dia_repone_y_conserva_las_reservas(catalogo_stock, tmp_path, monkeypatch):
+    ruta = str(tmp_path / "inventario.db")
+    uno, otro = Inventario(catalogo_stock, ruta), Inventario(catalogo_stock, ruta)
+    uno.confirmar("s1", {"Lomo saltado": 3})
+    otro.reservar("s2", {"Ceviche": 2})
+    assert uno.disponible("Lomo saltado") == 0
+    monkeypatch.setattr("inventario._hoy", lambda: "2999-01-01")
+    # Sin reiniciar el proceso: la primera operación del día nuevo repone
+    assert uno.disponible("Lomo saltado") == 3
+    assert otro.disponible("Ceviche") == 3  # La reserva de s2 sigue vigente
+    assert otro.liberar("s2")
+    assert uno.disponible("Ceviche") == 5
+
+
+def test_confirmar_conservando_el_resto(inventario):
+    inventario.reservar("s1", {"Ceviche": 2, "Lomo saltado": 1})
+    # El pedido tenía una línea que no se reconoció: lo reservado de Lomo saltado no se devuelve
+    inventario.confirmar("s1", {"Ceviche": 2}, conservar_resto=True)
+    assert inventario.disponible("Ceviche") == 3
+    assert inventario.disponible("Lomo saltado") == 2
@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+
+import pytest
+
+import consumo
+from almacen import LineaPedido, nuevo_pedido
+from catalogo import cargar_catalogo
+from inventario import Inventario
+from llm import FlujoRespuesta, Respuesta, Uso
+from motor import MotorChat, Sesion
+
+
+class _BackendCortado:
+    """Backend que modera con un modelo de chat y corta el stream después de dos fragmentos."""
+
+    def moderar(self, texto, anotar=None):
+        anotar(Respuesta("safe", Uso(30, 1), "llama-guard-3-8b"))
+        return False
+
+    def completar_stream(self, mensajes, **kwargs):
+        def fragmentos():
+            for texto in ("Hola, ", "te cuento"):
+                yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=texto))])
+            raise ConnectionError("stream cortado")
+        return FlujoRespuesta(fragmentos(), "llama3-8b-8192")
+
+
+@pytest.fixture
+def motor(tmp_path, monkeypatch):
+    monkeypatch.setattr(consumo, "RUTA_BD", str(tmp_path / "consumo.db"))
+    monkeypatch.setattr(consumo, "CSV_ANTIGUO", str(tmp_path / "consumo.csv"))
+    catalogo = cargar_catalogo()
+    return MotorChat(_BackendCortado(), catalogo, inventario=Inventario(catalogo, str(tmp_path / "inventario.db")))
+
+
+def test_platos_del_pedido_usan_los_nombres_de_la_carta(motor):
+    pedido = nuevo_pedido([
+        LineaPedido("Ceviches", 2, 50.0),
+        LineaPedido("Lomo Saltado (x2)", 2, 60.0),
+        LineaPedido("ceviche", 1, 25.0),
+        LineaPedido("Inka Kola (355ml)", 1, 3.5),  # Sin stock controlado
+        LineaPedido("Pizza hawaiana", 1, 30.0),
+    ], 168.5)
+    assert motor.platos_del_pedido(pedido) == ({"Ceviche": 3, "Lomo saltado": 2}, ["Pizza hawaiana"])
+
+
+def test_stream_cortado_y_moderacion_se_contabilizan(motor):
+    sesion = Sesion(motor.conversacion())
+    mensajes = len(sesion.mensajes)
+    turno = motor.iniciar_turno(sesion, "cuéntame una historia larga sobre los barcos que llegaron al Callao")
+    assert turno.aprobado()
+    texto = "".join(turno.fragmentos())
+    assert texto.startswith("Hola, te cuento") and turno.ruta == "no_disponible"
+    assert len(sesion.mensajes) == mensajes
+    # Llama Guard (informado por el proveedor) y el chat cortado (estimado a partir de lo recibido)
+    assert sesion.consumo.llamadas == 2
+    assert sesion.consumo.prompt_tokens > 30 and sesion.consumo.completion_tokens == 1 + len("Hola, te cuento") // 4
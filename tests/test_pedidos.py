@@ -0,0 +1,96 @@
+import pytest
+
+from catalogo import cargar_catalogo
+from pedidos import BuscadorPedidos, ItemPedido, interpretar_pedido, palabras_a_numero, procesar_mensaje_usuario
+
+
+@pytest.fixture(scope="module")
+def catalogo():
+    return cargar_catalogo()
+
+
+@pytest.fixture
+def trie():
+    return BuscadorPedidos({
+        "plato": ["Lomo", "Lomo saltado", "Arroz con pollo", "Ají de gallina"],
+        "bebida": ["Inka Kola (355ml)"],
+        "postre": ["Pie de Limón"],
+    })
+
+
+@pytest.mark.parametrize("palabra, numero", [
+    ("7", 7), ("dieciséis", 16), ("treinta y cinco", 35), ("ciento veinte", 120), ("mil", None),
+])
+def test_palabras_a_numero(palabra, numero):
+    assert palabras_a_numero(palabra) == numero
+
+
+def test_nombres_de_varias_palabras_toman_la_coincidencia_mas_larga(trie):
+    assert trie.buscar("2 lomos saltados y 1 lomo") == [
+        ItemPedido("plato", "Lomo saltado", 2), ItemPedido("plato", "Lomo", 1),
+    ]
+
+
+def test_las_tres_cartas_en_una_pasada(trie):
+    assert trie.buscar("dos platos de aji de gallina, 3 inka kola y un pie de limon") == [
+        ItemPedido("plato", "Ají de gallina", 2),
+        ItemPedido("bebida", "Inka Kola (355ml)", 3),
+        ItemPedido("postre", "Pie de Limón", 1),
+    ]
+
+
+def test_cantidades_compuestas(trie):
+    assert trie.buscar("treinta y cinco arroces con pollo y ciento veinte lomos") == [
+        ItemPedido("plato", "Arroz con pollo", 35), ItemPedido("plato", "Lomo", 120),
+    ]
+
+
+def test_platos_desconocidos_y_nombres_sin_cantidad(trie):
+    analisis = trie.analizar("3 pizzas, 2 lomo saltado y algo de arroz con pollo")
+    assert analisis.items == [ItemPedido("plato", "Lomo saltado", 2)]
+    assert analisis.cantidades_sueltas == 1
+    assert analisis.nombres_sin_cantidad == 1
+
+
+def test_mencionados(trie):
+    assert trie.mencionados("¿tienen lomo saltado o pie de limón?") == [
+        ("plato", "Lomo saltado"), ("postre", "Pie de Limón"),
+    ]
+
+
+def test_procesar_mensaje_reporta_todas_las_cantidades_fuera_de_rango(catalogo):
+    mensaje = procesar_mensaje_usuario("150 ceviche y 200 inka kola", catalogo)
+    assert "'Ceviche'" in mensaje and "'Inka Kola (355ml)'" in mensaje
+
+
+def test_procesar_mensaje_sin_errores(catalogo):
+    assert procesar_mensaje_usuario("quiero 2 ceviche y 1 pie de limon", catalogo) is None
+    # Un plato que no está en la carta no es un error de cantidad: lo resuelve el modelo
+    assert procesar_mensaje_usuario("quiero 500 pizzas", catalogo) is None
+
+
+@pytest.mark.parametrize("mensaje, esperado", [
+    ("quiero 2 ceviche y 3 arroz con pollo", "2 ceviche, 3 arroz con pollo"),
+    ("dos ceviches", "2 ceviche"),
+    ("2 arroces chaufa", "2 arroz chaufa"),
+    ("un lomo saltado", "1 lomo saltado"),
+])
+def test_interpreta_cantidad_y_plato(catalogo, mensaje, esperado):
+    assert interpretar_pedido(mensaje, catalogo) == esperado
+
+
+@pytest.mark.parametrize("mensaje", [
+    "hola",
+    "quiero ceviche",  # Plato sin cantidad
+    "quiero 3",  # Cantidad sin plato
+    "2 ceviche y arroz chaufa",
+    "2 cevichee",
+])
+def test_poca_confianza_recurre_al_llm(catalogo, mensaje):
+    assert interpretar_pedido(mensaje, catalogo) is None
+
+
+def test_otras_categorias_solo_si_se_piden(catalogo):
+    mensaje = "2 ceviche y 1 torta tres leches"
+    assert interpretar_pedido(mensaje, catalogo) is None
+    assert interpretar_pedido(mensaje, catalogo, categorias=("plato", "postre")) == "2 ceviche, 1 torta tres leches"